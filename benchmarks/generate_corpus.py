@@ -0,0 +1,120 @@
+"""
+Generate a synthetic message corpus for benchmarks.
+
+Rows follow the text_messages_to_v.csv schema (time_stamp, user_name,
+narrative_entry) and are built from the phrase vocabularies in lexicon.py
+mixed with the real sample messages, so every rule and feature fires at a
+realistic rate. Rows are written as they are generated, so 10M rows need
+no more memory than 1k.
+
+Usage:
+    python benchmarks/generate_corpus.py --rows 1000000 --output corpus.csv
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+from lexicon import CONCERNING_PATTERNS, EMOTIONAL_STATES, FRIENDLY_PATTERNS, MESSAGE_RULES, SERVER_KEYWORDS
+
+SAMPLE_PATH = os.path.join(ROOT, 'text_messages_to_v.csv')
+
+OPENERS = ['', 'Hey, ', 'Honestly, ', 'Look, ', 'I just think ', 'Remember, ', 'Babe, ', 'Okay so ']
+FILLERS = [
+    'how was your day', 'did you eat yet', 'the weather is nice', 'call me later',
+    'I finished the book', 'traffic was terrible', 'see you tomorrow', 'good luck on the exam',
+    'the game starts at eight', 'can you send the photos',
+]
+CLOSERS = ['', '.', '!', '?', '...', ' 💛', '??', ' lol']
+
+# Share of messages drawn from each source
+MIX = [
+    ('sample', 0.25),
+    ('filler', 0.25),
+    ('friendly', 0.20),
+    ('concerning', 0.20),
+    ('threat', 0.10),
+]
+
+
+def _phrase_pools():
+    concerning = sorted({p for phrases in CONCERNING_PATTERNS.values() for p in phrases}
+                        | {p for name, phrases in MESSAGE_RULES.items() if name != 'threat' for p in phrases}
+                        | {p for phrases in EMOTIONAL_STATES.values() for p in phrases})
+    threats = sorted(set(MESSAGE_RULES['threat']) | set(SERVER_KEYWORDS['threats']))
+    return {'friendly': FRIENDLY_PATTERNS, 'concerning': concerning, 'threat': threats}
+
+
+def _load_samples():
+    try:
+        with open(SAMPLE_PATH, newline='', encoding='utf-8') as f:
+            return [(row['user_name'], row['narrative_entry']) for row in csv.DictReader(f)]
+    except OSError:
+        return []
+
+
+def generate_rows(rows, senders=1000, seed=0, start=datetime(2025, 1, 1)):
+    """
+    Yield (time_stamp, user_name, narrative_entry) tuples in time order.
+
+    Args:
+        rows (int): Number of rows
+        senders (int): Number of distinct synthetic senders
+        seed (int): Random seed; the same seed always gives the same corpus
+        start (datetime): Timestamp of the first message
+    """
+    rnd = random.Random(seed)
+    pools = _phrase_pools()
+    samples = _load_samples()
+    sources = [name for name, _ in MIX]
+    weights = [weight for _, weight in MIX]
+    names = sorted({name for name, _ in samples}) + [f'contact_{i:06d}' for i in range(senders)]
+    timestamp = start
+
+    for _ in range(rows):
+        timestamp += timedelta(seconds=rnd.randint(1, 600))
+        source = rnd.choices(sources, weights)[0]
+        if source == 'sample' and samples:
+            sender, text = rnd.choice(samples)
+        else:
+            sender = rnd.choice(names)
+            if source in ('sample', 'filler'):
+                text = rnd.choice(FILLERS)
+            else:
+                phrases = rnd.sample(pools[source], k=rnd.randint(1, 2))
+                text = ' '.join([rnd.choice(FILLERS)] * rnd.randint(0, 1) + phrases)
+            text = (rnd.choice(OPENERS) + text + rnd.choice(CLOSERS)).strip()
+            text = text[0].upper() + text[1:]
+        yield timestamp.strftime('%Y-%m-%d %H:%M:%S'), sender, text
+
+
+def write_corpus(path, rows, senders=1000, seed=0):
+    """Write a corpus CSV and return its path."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['time_stamp', 'user_name', 'narrative_entry'])
+        writer.writerows(generate_rows(rows, senders, seed))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic message corpus")
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--senders', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None,
+                        help="Output CSV (default: benchmarks/data/corpus_<rows>.csv)")
+    args = parser.parse_args()
+
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'data', f'corpus_{args.rows}.csv')
+    write_corpus(output, args.rows, args.senders, args.seed)
+    print(f"Wrote {args.rows} rows to {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,420 @@
+"""
+Reproducible benchmarks for the analysis pipeline.
+
+Each benchmark runs in its own subprocess, so its peak RSS is measured in
+isolation, and reports throughput, p50/p99 latency and peak RSS. Results
+are written to benchmarks/results/<commit>-<time>.json for comparison
+across commits.
+
+Usage:
+    python benchmarks/run_benchmarks.py --rows 10000
+    python benchmarks/run_benchmarks.py --only analyze_message extract_features
+    python benchmarks/run_benchmarks.py --server-env ML_CASCADE=1 --only http_analyze
+    python benchmarks/run_benchmarks.py --server-env ML_MAX_BATCH_SIZE=1 --http-concurrency 8 --only http_analyze
+    python benchmarks/run_benchmarks.py --server-env ML_POOL_START=fork --only asgi_memory
+    python benchmarks/run_benchmarks.py --workers 2 --http-concurrency 8 --only asgi_analyze
+    python benchmarks/run_benchmarks.py --compare old.json new.json
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+from generate_corpus import write_corpus
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+DATA_DIR = os.path.join(ROOT, 'benchmarks', 'data')
+SERVER_DIR = os.path.join(ROOT, 'safeguard', 'ml_server')
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies, items, elapsed):
+    """
+    Summarize one benchmark run.
+
+    Args:
+        latencies (list): Seconds per timed call
+        items (int): Messages processed in total
+        elapsed (float): Wall time of the whole run in seconds
+    """
+    latencies = sorted(latencies)
+    return {
+        'items': items,
+        'seconds': round(elapsed, 4),
+        'throughput': round(items / elapsed, 1) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 50) * 1e3, 4) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99) * 1e3, 4) if latencies else None,
+    }
+
+
+def read_messages(corpus):
+    with open(corpus, newline='', encoding='utf-8') as f:
+        return [(row['narrative_entry'], row['user_name']) for row in csv.DictReader(f)]
+
+
+def _time_each(fn, items):
+    latencies = []
+    started = time.perf_counter()
+    for item in items:
+        t0 = time.perf_counter()
+        fn(*item)
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, len(items), time.perf_counter() - started)
+
+
+def _time_batches(fn, items, batch_size):
+    latencies = []
+    started = time.perf_counter()
+    for start in range(0, len(items), batch_size):
+        t0 = time.perf_counter()
+        fn(items[start:start + batch_size])
+        latencies.append(time.perf_counter() - t0)
+    result = summarize(latencies, len(items), time.perf_counter() - started)
+    result['batch_size'] = batch_size
+    return result
+
+
+def bench_analyze_message(corpus, args):
+    from process_messages import analyze_message
+    return _time_each(analyze_message, read_messages(corpus))
+
+
+def bench_extract_features(corpus, args):
+    from export_model import extract_features
+    return _time_each(extract_features, [(text,) for text, _ in read_messages(corpus)])
+
+
+def bench_classify_chunk(corpus, args):
+    import pandas as pd
+    from process_messages import classify_chunk
+
+    latencies, items = [], 0
+    started = time.perf_counter()
+    for chunk in pd.read_csv(corpus, chunksize=args.batch_size * 100):
+        t0 = time.perf_counter()
+        classify_chunk(chunk)
+        latencies.append(time.perf_counter() - t0)
+        items += len(chunk)
+    return summarize(latencies, items, time.perf_counter() - started)
+
+
+def bench_preprocess_text(corpus, args):
+    import pandas as pd
+
+    from preprocess import preprocess_text
+
+    df = pd.read_csv(corpus)
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        preprocess_text(df, text_column='narrative_entry')
+        latencies.append(time.perf_counter() - t0)
+    return summarize(latencies, len(df) * args.repeat, time.perf_counter() - started)
+
+
+def bench_classifier_predict(corpus, args):
+    import joblib
+
+    started = time.perf_counter()
+    pipeline = joblib.load(os.path.join(ROOT, 'model', 'behavior_classifier.joblib'))
+    load_seconds = time.perf_counter() - started
+    texts = [text for text, _ in read_messages(corpus)]
+    result = _time_batches(pipeline.predict, texts, args.batch_size)
+    result['load_seconds'] = round(load_seconds, 4)
+    return result
+
+
+def bench_compact_predict(corpus, args):
+    from compact_model import CompactPredictor
+
+    started = time.perf_counter()
+    predictor = CompactPredictor(os.path.join(ROOT, 'model', 'compact'))
+    load_seconds = time.perf_counter() - started
+    texts = [text for text, _ in read_messages(corpus)]
+    result = _time_batches(predictor.predict_indices, texts, args.batch_size)
+    result['load_seconds'] = round(load_seconds, 4)
+    return result
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _request(url, payload=None, timeout=60):
+    data = json.dumps(payload).encode() if payload is not None else None
+    request = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def _peak_rss_kb(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+
+
+def _memory_kb(pid):
+    """Current RSS and PSS of a process (Linux), in kilobytes."""
+    usage = {}
+    for path, field, name in [(f'/proc/{pid}/status', 'VmRSS:', 'rss'), (f'/proc/{pid}/smaps_rollup', 'Pss:', 'pss')]:
+        try:
+            with open(path) as f:
+                for line in f:
+                    if line.startswith(field):
+                        usage[name] = int(line.split()[1])
+                        break
+        except OSError:
+            pass
+    return usage
+
+
+def _descendants(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            children = [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+    return children + [grandchild for child in children for grandchild in _descendants(child)]
+
+
+def _start_server(command, args, env=None):
+    """Start a local server and wait for /readyz; returns (process, base url, startup seconds)."""
+    port = _free_port()
+    env = dict(os.environ, ML_PORT=str(port), ML_BLOCKING_LOAD='1', ML_DEBUG='0', **(env or {}))
+    env.update(dict(item.split('=', 1) for item in args.server_env))
+    server = subprocess.Popen([arg.format(port=port) for arg in command], cwd=SERVER_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f'http://127.0.0.1:{port}'
+    started = time.perf_counter()
+    while True:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}")
+        try:
+            _request(f'{base}/readyz', timeout=5)
+            return server, base, time.perf_counter() - started
+        except OSError:
+            if time.perf_counter() - started > args.server_timeout:
+                server.terminate()
+                server.wait()
+                raise RuntimeError("Server did not become ready in time")
+            time.sleep(0.5)
+
+
+def _post_concurrently(url, messages, concurrency):
+    """POST each message from `concurrency` clients; latencies plus response status counts."""
+    statuses = {}
+
+    def send(text):
+        t0 = time.perf_counter()
+        try:
+            _request(url, {'message': text})
+            status = 200
+        except urllib.error.HTTPError as e:
+            status = e.code
+        statuses[status] = statuses.get(status, 0) + 1
+        return time.perf_counter() - t0
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as clients:
+        latencies = list(clients.map(send, messages))
+    result = summarize(latencies, len(messages), time.perf_counter() - started)
+    result['concurrency'] = concurrency
+    result['statuses'] = {str(code): count for code, count in sorted(statuses.items())}
+    return result
+
+
+def bench_asgi_memory(corpus, args):
+    """Cold start and memory of the ASGI server and its worker pool."""
+    server, base, startup_seconds = _start_server(
+        [sys.executable, '-m', 'uvicorn', 'asgi:app', '--port', '{port}'], args,
+        env={'ML_WORKERS': str(args.workers)})
+    try:
+        # Exercise every worker once, so lazily touched pages are counted
+        for text, _ in read_messages(corpus)[:args.workers * 4]:
+            _request(f'{base}/analyze', {'message': text})
+        processes = [server.pid] + _descendants(server.pid)
+        usage = [_memory_kb(pid) for pid in processes]
+        return {
+            'startup_seconds': round(startup_seconds, 3),
+            'workers': args.workers,
+            'processes': len(processes),
+            'total_rss_kb': sum(u.get('rss', 0) for u in usage),
+            'total_pss_kb': sum(u.get('pss', 0) for u in usage),
+            'server_env': args.server_env,
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def bench_asgi_analyze(corpus, args):
+    """POST messages to the ASGI server's /analyze from concurrent clients."""
+    server, base, startup_seconds = _start_server(
+        [sys.executable, '-m', 'uvicorn', 'asgi:app', '--port', '{port}'], args,
+        env={'ML_WORKERS': str(args.workers)})
+    try:
+        messages = [text for text, _ in read_messages(corpus)][:args.http_limit]
+        result = _post_concurrently(f'{base}/analyze', messages, args.http_concurrency)
+        result.update({
+            'startup_seconds': round(startup_seconds, 3),
+            'workers': args.workers,
+            'server_env': args.server_env,
+        })
+        return result
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def bench_http_analyze(corpus, args):
+    """POST messages to /analyze on a freshly started Flask server from concurrent clients."""
+    server, base, startup_seconds = _start_server([sys.executable, 'app.py'], args)
+    try:
+        messages = [text for text, _ in read_messages(corpus)][:args.http_limit]
+        # Concurrent clients are what the micro-batcher can batch together
+        result = _post_concurrently(f'{base}/analyze', messages, args.http_concurrency)
+        result['startup_seconds'] = round(startup_seconds, 3)
+        result['server_peak_rss_kb'] = _peak_rss_kb(server.pid)
+        result['server_env'] = args.server_env
+        try:
+            result['cascade'] = _request(f'{base}/cascade/stats')
+        except OSError:
+            pass  # cascade mode is off
+        return result
+    finally:
+        server.terminate()
+        server.wait()
+
+
+BENCHMARKS = {
+    'analyze_message': bench_analyze_message,
+    'classify_chunk': bench_classify_chunk,
+    'extract_features': bench_extract_features,
+    'preprocess_text': bench_preprocess_text,
+    'classifier_predict': bench_classifier_predict,
+    'compact_predict': bench_compact_predict,
+    'http_analyze': bench_http_analyze,
+    'asgi_memory': bench_asgi_memory,
+    'asgi_analyze': bench_asgi_analyze,
+}
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run_one(name, corpus, argv):
+    """Run one benchmark in a subprocess and return its result dict."""
+    command = [sys.executable, os.path.abspath(__file__), '--worker', name, '--corpus', corpus] + argv
+    completed = subprocess.run(command, cwd=ROOT, capture_output=True, text=True)
+    if completed.returncode != 0:
+        error = completed.stderr.strip().splitlines()
+        return {'error': error[-1] if error else f'exit code {completed.returncode}'}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def compare(old_path, new_path):
+    """Print the relative change of every metric between two result files."""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old['commit']} -> {new['commit']}")
+    for name, result in new['benchmarks'].items():
+        before = old['benchmarks'].get(name, {})
+        for metric in ('throughput', 'p50_ms', 'p99_ms', 'peak_rss_kb'):
+            a, b = before.get(metric), result.get(metric)
+            if a and b:
+                print(f"{name:20}{metric:14}{a:>14}{b:>14}{(b - a) / a:>+10.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline")
+    parser.add_argument('--rows', type=int, default=10_000, help="Synthetic corpus size")
+    parser.add_argument('--corpus', help="Use this CSV instead of a synthetic corpus")
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help="Benchmarks to run")
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--repeat', type=int, default=3, help="Repeats for whole-corpus benchmarks")
+    parser.add_argument('--http-limit', type=int, default=2000, help="Messages sent over HTTP")
+    parser.add_argument('--server-env', nargs='*', default=[], metavar='KEY=VALUE',
+                        help="Environment for the benchmarked server, e.g. ML_CASCADE=1")
+    parser.add_argument('--server-timeout', type=float, default=300)
+    parser.add_argument('--workers', type=int, default=4, help="Worker processes of the ASGI server")
+    parser.add_argument('--http-concurrency', type=int, default=8, help="Concurrent clients for http_analyze and asgi_analyze")
+    parser.add_argument('--output', help="Results file (default: benchmarks/results/<commit>-<time>.json)")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    if args.worker:
+        result = BENCHMARKS[args.worker](args.corpus, args)
+        result['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        print(json.dumps(result))
+        return
+
+    corpus = args.corpus or os.path.join(DATA_DIR, f'corpus_{args.rows}.csv')
+    if not os.path.exists(corpus):
+        write_corpus(corpus, args.rows)
+
+    # Options forwarded to the per-benchmark subprocesses
+    forwarded = ['--batch-size', str(args.batch_size), '--repeat', str(args.repeat),
+                 '--http-limit', str(args.http_limit), '--server-timeout', str(args.server_timeout),
+                 '--workers', str(args.workers), '--http-concurrency', str(args.http_concurrency)]
+    if args.server_env:
+        forwarded += ['--server-env'] + args.server_env
+
+    report = {
+        'commit': _git_commit(),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+        'corpus': os.path.relpath(corpus, ROOT),
+        'benchmarks': {},
+    }
+    for name in args.only or BENCHMARKS:
+        result = run_one(name, corpus, forwarded)
+        report['benchmarks'][name] = result
+        print(f"{name:20}{json.dumps(result)}")
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{report['commit']}-{datetime.now().strftime('%Y%m%d%H%M%S')}.json")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {output}")
+
+
+if __name__ == '__main__':
+    main()
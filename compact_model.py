@@ -0,0 +1,303 @@
+"""
+Compact inference format for the behavior classifier.
+
+Exports the pipeline trained by export_model.py (TF-IDF followed by a
+MultiOutputClassifier of random forests or linear models) as plain NumPy
+arrays plus a small JSON header, and predicts from them with vectorized
+NumPy code. Loading needs neither sklearn nor unpickling, and the arrays
+are memory-mapped.
+
+Usage:
+    python compact_model.py export
+    python compact_model.py compare messages.csv
+"""
+import argparse
+import json
+import os
+import re
+import time
+import unicodedata
+from collections import Counter
+
+import numpy as np
+
+COMPACT_DIR = 'model/compact'
+META_FILE = 'meta.json'
+
+
+def strip_accents(text, mode):
+    """Remove accents like TfidfVectorizer(strip_accents=mode) does."""
+    if mode == 'ascii':
+        return unicodedata.normalize('NFKD', text).encode('ASCII', 'ignore').decode('ASCII')
+    if mode == 'unicode':
+        if text.isascii():
+            return text
+        return ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+    return text
+
+
+def _tree_arrays(forest):
+    """Flatten every tree of a forest into shared node arrays."""
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        roots.append(offset)
+        features.append(tree.feature.astype(np.int32))
+        thresholds.append(tree.threshold.astype(np.float64))
+        # Shift child ids so they index the concatenated arrays; leaves stay -1
+        for children, out in ((tree.children_left, lefts), (tree.children_right, rights)):
+            out.append(np.where(children == -1, -1, children + offset).astype(np.int32))
+        value = tree.value[:, 0, :].astype(np.float64)
+        values.append(value / value.sum(axis=1, keepdims=True))
+        offset += tree.node_count
+    return {
+        'feature': np.concatenate(features),
+        'threshold': np.concatenate(thresholds),
+        'left': np.concatenate(lefts),
+        'right': np.concatenate(rights),
+        'value': np.concatenate(values),
+        'roots': np.array(roots, dtype=np.int32),
+    }
+
+
+def export_compact(pipeline, label_encoders, columns, out_dir=COMPACT_DIR):
+    """
+    Write a fitted pipeline in the compact format.
+
+    Args:
+        pipeline: Fitted sklearn Pipeline with 'tfidf' and 'classifier' steps
+        label_encoders (dict): Column -> fitted LabelEncoder
+        columns (list): Output column names, in classifier order
+        out_dir (str): Directory to write the arrays and meta.json to
+    """
+    if 'tfidf' not in pipeline.named_steps or 'classifier' not in pipeline.named_steps:
+        raise ValueError(
+            f"Expected a pipeline with 'tfidf' and 'classifier' steps, got {list(pipeline.named_steps)}; "
+            "streaming (hashing) models cannot be exported")
+    tfidf = pipeline.named_steps['tfidf']
+    classifier = pipeline.named_steps['classifier']
+    if not hasattr(tfidf, 'vocabulary_'):
+        raise ValueError("Only pipelines with a fitted TfidfVectorizer can be exported")
+    if (tfidf.analyzer != 'word' or tfidf.strip_accents not in (None, 'ascii', 'unicode')
+            or tfidf.preprocessor or tfidf.tokenizer):
+        raise ValueError("Only the default word analyzer is supported by the compact format")
+    os.makedirs(out_dir, exist_ok=True)
+
+    vocabulary = {term: int(index) for term, index in tfidf.vocabulary_.items()}
+    np.save(os.path.join(out_dir, 'idf.npy'), tfidf.idf_.astype(np.float64))
+
+    outputs = []
+    for i, (column, estimator) in enumerate(zip(columns, classifier.estimators_)):
+        classes = estimator.classes_
+        if column in label_encoders:
+            labels = label_encoders[column].inverse_transform(classes.astype(int)).tolist()
+        else:
+            labels = [int(c) if float(c).is_integer() else float(c) for c in classes]
+
+        if hasattr(estimator, 'estimators_'):
+            kind = 'forest'
+            arrays = _tree_arrays(estimator)
+        elif hasattr(estimator, 'coef_'):
+            kind = 'linear'
+            arrays = {'coef': estimator.coef_.astype(np.float64),
+                      'intercept': estimator.intercept_.astype(np.float64)}
+        else:
+            raise ValueError(f"Can't export estimator of type {type(estimator).__name__}")
+
+        for name, array in arrays.items():
+            np.save(os.path.join(out_dir, f'output{i}_{name}.npy'), array)
+        outputs.append({'column': column, 'kind': kind, 'labels': labels})
+
+    meta = {
+        'vocabulary': vocabulary,
+        'n_features': len(tfidf.idf_),
+        'lowercase': tfidf.lowercase,
+        'strip_accents': tfidf.strip_accents,
+        'token_pattern': tfidf.token_pattern,
+        'ngram_range': list(tfidf.ngram_range),
+        'stop_words': sorted(tfidf.get_stop_words() or []),
+        'sublinear_tf': tfidf.sublinear_tf,
+        'norm': tfidf.norm,
+        'outputs': outputs,
+    }
+    with open(os.path.join(out_dir, META_FILE), 'w') as f:
+        json.dump(meta, f)
+
+
+class CompactPredictor:
+    """
+    Predict behavior labels from the compact format.
+
+    Args:
+        model_dir (str): Directory written by export_compact
+    """
+
+    def __init__(self, model_dir=COMPACT_DIR):
+        with open(os.path.join(model_dir, META_FILE)) as f:
+            meta = json.load(f)
+        self.vocabulary = meta['vocabulary']
+        self.n_features = meta['n_features']
+        self.lowercase = meta['lowercase']
+        self.strip_accents = meta.get('strip_accents')
+        self.token_pattern = re.compile(meta['token_pattern'])
+        self.ngram_range = tuple(meta['ngram_range'])
+        self.stop_words = frozenset(meta['stop_words'])
+        self.sublinear_tf = meta['sublinear_tf']
+        self.norm = meta['norm']
+        self.idf = np.load(os.path.join(model_dir, 'idf.npy'), mmap_mode='r')
+
+        self.outputs = []
+        for i, output in enumerate(meta['outputs']):
+            names = ['feature', 'threshold', 'left', 'right', 'value', 'roots'] \
+                if output['kind'] == 'forest' else ['coef', 'intercept']
+            arrays = {
+                name: np.load(os.path.join(model_dir, f'output{i}_{name}.npy'), mmap_mode='r')
+                for name in names
+            }
+            self.outputs.append((output['column'], output['kind'], output['labels'], arrays))
+
+    def _terms(self, text):
+        # Same analysis as sklearn's 'word' analyzer
+        if self.lowercase:
+            text = text.lower()
+        text = strip_accents(text, self.strip_accents)
+        tokens = [t for t in self.token_pattern.findall(text) if t not in self.stop_words]
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            for start in range(len(tokens) - n + 1):
+                yield ' '.join(tokens[start:start + n])
+
+    def transform(self, texts):
+        """
+        TF-IDF vectors for texts as a dense matrix.
+
+        Dense rows are cheap here because the vocabulary is capped at
+        max_features, and they make tree traversal a single fancy index.
+        """
+        X = np.zeros((len(texts), self.n_features), dtype=np.float64)
+        for row, text in enumerate(texts):
+            counts = Counter(self.vocabulary[t] for t in self._terms(str(text)) if t in self.vocabulary)
+            if counts:
+                columns = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+                tf = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+                if self.sublinear_tf:
+                    tf = np.log(tf) + 1
+                X[row, columns] = tf * self.idf[columns]
+        if self.norm == 'l2':
+            norms = np.sqrt((X ** 2).sum(axis=1, keepdims=True))
+            X /= np.where(norms == 0, 1, norms)
+        elif self.norm == 'l1':
+            norms = np.abs(X).sum(axis=1, keepdims=True)
+            X /= np.where(norms == 0, 1, norms)
+        return X
+
+    @staticmethod
+    def _forest_proba(X, arrays):
+        feature, threshold = arrays['feature'], arrays['threshold']
+        left, right, value = arrays['left'], arrays['right'], arrays['value']
+        # sklearn trees compare float32 features against float64 thresholds
+        X = X.astype(np.float32)
+        # One walker per (row, tree), all advanced one level per iteration
+        nodes = np.repeat(np.asarray(arrays['roots'])[None, :], len(X), axis=0)
+        rows = np.arange(len(X))[:, None]
+        while True:
+            next_left = left[nodes]
+            active = next_left != -1
+            if not active.any():
+                break
+            go_left = X[rows, np.maximum(feature[nodes], 0)] <= threshold[nodes]
+            nodes = np.where(active, np.where(go_left, next_left, right[nodes]), nodes)
+        return value[nodes].sum(axis=1) / nodes.shape[1]
+
+    def predict_indices(self, texts):
+        """Class index per output, as an (n_texts, n_outputs) array."""
+        X = self.transform(texts)
+        predictions = np.zeros((len(texts), len(self.outputs)), dtype=np.int64)
+        for i, (_, kind, _, arrays) in enumerate(self.outputs):
+            if kind == 'forest':
+                predictions[:, i] = self._forest_proba(X, arrays).argmax(axis=1)
+            else:
+                scores = X @ np.asarray(arrays['coef']).T + arrays['intercept']
+                if scores.shape[1] == 1:
+                    predictions[:, i] = (scores[:, 0] > 0).astype(np.int64)
+                else:
+                    predictions[:, i] = scores.argmax(axis=1)
+        return predictions
+
+    def predict_labels(self, texts):
+        """Decoded labels per text, as one dict per text."""
+        predictions = self.predict_indices(texts)
+        return [
+            {column: labels[index] for (column, _, labels, _), index in zip(self.outputs, row)}
+            for row in predictions.tolist()
+        ]
+
+
+def _size_on_disk(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def compare(texts, model_path, compact_dir=COMPACT_DIR):
+    """Print size, load time, per-message latency and agreement of both formats."""
+    import joblib
+
+    started = time.perf_counter()
+    pipeline = joblib.load(model_path)
+    sklearn_load = time.perf_counter() - started
+
+    started = time.perf_counter()
+    predictor = CompactPredictor(compact_dir)
+    compact_load = time.perf_counter() - started
+
+    started = time.perf_counter()
+    expected = np.asarray(pipeline.predict(texts))
+    sklearn_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    predicted = predictor.predict_indices(texts)
+    compact_seconds = time.perf_counter() - started
+
+    # Map sklearn's predicted class values to class indices for comparison
+    expected_indices = np.column_stack([
+        np.searchsorted(estimator.classes_, expected[:, i])
+        for i, estimator in enumerate(pipeline.named_steps['classifier'].estimators_)
+    ])
+    agreement = (expected_indices == predicted).all(axis=1).mean()
+
+    print(f"{'':12}{'sklearn':>14}{'compact':>14}")
+    print(f"{'size (MB)':12}{_size_on_disk(model_path) / 1e6:>14.2f}{_size_on_disk(compact_dir) / 1e6:>14.2f}")
+    print(f"{'load (ms)':12}{sklearn_load * 1e3:>14.1f}{compact_load * 1e3:>14.1f}")
+    print(f"{'per msg (us)':12}{sklearn_seconds / len(texts) * 1e6:>14.1f}{compact_seconds / len(texts) * 1e6:>14.1f}")
+    print(f"Identical predictions for {agreement:.2%} of {len(texts)} messages")
+    return agreement
+
+
+def main():
+    from export_model import ENCODERS_PATH, MODEL_PATH, y_columns
+
+    parser = argparse.ArgumentParser(description="Export or check the compact classifier format")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('export', help="Write the compact format from the saved pipeline")
+    check = subparsers.add_parser('compare', help="Compare compact and sklearn predictions on a CSV")
+    check.add_argument('csv')
+    check.add_argument('--column', default='narrative_entry')
+    parser.add_argument('--output', default=COMPACT_DIR)
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        import joblib
+
+        export_compact(joblib.load(MODEL_PATH), joblib.load(ENCODERS_PATH), y_columns, args.output)
+        print(f"Compact model written to {args.output}")
+    else:
+        import pandas as pd
+
+        texts = pd.read_csv(args.csv)[args.column].astype(str).tolist()
+        compare(texts, MODEL_PATH, args.output)
+
+
+if __name__ == '__main__':
+    main()
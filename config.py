@@ -4,7 +4,7 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
-# Data paths
+# Data paths; preprocess.load_data requires DATA_PATH, other scripts take a path argument
 DATA_PATH = os.getenv('DATA_PATH')
 
 # Preprocessing parameters
@@ -16,10 +16,6 @@ NGRAM_RANGE = (1, 2)  # Use unigrams and bigrams
 TEST_SIZE = 0.2
 RANDOM_STATE = 42
 
-# Ensure required environment variables are set
-if not DATA_PATH:
-    raise ValueError("DATA_PATH environment variable is not set")
-
 # API Keys
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
 
@@ -33,6 +29,18 @@ MODEL_PARAMS = {
     }
 }
 
+# Candidates searched by train.py, on top of MODEL_PARAMS
+MODEL_GRID = {
+    'random_forest': {
+        'n_estimators': [100, 200],
+        'max_depth': [None, 20],
+        'min_samples_split': [2, 5]
+    }
+}
+
+# Cross-validation folds for the grid search
+CV_FOLDS = 5
+
 # Text processing settings
 TEXT_PROCESSING = {
     'min_df': MIN_DF,
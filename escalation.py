@@ -0,0 +1,294 @@
+"""
+Streaming escalation detection over per-sender message windows.
+
+Messages are scored one at a time by process_messages.py and the ML
+server. This module follows each sender's scores over time and raises an
+alert when they climb, e.g. Location Monitoring (2) to Stalking (4) to
+Death Threat (5) within a few days.
+
+State per sender is bounded: a ring buffer of the most recent messages,
+a monotonic queue for the minimum severity in the time window and two
+exponentially weighted averages for the trend. Each update is amortized
+O(1), and senders idle for longer than idle_seconds (or the least
+recently seen ones beyond max_senders) are evicted. Idleness is measured
+on the detector's own monotonic clock, never on message time stamps,
+which come from clients and files and may be far off or out of order.
+
+Usage:
+    python escalation.py [--input text_messages_to_v_analyzed.csv] [--output escalations.csv]
+"""
+import argparse
+import csv
+import heapq
+import itertools
+import math
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+
+ANALYZED_PATH = 'text_messages_to_v_analyzed.csv'
+ALERTS_PATH = 'escalations.csv'
+
+DAY = 86400
+
+# An alert needs the latest severity to reach ALERT_SEVERITY and to be at
+# least MIN_JUMP above the lowest severity in the window
+ALERT_SEVERITY = 4
+MIN_JUMP = 2
+
+# Half-lives of the fast and slow severity averages; their difference is the trend
+FAST_HALF_LIFE = DAY
+SLOW_HALF_LIFE = 7 * DAY
+
+ALERT_COLUMNS = ['time_stamp', 'user_name', 'severity', 'from_severity', 'trend', 'path']
+
+# Rows sorted in memory at once by scan_csv before spilling to a temporary file
+SORT_RUN_SIZE = 1_000_000
+
+
+def parse_timestamp(value):
+    """Epoch seconds for an ISO date or datetime string, or None."""
+    try:
+        return datetime.fromisoformat(str(value).strip()).timestamp()
+    except ValueError:
+        return None
+
+
+class SenderState:
+    """Recent history of one sender."""
+
+    __slots__ = ('recent', 'minimums', 'fast', 'slow', 'last_seen', 'last_arrival', 'alerted_severity',
+                 'alerted_at')
+
+    def __init__(self, buffer_size):
+        # (timestamp, severity, incident) of the latest messages
+        self.recent = deque(maxlen=buffer_size)
+        # (timestamp, severity) with increasing severities; the head is the window minimum
+        self.minimums = deque()
+        self.fast = None
+        self.slow = None
+        self.last_seen = None
+        # Detector clock reading at the latest update, for eviction
+        self.last_arrival = None
+        self.alerted_severity = 0
+        self.alerted_at = None
+
+
+def _decay(average, value, elapsed, half_life):
+    if average is None:
+        return float(value)
+    weight = math.exp(-math.log(2) * elapsed / half_life)
+    return weight * average + (1 - weight) * value
+
+
+class EscalationDetector:
+    """
+    Detect rising severity per sender as messages arrive.
+
+    Args:
+        window_seconds (float): Sliding window for escalation checks
+        buffer_size (int): Recent messages kept per sender for the alert path
+        idle_seconds (float): Senders without an update for this long on
+            `clock` are forgotten
+        max_senders (int): Upper bound on tracked senders; the least
+            recently updated ones are evicted first
+        clock: Monotonic time source for eviction
+
+    Messages should arrive in time order per sender. A message older than
+    the sender's latest is treated as arriving at the same time; a message
+    time stamp only ever affects its own sender's state.
+    """
+
+    def __init__(self, window_seconds=7 * DAY, buffer_size=16, idle_seconds=30 * DAY,
+                 max_senders=1_000_000, clock=time.monotonic):
+        self.window_seconds = window_seconds
+        self.buffer_size = buffer_size
+        self.idle_seconds = idle_seconds
+        self.max_senders = max_senders
+        self.clock = clock
+        # Ordered by last update, so idle senders are always at the front
+        self.senders = OrderedDict()
+        self.alerts = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        while self.senders:
+            sender, state = next(iter(self.senders.items()))
+            if len(self.senders) <= self.max_senders and now - state.last_arrival <= self.idle_seconds:
+                break
+            del self.senders[sender]
+            self.evicted += 1
+
+    def update(self, sender, severity, incident=None, timestamp=None):
+        """
+        Add one scored message.
+
+        Args:
+            sender (str): Sender name
+            severity (int): Severity score of the message (1-5)
+            incident (str): Incident type or behavior label, for the alert path
+            timestamp (float): Epoch seconds; defaults to now
+
+        Returns:
+            dict: 'trend' (fast minus slow severity average; positive means
+            rising) and 'alert', which is None or a dict describing the
+            escalation
+        """
+        now = time.time() if timestamp is None else timestamp
+        with self._lock:
+            arrival = self.clock()
+            state = self.senders.get(sender)
+            if state is None:
+                state = self.senders[sender] = SenderState(self.buffer_size)
+            else:
+                self.senders.move_to_end(sender)
+            if state.last_seen is not None and now < state.last_seen:
+                now = state.last_seen
+            elapsed = now - state.last_seen if state.last_seen is not None else 0
+            state.last_seen = now
+            state.last_arrival = arrival
+
+            state.fast = _decay(state.fast, severity, elapsed, FAST_HALF_LIFE)
+            state.slow = _decay(state.slow, severity, elapsed, SLOW_HALF_LIFE)
+            trend = round(state.fast - state.slow, 3)
+
+            # Window minimum before this message
+            start = now - self.window_seconds
+            minimums = state.minimums
+            while minimums and minimums[0][0] < start:
+                minimums.popleft()
+            low = minimums[0][1] if minimums else None
+
+            alert = None
+            if (low is not None and severity >= ALERT_SEVERITY and severity - low >= MIN_JUMP
+                    and (severity > state.alerted_severity or state.alerted_at < start)):
+                path = [entry for entry in state.recent if entry[0] >= start]
+                alert = {
+                    'sender': sender,
+                    'timestamp': now,
+                    'severity': severity,
+                    'fromSeverity': low,
+                    'trend': trend,
+                    'path': [incident for _, _, incident in path] + [incident],
+                }
+                state.alerted_severity = severity
+                state.alerted_at = now
+                self.alerts += 1
+
+            while minimums and minimums[-1][1] >= severity:
+                minimums.pop()
+            minimums.append((now, severity))
+            state.recent.append((now, severity, incident))
+
+            self._evict(arrival)
+        return {'trend': trend, 'alert': alert}
+
+    def stats(self):
+        return {'senders': len(self.senders), 'alerts': self.alerts, 'evicted': self.evicted}
+
+
+def _spill(run):
+    run.sort(key=lambda item: item[:2])
+    f = tempfile.TemporaryFile('w+', newline='', encoding='utf-8')
+    writer = csv.writer(f)
+    for timestamp, seq, values in run:
+        writer.writerow([repr(timestamp), seq] + values)
+    f.seek(0)
+    return f
+
+
+def _read_run(f):
+    for values in csv.reader(f):
+        yield float(values[0]), int(values[1]), values[2:]
+
+
+def time_ordered(rows, timestamp_index, run_size=SORT_RUN_SIZE):
+    """
+    Yield (timestamp, values) for CSV rows in time order.
+
+    Rows with equal time stamps keep their file order, and rows without a
+    parseable time stamp are dropped. Input larger than run_size rows is
+    sorted in runs spilled to temporary files and merged, so memory stays
+    bounded by run_size.
+    """
+    run = []
+    spilled = []
+    try:
+        for seq, values in enumerate(rows):
+            timestamp = parse_timestamp(values[timestamp_index]) if len(values) > timestamp_index else None
+            if timestamp is None:
+                continue
+            run.append((timestamp, seq, values))
+            if len(run) >= run_size:
+                spilled.append(_spill(run))
+                run = []
+        run.sort(key=lambda item: item[:2])
+        if not spilled:
+            for timestamp, _, values in run:
+                yield timestamp, values
+            return
+        spilled.append(_spill(run))
+        run = []
+        for timestamp, _, values in heapq.merge(*map(_read_run, spilled), key=lambda item: item[:2]):
+            yield timestamp, values
+    finally:
+        for f in spilled:
+            f.close()
+
+
+def scan_csv(analyzed_path=ANALYZED_PATH, alerts_path=ALERTS_PATH, detector=None, run_size=SORT_RUN_SIZE):
+    """
+    Run the detector over an analyzed CSV and write one row per alert.
+
+    Analyzed files are in input order, not time order, so rows are sorted
+    by time stamp first (see time_ordered); rows without a parseable time
+    stamp are skipped.
+
+    Returns:
+        EscalationDetector: The detector, with its final state
+    """
+    from rollup import ANALYZED_COLUMNS
+
+    detector = detector or EscalationDetector()
+    with open(analyzed_path, newline='', encoding='utf-8') as f, \
+            open(alerts_path, 'w', newline='', encoding='utf-8') as out:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        columns = header if 'user_name' in header else ANALYZED_COLUMNS
+        rows = reader if columns is header else itertools.chain([header], reader)
+        writer = csv.writer(out)
+        writer.writerow(ALERT_COLUMNS)
+        for timestamp, values in time_ordered(rows, columns.index('time_stamp'), run_size):
+            row = dict(zip(columns, values))
+            try:
+                severity = int(float(row['severity_score']))
+            except (KeyError, ValueError):
+                continue
+            result = detector.update(row['user_name'], severity, row.get('incident_type'), timestamp)
+            alert = result['alert']
+            if alert:
+                writer.writerow([row['time_stamp'], alert['sender'], alert['severity'],
+                                 alert['fromSeverity'], alert['trend'], ' -> '.join(alert['path'])])
+    return detector
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find per-sender severity escalations in analyzed messages")
+    parser.add_argument('--input', default=ANALYZED_PATH)
+    parser.add_argument('--output', default=ALERTS_PATH)
+    parser.add_argument('--window-days', type=float, default=7)
+    parser.add_argument('--idle-days', type=float, default=30)
+    args = parser.parse_args()
+
+    detector = EscalationDetector(window_seconds=args.window_days * DAY, idle_seconds=args.idle_days * DAY)
+    scan_csv(args.input, args.output, detector)
+    stats = detector.stats()
+    print(f"{stats['alerts']} escalation alerts written to {args.output} "
+          f"({stats['senders']} active senders, {stats['evicted']} evicted)")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,71 +1,42 @@
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.preprocessing import LabelEncoder
 from sklearn.multioutput import MultiOutputClassifier
 from sklearn.ensemble import RandomForestClassifier
+from sklearn.linear_model import SGDClassifier
 from sklearn.pipeline import Pipeline
 import joblib
+import argparse
 import os
+from lexicon import CONCERNING_PATTERNS, EMOTIONAL_STATES, scan
 
-# Create model directory if it doesn't exist
-os.makedirs('model', exist_ok=True)
+DATA_FILE = '/Users/vanishaswabhanam/Downloads/processed_dataset.csv'
+MODEL_PATH = 'model/behavior_classifier.joblib'
+ENCODERS_PATH = 'model/label_encoders.joblib'
+STREAMING_CHECKPOINT = 'model/streaming_classifier.joblib'
+# Hashing-vectorizer pipelines are kept apart from the TF-IDF export, which
+# the server's /classify and compact_model.py read
+STREAMING_MODEL_PATH = 'model/streaming_behavior_classifier.joblib'
+STREAMING_ENCODERS_PATH = 'model/streaming_label_encoders.joblib'
 
-# Load and process the training data
-data = pd.read_csv('/Users/vanishaswabhanam/Downloads/processed_dataset.csv')
-
-# Define message categories and their characteristics
-FRIENDLY_PATTERNS = [
-    'movie night', 'lunch', 'checking in', 'hope', 'sending love', 'let me know',
-    'want to talk', 'doing okay', '💛', 'gentle', 'talk', 'chat'
-]
-
-CONCERNING_PATTERNS = {
-    'Gaslighting': [
-        'imagining things', 'overreacting', 'too sensitive', 'making things up',
-        'always make me', 'your fault', 'being dramatic'
-    ],
-    'Coercive Control': [
-        'should listen', 'have to', 'must', 'need to', 'make you', 'your own good',
-        'know what\'s best', 'can\'t handle', 'lucky I even'
-    ],
-    'Stalking': [
-        'been outside', 'watching you', 'following', 'saw you at', 'noticed you',
-        'been around', 'where are you', 'who were you with'
-    ],
-    'Verbal Threats': [
-        'regret', 'threat', 'warning', 'careful', 'sorry if', 'what happens',
-        'no one else', 'won\'t believe'
-    ]
-}
-
-EMOTIONAL_STATES = {
-    'Neutral': ['checking in', 'movie night', 'lunch', 'chat', 'talk'],
-    'Concerned': ['hope you\'re okay', 'worried', 'care about'],
-    'Anxious': ['should', 'have to', 'need to', 'careful'],
-    'Fearful': ['threat', 'warning', 'regret', 'scared'],
-    'Manipulated': ['your fault', 'making me', 'because of you'],
-    'Distressed': ['always', 'never', 'every time', 'everyone']
-}
+TEXT_COLUMN = 'narrative_entry'
+y_columns = ['incident_type', 'user_emotional_state', 'severity_score', 'potential_crime']
 
 def extract_features(text):
-    text = text.lower()
+    hits = scan(text)
     features = []
     
     # Check for friendly patterns
-    friendly_score = sum(1 for pattern in FRIENDLY_PATTERNS if pattern in text)
-    features.append(friendly_score)
+    features.append(hits.get('friendly', 0))
     
     # Check for concerning patterns
-    for category, patterns in CONCERNING_PATTERNS.items():
-        category_score = sum(1 for pattern in patterns if pattern in text)
-        features.append(category_score)
+    for category in CONCERNING_PATTERNS:
+        features.append(hits.get(f'concerning:{category}', 0))
     
     # Check emotional indicators
-    for emotion, patterns in EMOTIONAL_STATES.items():
-        emotion_score = sum(1 for pattern in patterns if pattern in text)
-        features.append(emotion_score)
+    for emotion in EMOTIONAL_STATES:
+        features.append(hits.get(f'emotion:{emotion}', 0))
     
     return features
 
@@ -76,63 +47,200 @@ feature_names.extend(EMOTIONAL_STATES.keys())
 
 # Calculate severity score based on message content
 def calculate_severity(text):
-    text = text.lower()
+    hits = scan(text)
     severity = 1  # Default low severity
     
-    # High severity indicators
-    high_severity = ['threat', 'regret', 'warning', 'never', 'always', 'must', 'have to']
-    # Medium severity indicators
-    medium_severity = ['should', 'need to', 'careful', 'watching', 'following']
-    # Low severity indicators
-    low_severity = ['hope', 'chat', 'talk', 'checking in', 'movie', 'lunch']
-    
-    if any(indicator in text for indicator in high_severity):
+    # High, medium and low severity indicators live in lexicon.SEVERITY_TIERS
+    if hits.get('severity:high'):
         severity = 5
-    elif any(indicator in text for indicator in medium_severity):
+    elif hits.get('severity:medium'):
         severity = 3
-    elif any(indicator in text for indicator in low_severity):
+    elif hits.get('severity:low'):
         severity = 1
     
     return severity
 
-# Prepare features and targets
-X = data['narrative_entry']
-y_columns = ['incident_type', 'user_emotional_state', 'severity_score', 'potential_crime']
+def build_pipeline():
+    """Full-batch pipeline: TF-IDF followed by one random forest per output."""
+    return Pipeline([
+        ('tfidf', TfidfVectorizer(
+            max_features=1000,
+            ngram_range=(1, 3),
+            stop_words='english'
+        )),
+        ('classifier', MultiOutputClassifier(
+            RandomForestClassifier(
+                n_estimators=200,
+                max_depth=10,
+                min_samples_split=5,
+                class_weight='balanced'
+            )
+        ))
+    ])
 
-# Create and train the pipeline
-pipeline = Pipeline([
-    ('tfidf', TfidfVectorizer(
-        max_features=1000,
-        ngram_range=(1, 3),
-        stop_words='english'
-    )),
-    ('classifier', MultiOutputClassifier(
-        RandomForestClassifier(
-            n_estimators=200,
-            max_depth=10,
-            min_samples_split=5,
-            class_weight='balanced'
-        )
-    ))
-])
+def encode_labels(data, label_encoders=None):
+    """
+    Encode the target columns, fitting label encoders unless given.
+    
+    Returns:
+        tuple: (y_encoded, label_encoders)
+    """
+    fit = label_encoders is None
+    if fit:
+        label_encoders = {}
+    y_encoded = np.zeros((len(data), len(y_columns)))
+    
+    for i, column in enumerate(y_columns):
+        if column != 'severity_score':
+            if fit:
+                le = LabelEncoder()
+                y_encoded[:, i] = le.fit_transform(data[column])
+                label_encoders[column] = le
+            else:
+                y_encoded[:, i] = label_encoders[column].transform(data[column])
+        else:
+            y_encoded[:, i] = data[column]
+    return y_encoded, label_encoders
 
-# Initialize and fit label encoders
-label_encoders = {}
-y_encoded = np.zeros((len(data), len(y_columns)))
+def drop_near_duplicates(data):
+    """
+    Keep one row per near-duplicate cluster and label combination.
+    
+    Copy-pasted messages would otherwise be over-weighted in training.
+    Rows whose labels differ from the rest of their cluster are kept.
+    """
+    from neardup import cluster_ids
+    
+    clusters = pd.Series(cluster_ids(data[TEXT_COLUMN].astype(str)), index=data.index, name='_cluster')
+    keep = ~pd.concat([clusters, data[y_columns]], axis=1).duplicated()
+    print(f"Dropped {int((~keep).sum())} near-duplicate rows of {len(data)}")
+    return data[keep]
 
-for i, column in enumerate(y_columns):
-    if column != 'severity_score':
-        le = LabelEncoder()
-        y_encoded[:, i] = le.fit_transform(data[column])
-        label_encoders[column] = le
-    else:
-        y_encoded[:, i] = data[column]
+def train_full(data_files, dedupe=False):
+    """Fit the full pipeline on all rows of the files and export it."""
+    data = pd.concat([pd.read_csv(data_file) for data_file in data_files], ignore_index=True)
+    if dedupe:
+        data = drop_near_duplicates(data)
+    
+    # Prepare features and targets
+    X = data[TEXT_COLUMN]
+    y_encoded, label_encoders = encode_labels(data)
+    pipeline = build_pipeline()
+    
+    # Train the model
+    pipeline.fit(X, y_encoded)
+    
+    # Save the model and components
+    joblib.dump(pipeline, MODEL_PATH)
+    joblib.dump(label_encoders, ENCODERS_PATH)
+
+def _label_classes(data_files, chunksize):
+    """Collect every label value with a cheap pass over the target columns only."""
+    values = {column: set() for column in y_columns}
+    for data_file in data_files:
+        for chunk in pd.read_csv(data_file, usecols=y_columns, chunksize=chunksize):
+            for column in y_columns:
+                values[column].update(chunk[column].dropna().unique())
+    return {column: sorted(values[column]) for column in y_columns}
 
-# Train the model
-pipeline.fit(X, y_encoded)
+def _save_checkpoint(state, path):
+    # Write to a temporary file first so a crash never leaves a torn checkpoint
+    tmp_path = f'{path}.tmp'
+    joblib.dump(state, tmp_path)
+    os.replace(tmp_path, path)
 
-# Save the model and components
-joblib.dump(pipeline, 'model/behavior_classifier.joblib')
-joblib.dump(label_encoders, 'model/label_encoders.joblib')
+def train_streaming(data_files, chunksize=50_000, checkpoint=STREAMING_CHECKPOINT):
+    """
+    Train incrementally with partial_fit, checkpointing after every chunk.
+    
+    Messages are vectorized with a stateless hashing vectorizer, so nothing
+    has to be refit when new data arrives. The checkpoint keeps the byte
+    offset reached in every file and reading resumes there, so appending to
+    a file or adding a new one only costs time for the new rows.
+    
+    Args:
+        data_files (list): Labeled CSV files
+        chunksize (int): Rows per partial_fit call
+        checkpoint (str): Checkpoint path, resumed from if it exists
+        
+    Returns:
+        dict: The final checkpoint state
+    """
+    from preprocess import csv_record_offset, iter_chunks, make_hashing_vectorizer
+    
+    if os.path.exists(checkpoint):
+        state = joblib.load(checkpoint)
+        print(f"Resuming from {checkpoint} ({state['rows_seen']} rows seen)")
+        if 'byte_offsets' not in state:
+            # Older checkpoints counted rows; find where those rows end once
+            state['byte_offsets'] = {
+                source: csv_record_offset(source, rows) for source, rows in state.pop('offsets', {}).items()
+            }
+    else:
+        classes = _label_classes(data_files, chunksize)
+        label_encoders = {}
+        for column in y_columns:
+            if column != 'severity_score':
+                le = LabelEncoder()
+                le.classes_ = np.array(classes[column])
+                label_encoders[column] = le
+        state = {
+            'vectorizer': make_hashing_vectorizer(),
+            'classifier': MultiOutputClassifier(SGDClassifier(loss='modified_huber')),
+            'label_encoders': label_encoders,
+            'classes': [
+                np.arange(len(classes[column])) if column != 'severity_score' else np.array(classes[column])
+                for column in y_columns
+            ],
+            'rows_seen': 0,
+            'byte_offsets': {},
+        }
+    
+    for data_file in data_files:
+        source = os.path.abspath(data_file)
+        for chunk, offset in iter_chunks(data_file, chunksize, state['byte_offsets'].get(source, 0)):
+            chunk = chunk.dropna(subset=[TEXT_COLUMN] + y_columns)
+            try:
+                y_encoded, _ = encode_labels(chunk, state['label_encoders'])
+            except ValueError as e:
+                raise ValueError(
+                    f"{data_file} has a label the streaming model was not created with ({e}); "
+                    f"delete {checkpoint} to retrain from scratch"
+                )
+            if len(chunk):
+                X = state['vectorizer'].transform(chunk[TEXT_COLUMN].astype(str))
+                state['classifier'].partial_fit(X, y_encoded, classes=state['classes'])
+            
+            state['byte_offsets'][source] = offset
+            state['rows_seen'] += len(chunk)
+            _save_checkpoint(state, checkpoint)
+            print(f"Trained on {state['rows_seen']} rows ({data_file}: {offset} bytes)")
+    
+    return state
+
+def main():
+    parser = argparse.ArgumentParser(description="Train and export the behavior classifier")
+    parser.add_argument('data_files', nargs='*', default=[DATA_FILE])
+    parser.add_argument('--streaming', action='store_true',
+                        help="Train incrementally with partial_fit instead of refitting from scratch")
+    parser.add_argument('--chunksize', type=int, default=50_000)
+    parser.add_argument('--checkpoint', default=STREAMING_CHECKPOINT)
+    parser.add_argument('--dedupe', action='store_true',
+                        help="Drop near-duplicate messages with identical labels before training (full mode only)")
+    args = parser.parse_args()
+    
+    # Create model directory if it doesn't exist
+    os.makedirs('model', exist_ok=True)
+    
+    if args.streaming:
+        state = train_streaming(args.data_files, args.chunksize, args.checkpoint)
+        pipeline = Pipeline([('vectorizer', state['vectorizer']), ('classifier', state['classifier'])])
+        joblib.dump(pipeline, STREAMING_MODEL_PATH)
+        joblib.dump(state['label_encoders'], STREAMING_ENCODERS_PATH)
+    else:
+        train_full(args.data_files, args.dedupe)
+    
+    print("Model and components exported successfully to 'model' directory")
 
-print("Model and components exported successfully to 'model' directory") 
\ No newline at end of file
+if __name__ == '__main__':
+    main()
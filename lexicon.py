@@ -0,0 +1,198 @@
+"""
+Shared phrase lexicon for the rule-based analyzers.
+
+Every phrase list used by process_messages.py, export_model.py and the
+ML server lives here and is compiled into a single Aho-Corasick automaton,
+so a message is scanned once no matter how many phrases we look for.
+"""
+import hashlib
+import json
+from collections import deque
+
+
+# process_messages.analyze_message rules, checked in this order
+MESSAGE_RULES = {
+    'friend_threat': ["kill", "death", "die", "hurt"],
+    'stalking': ["outside your place", "been watching", "following you", "saw you at", "make sure you're okay"],
+    'control': ["shouldn't", "can't handle", "know what's best", "must", "have to", "walk home alone", "shouldn't walk"],
+    'threat': ["kill", "death", "die", "hurt", "regret it", "you'll regret"],
+    'manipulation': [
+        "your fault", "making me", "because of you", "no one else will", "no one will",
+        "if you just", "wouldn't be having", "imagining things", "make me the bad",
+        "always make me", "you always", "you're just", "you never"
+    ],
+    'location': ["where are you", "why aren't you", "when will you", "why did you"],
+}
+
+# export_model.py feature and severity lists
+FRIENDLY_PATTERNS = [
+    'movie night', 'lunch', 'checking in', 'hope', 'sending love', 'let me know',
+    'want to talk', 'doing okay', '💛', 'gentle', 'talk', 'chat'
+]
+
+CONCERNING_PATTERNS = {
+    'Gaslighting': [
+        'imagining things', 'overreacting', 'too sensitive', 'making things up',
+        'always make me', 'your fault', 'being dramatic'
+    ],
+    'Coercive Control': [
+        'should listen', 'have to', 'must', 'need to', 'make you', 'your own good',
+        'know what\'s best', 'can\'t handle', 'lucky I even'
+    ],
+    'Stalking': [
+        'been outside', 'watching you', 'following', 'saw you at', 'noticed you',
+        'been around', 'where are you', 'who were you with'
+    ],
+    'Verbal Threats': [
+        'regret', 'threat', 'warning', 'careful', 'sorry if', 'what happens',
+        'no one else', 'won\'t believe'
+    ]
+}
+
+EMOTIONAL_STATES = {
+    'Neutral': ['checking in', 'movie night', 'lunch', 'chat', 'talk'],
+    'Concerned': ['hope you\'re okay', 'worried', 'care about'],
+    'Anxious': ['should', 'have to', 'need to', 'careful'],
+    'Fearful': ['threat', 'warning', 'regret', 'scared'],
+    'Manipulated': ['your fault', 'making me', 'because of you'],
+    'Distressed': ['always', 'never', 'every time', 'everyone']
+}
+
+SEVERITY_TIERS = {
+    'high': ['threat', 'regret', 'warning', 'never', 'always', 'must', 'have to'],
+    'medium': ['should', 'need to', 'careful', 'watching', 'following'],
+    'low': ['hope', 'chat', 'talk', 'checking in', 'movie', 'lunch'],
+}
+
+# safeguard/ml_server/app.py keyword lists
+SERVER_KEYWORDS = {
+    'threats': ['kill', 'hurt', 'harm', 'die', 'death'],
+    'stalking': ['following', 'watching', 'where are you', 'saw you', 'found you'],
+    'obsession': ['always', 'never', 'every time', 'constantly', 'forever'],
+}
+
+
+def _categories():
+    """
+    Flatten all phrase lists into {category: phrases}.
+
+    Category names are prefixed with the list they came from, e.g.
+    'rule:stalking', 'concerning:Gaslighting' or 'server:threats'.
+    """
+    categories = {'friendly': FRIENDLY_PATTERNS}
+    sources = [
+        ('rule', MESSAGE_RULES),
+        ('concerning', CONCERNING_PATTERNS),
+        ('emotion', EMOTIONAL_STATES),
+        ('severity', SEVERITY_TIERS),
+        ('server', SERVER_KEYWORDS),
+    ]
+    for prefix, lists in sources:
+        for name, phrases in lists.items():
+            categories[f'{prefix}:{name}'] = phrases
+    return categories
+
+
+class PhraseMatcher:
+    """
+    Aho-Corasick automaton over a set of categorized phrases.
+
+    Phrases are matched as plain substrings, so a category's count equals
+    sum(1 for p in phrases if p in text) for the same lowercased text.
+    """
+
+    def __init__(self, categories):
+        self.categories = {name: list(phrases) for name, phrases in categories.items()}
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        # phrase id -> category names, one entry per occurrence in a list
+        self._tags = []
+        phrase_ids = {}
+
+        for name, phrases in self.categories.items():
+            for phrase in phrases:
+                if phrase not in phrase_ids:
+                    phrase_ids[phrase] = len(self._tags)
+                    self._tags.append([])
+                    self._insert(phrase, phrase_ids[phrase])
+                self._tags[phrase_ids[phrase]].append(name)
+
+        self._build_failure_links()
+
+    def _insert(self, phrase, phrase_id):
+        state = 0
+        for char in phrase:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = nxt
+        self._output[state].append(phrase_id)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(char, 0)
+                # Inherit matches that end at the failure state
+                self._output[nxt] = self._output[nxt] + self._output[self._fail[nxt]]
+
+    def phrases(self, text):
+        """
+        Find every distinct phrase occurring in text.
+
+        Args:
+            text (str): Already lowercased text
+
+        Returns:
+            set: Ids of the matched phrases
+        """
+        goto, fail, output = self._goto, self._fail, self._output
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+    def scan(self, text):
+        """
+        Scan text once and count matching phrases per category.
+
+        Args:
+            text (str): Message text
+
+        Returns:
+            dict: Category name -> number of its phrases found in text.
+                Categories without hits are omitted.
+        """
+        counts = {}
+        for phrase_id in self.phrases(str(text).lower()):
+            for name in self._tags[phrase_id]:
+                counts[name] = counts.get(name, 0) + 1
+        return counts
+
+
+MATCHER = PhraseMatcher(_categories())
+
+# Changes whenever any phrase list changes, so cached or stored results can be invalidated
+RULESET_VERSION = hashlib.sha256(
+    json.dumps(_categories(), sort_keys=True, ensure_ascii=False).encode()
+).hexdigest()[:12]
+
+
+def scan(text):
+    """Count phrase hits per category for text using the shared automaton."""
+    return MATCHER.scan(text)
@@ -0,0 +1,330 @@
+"""
+Near-duplicate index for message text.
+
+Abusive conversations repeat themselves: "where are you??", "where are
+you???", "WHERE ARE YOU" and copy-pasted threats. The index groups such
+messages into clusters so a result computed for one can be reused for
+the rest, the dashboard can show how often a pattern repeats, and
+export_model.py can drop repeated rows from the training data.
+
+Messages are normalized (lowercased, punctuation and repeated letters
+collapsed) and fingerprinted with a 64-bit SimHash over word unigrams and
+bigrams. Two messages are near-duplicates when their fingerprints differ
+in at most max_distance bits. Fingerprints are split into
+max_distance + 1 bands, and by the pigeonhole principle a near-duplicate
+shares at least one whole band, so a lookup only compares against the
+entries found in those bands' buckets.
+
+Short messages carry little signal and one changed word can flip their
+meaning, so messages with fewer than min_tokens tokens only match exact
+normalized duplicates. Messages without any word characters (e.g. only
+emoji or punctuation) normalize to nothing and are never matched.
+
+Usage:
+    python neardup.py [--input text_messages_to_v.csv] [--output duplicate_clusters.json]
+"""
+import argparse
+import csv
+import hashlib
+import json
+import re
+import sys
+import threading
+from collections import OrderedDict
+
+INPUT_PATH = 'text_messages_to_v.csv'
+CLUSTERS_PATH = 'duplicate_clusters.json'
+TEXT_COLUMN = 'narrative_entry'
+
+BITS = 64
+MAX_DISTANCE = 3
+MIN_TOKENS = 5
+
+# Bumped whenever normalize() changes which messages match
+NORMALIZE_VERSION = 2
+
+# Words in any script; str patterns match Unicode word characters
+_TOKEN = re.compile(r"[\w']+")
+_REPEATS = re.compile(r'(.)\1{2,}')
+
+
+def normalize(text):
+    """Lowercased tokens with runs of 3+ repeated characters collapsed to 2."""
+    return _TOKEN.findall(_REPEATS.sub(r'\1\1', str(text).lower()))
+
+
+def _hash64(feature):
+    return int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), 'big')
+
+
+# Each byte value spread into 8 bit-counters of 32 bits, so one big-integer
+# addition per feature counts all 64 fingerprint bits at once
+_FIELD = 32
+_SPREAD = [sum((byte >> i & 1) << (_FIELD * i) for i in range(8)) for byte in range(256)]
+_FIELD_MASK = (1 << _FIELD) - 1
+
+
+def _spread(h):
+    spread = 0
+    for i in range(8):
+        spread |= _SPREAD[h >> (8 * i) & 0xFF] << (8 * _FIELD * i)
+    return spread
+
+
+def simhash(tokens):
+    """64-bit SimHash of a token list, weighting unigrams and bigrams equally."""
+    features = tokens + [f'{a} {b}' for a, b in zip(tokens, tokens[1:])]
+    counts = sum(_spread(_hash64(feature)) for feature in features)
+    # A bit is set when more than half of the features have it set
+    fingerprint = 0
+    for bit in range(BITS):
+        if (counts >> (_FIELD * bit) & _FIELD_MASK) * 2 > len(features):
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def rule_key(hits):
+    """Lookup key from lexicon.scan hits: matches must trigger the same categories."""
+    return tuple(sorted(hits))
+
+
+class NearDuplicateIndex:
+    """
+    Cluster messages by near-duplicate text and remember a result per cluster.
+
+    Args:
+        max_distance (int): Largest Hamming distance between fingerprints
+            of near-duplicates
+        min_tokens (int): Messages shorter than this only match exactly
+        max_clusters (int): Least recently matched clusters beyond this
+            are dropped; None keeps every cluster
+        max_examples (int): Distinct texts remembered per cluster
+
+    Lookups can be restricted to entries with the same `key`, e.g. the
+    rule hits of the message, so reuse never crosses a rule boundary.
+    """
+
+    def __init__(self, max_distance=MAX_DISTANCE, min_tokens=MIN_TOKENS, max_clusters=None, max_examples=5):
+        self.max_distance = max_distance
+        self.min_tokens = min_tokens
+        self.max_clusters = max_clusters
+        self.max_examples = max_examples
+        self.bands = max_distance + 1
+        self.band_bits = BITS // self.bands
+        # cluster id -> cluster dict, least recently matched first
+        self.clusters = OrderedDict()
+        # (key, normalized text) -> cluster id
+        self._exact = {}
+        # (band, band value, key) -> cluster ids
+        self._buckets = {}
+        self._next_id = 0
+        self.lookups = 0
+        self.exact_hits = 0
+        self.near_hits = 0
+        self._lock = threading.Lock()
+
+    def _band_keys(self, fingerprint, key):
+        mask = (1 << self.band_bits) - 1
+        return [(band, fingerprint >> (band * self.band_bits) & mask, key) for band in range(self.bands)]
+
+    def _find(self, normalized, tokens, key):
+        """(cluster id, distance, fingerprint); the fingerprint is only computed on an exact miss."""
+        cluster_id = self._exact.get((key, normalized))
+        if cluster_id is not None:
+            return cluster_id, 0, None
+        fingerprint = self._fingerprint(tokens)
+        if fingerprint is None:
+            return None, None, None
+        best, best_distance = None, None
+        for band_key in self._band_keys(fingerprint, key):
+            for candidate in self._buckets.get(band_key, ()):
+                distance = bin(fingerprint ^ self.clusters[candidate]['fingerprint']).count('1')
+                if distance <= self.max_distance and (best_distance is None or distance < best_distance):
+                    best, best_distance = candidate, distance
+        return best, best_distance, fingerprint
+
+    def _fingerprint(self, tokens):
+        return simhash(tokens) if len(tokens) >= self.min_tokens else None
+
+    def lookup(self, text, key=None):
+        """
+        Find the cluster of a near-duplicate of text.
+
+        Returns:
+            dict: The cluster ('id', 'text', 'count', 'result', ...), or None
+        """
+        tokens = normalize(text)
+        normalized = ' '.join(tokens)
+        with self._lock:
+            self.lookups += 1
+            if not tokens:
+                return None
+            cluster_id, distance, _ = self._find(normalized, tokens, key)
+            if cluster_id is None:
+                return None
+            if distance == 0:
+                self.exact_hits += 1
+            else:
+                self.near_hits += 1
+            self.clusters.move_to_end(cluster_id)
+            return self.clusters[cluster_id]
+
+    def add(self, text, result=None, key=None, sender=None):
+        """
+        Add a message, joining the cluster of a near-duplicate if there is one.
+
+        Returns:
+            dict: The cluster the message was added to, or None for a
+                message without tokens, which is not indexed
+        """
+        tokens = normalize(text)
+        if not tokens:
+            return None
+        normalized = ' '.join(tokens)
+        with self._lock:
+            cluster_id, _, fingerprint = self._find(normalized, tokens, key)
+            if cluster_id is None:
+                cluster_id = self._next_id
+                self._next_id += 1
+                self.clusters[cluster_id] = {
+                    'id': cluster_id,
+                    'text': str(text),
+                    'key': key,
+                    'fingerprint': fingerprint,
+                    'count': 0,
+                    'examples': [],
+                    'senders': {},
+                    'result': result,
+                    '_exact': [],
+                    '_bands': [],
+                }
+                if fingerprint is not None:
+                    for band_key in self._band_keys(fingerprint, key):
+                        self._buckets.setdefault(band_key, []).append(cluster_id)
+                        self.clusters[cluster_id]['_bands'].append(band_key)
+                self._evict()
+            cluster = self.clusters[cluster_id]
+            self.clusters.move_to_end(cluster_id)
+            cluster['count'] += 1
+            if (key, normalized) not in self._exact:
+                self._exact[(key, normalized)] = cluster_id
+                cluster['_exact'].append((key, normalized))
+            if len(cluster['examples']) < self.max_examples and str(text) not in cluster['examples']:
+                cluster['examples'].append(str(text))
+            if sender is not None:
+                cluster['senders'][sender] = cluster['senders'].get(sender, 0) + 1
+            return cluster
+
+    def _evict(self):
+        while self.max_clusters is not None and len(self.clusters) > self.max_clusters:
+            _, cluster = self.clusters.popitem(last=False)
+            for exact_key in cluster['_exact']:
+                del self._exact[exact_key]
+            for band_key in cluster['_bands']:
+                bucket = self._buckets[band_key]
+                bucket.remove(cluster['id'])
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def top_clusters(self, limit=50, min_count=2):
+        """Largest clusters first, without internal fields."""
+        with self._lock:
+            clusters = sorted((c for c in self.clusters.values() if c['count'] >= min_count),
+                              key=lambda c: -c['count'])[:limit]
+            return [
+                {'id': c['id'], 'text': c['text'], 'count': c['count'], 'examples': list(c['examples']),
+                 'senders': dict(c['senders'])}
+                for c in clusters
+            ]
+
+    def memory_bytes(self):
+        """Approximate memory held by the index, following containers one level deep."""
+        with self._lock:
+            size = sys.getsizeof(self.clusters) + sys.getsizeof(self._exact) + sys.getsizeof(self._buckets)
+            for cluster in self.clusters.values():
+                size += sys.getsizeof(cluster) + sum(sys.getsizeof(v) for v in cluster.values())
+                size += sum(sys.getsizeof(text) for text in cluster['examples'])
+            for (key, normalized), cluster_id in self._exact.items():
+                size += sys.getsizeof(normalized) + sys.getsizeof(cluster_id)
+            for band_key, bucket in self._buckets.items():
+                size += sys.getsizeof(band_key) + sys.getsizeof(bucket)
+            return size
+
+    def stats(self):
+        with self._lock:
+            hits = self.exact_hits + self.near_hits
+            return {
+                'clusters': len(self.clusters),
+                'lookups': self.lookups,
+                'exactHits': self.exact_hits,
+                'nearHits': self.near_hits,
+                'savedFraction': round(hits / self.lookups, 4) if self.lookups else 0.0,
+            }
+
+
+def cluster_ids(texts, max_distance=MAX_DISTANCE, min_tokens=MIN_TOKENS):
+    """
+    Cluster id for every text, in order; near-duplicates share an id.
+
+    Texts without tokens each get their own negative id.
+    """
+    index = NearDuplicateIndex(max_distance, min_tokens)
+    ids = []
+    for i, text in enumerate(texts):
+        cluster = index.add(text)
+        ids.append(cluster['id'] if cluster is not None else -(i + 1))
+    return ids
+
+
+def build_index(input_path, text_column=TEXT_COLUMN, sender_column='user_name', by_rules=True, **options):
+    """
+    Stream a CSV through the index the way an analysis run would see it.
+
+    Every row is looked up first, and only rows without a near-duplicate
+    would need inference, so stats()['savedFraction'] is the share of
+    inferences the index saves on this file.
+
+    Args:
+        by_rules (bool): Only match messages with the same lexicon hits,
+            as the ML server does
+    """
+    from lexicon import scan
+
+    index = NearDuplicateIndex(**options)
+    with open(input_path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            text = row[text_column]
+            key = rule_key(scan(text)) if by_rules else None
+            index.lookup(text, key)
+            index.add(text, key=key, sender=row.get(sender_column))
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find near-duplicate messages and report the savings")
+    parser.add_argument('--input', default=INPUT_PATH)
+    parser.add_argument('--output', default=CLUSTERS_PATH)
+    parser.add_argument('--column', default=TEXT_COLUMN)
+    parser.add_argument('--max-distance', type=int, default=MAX_DISTANCE)
+    parser.add_argument('--min-tokens', type=int, default=MIN_TOKENS)
+    parser.add_argument('--limit', type=int, default=100, help="Clusters written to the output")
+    parser.add_argument('--ignore-rules', action='store_true',
+                        help="Also match messages whose lexicon hits differ")
+    args = parser.parse_args()
+
+    index = build_index(args.input, args.column, by_rules=not args.ignore_rules,
+                        max_distance=args.max_distance, min_tokens=args.min_tokens)
+    stats = index.stats()
+    clusters = index.top_clusters(args.limit)
+    with open(args.output, 'w') as f:
+        json.dump({'stats': stats, 'clusters': clusters}, f, indent=2)
+
+    print(f"Messages: {stats['lookups']}")
+    print(f"Clusters: {stats['clusters']} ({len(clusters)} with repeats written to {args.output})")
+    print(f"Reused results: {stats['exactHits']} exact + {stats['nearHits']} near = "
+          f"{stats['savedFraction']:.1%} of inferences saved")
+    print(f"Index memory: {index.memory_bytes() / 1024:.1f} KiB")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,38 @@
+import hashlib
+import io
+import json
+import numbers
+import os
+import shutil
 import pandas as pd
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
+import joblib
+import sklearn
+from scipy.sparse import csr_matrix
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.feature_extraction.text import CountVectorizer, HashingVectorizer, TfidfVectorizer
 from sklearn.model_selection import train_test_split
+from timing import report, stage
 from config import (
     DATA_PATH, 
     MIN_DF, 
     MAX_DF, 
     NGRAM_RANGE,
     TEST_SIZE,
-    RANDOM_STATE
+    RANDOM_STATE,
+    TEXT_PROCESSING
 )
 
+FEATURE_CACHE_DIR = 'cache/features'
+CSR_ARRAYS = ['data', 'indices', 'indptr']
+
+# Tokenization shared by the TF-IDF vectorizer and the cached token counts
+ANALYZER_SETTINGS = {
+    'ngram_range': NGRAM_RANGE,
+    'strip_accents': 'unicode',
+    'lowercase': True,
+}
+
 def load_data():
     """
     Load the dataset from the specified path.
@@ -18,8 +40,11 @@ def load_data():
     Returns:
         pd.DataFrame: The loaded dataset
     """
+    if not DATA_PATH:
+        raise ValueError("DATA_PATH environment variable is not set")
     try:
-        df = pd.read_csv(DATA_PATH)
+        with stage('load'):
+            df = pd.read_csv(DATA_PATH)
         print(f"Successfully loaded {len(df)} records from {DATA_PATH}")
         return df
     except Exception as e:
@@ -36,17 +61,208 @@ def preprocess_text(df, text_column='message'):
     Returns:
         tuple: (X_vectorized, vectorizer)
     """
+    vectorizer = TfidfVectorizer(min_df=MIN_DF, max_df=MAX_DF, **ANALYZER_SETTINGS)
+    
+    with stage('vectorize'):
+        X = vectorizer.fit_transform(df[text_column])
+    print(f"Vectorized {X.shape[0]} messages with {X.shape[1]} features")
+    return X, vectorizer
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def feature_cache_key(path, text_column):
+    """
+    Cache key for the token counts of a file.
+    
+    Changes with the file contents, the text column, the tokenization
+    settings and the scikit-learn version, so stale counts are never reused.
+    """
+    settings = json.dumps(['counts', ANALYZER_SETTINGS, text_column, sklearn.__version__], sort_keys=True)
+    return hashlib.sha256(f'{_file_digest(path)}:{settings}'.encode()).hexdigest()[:16]
+
+def cached_counts(path, text_column='message', cache_dir=FEATURE_CACHE_DIR):
+    """
+    Token counts of a CSV file, vectorized once and then read from disk.
+    
+    Only the tokenization is fitted here: every term is kept and no IDF is
+    computed, since both depend on which rows are training rows. Put a
+    DocumentFrequencyFilter and a TfidfTransformer in the cross-validated
+    pipeline and combine them with tfidf_from_counts afterwards.
+    
+    The CSR arrays are saved as .npy files and memory-mapped on later
+    runs, so a cache hit skips reading the text, and worker processes
+    share the pages instead of copying the matrix.
+    
+    Args:
+        path (str): CSV file
+        text_column (str): Name of the column containing text data
+        cache_dir (str): Directory holding one subdirectory per cache key
+        
+    Returns:
+        tuple: (X, count_vectorizer, cache_hit)
+    """
+    with stage('cache key'):
+        entry = os.path.join(cache_dir, feature_cache_key(path, text_column))
+    if os.path.exists(os.path.join(entry, 'shape.json')):
+        with open(os.path.join(entry, 'shape.json')) as f:
+            shape = tuple(json.load(f))
+        with stage('cache load'):
+            arrays = [np.load(os.path.join(entry, f'{name}.npy'), mmap_mode='r') for name in CSR_ARRAYS]
+            X = csr_matrix(tuple(arrays), shape=shape, copy=False)
+            vectorizer = joblib.load(os.path.join(entry, 'vectorizer.joblib'))
+        return X, vectorizer, True
+    
+    with stage('load'):
+        df = pd.read_csv(path, usecols=[text_column])
+    vectorizer = CountVectorizer(**ANALYZER_SETTINGS)
+    with stage('vectorize'):
+        X = vectorizer.fit_transform(df[text_column].fillna('').astype(str)).tocsr()
+    print(f"Counted {X.shape[1]} terms in {X.shape[0]} messages")
+    
+    # Write to a temporary directory first so readers never see a partial entry
+    tmp_entry = f'{entry}.tmp{os.getpid()}'
+    os.makedirs(tmp_entry, exist_ok=True)
+    with stage('cache save'):
+        for name in CSR_ARRAYS:
+            np.save(os.path.join(tmp_entry, f'{name}.npy'), getattr(X, name))
+        joblib.dump(vectorizer, os.path.join(tmp_entry, 'vectorizer.joblib'))
+        with open(os.path.join(tmp_entry, 'shape.json'), 'w') as f:
+            json.dump(list(X.shape), f)
+    try:
+        os.replace(tmp_entry, entry)
+    except OSError:
+        # Another run filled the same entry first
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+    return X, vectorizer, False
+
+class DocumentFrequencyFilter(BaseEstimator, TransformerMixin):
+    """
+    Keep the count columns TfidfVectorizer(min_df, max_df) would keep.
+    
+    Fitted inside each cross-validation fold, so the vocabulary only
+    depends on that fold's training rows.
+    """
+    
+    def __init__(self, min_df=MIN_DF, max_df=MAX_DF):
+        self.min_df = min_df
+        self.max_df = max_df
+    
+    def fit(self, X, y=None):
+        n_docs = X.shape[0]
+        min_count = self.min_df if isinstance(self.min_df, numbers.Integral) else self.min_df * n_docs
+        max_count = self.max_df if isinstance(self.max_df, numbers.Integral) else self.max_df * n_docs
+        # Count matrices hold one entry per (row, term), so this counts rows
+        dfs = np.bincount(csr_matrix(X).indices, minlength=X.shape[1])
+        self.columns_ = np.flatnonzero((dfs >= min_count) & (dfs <= max_count))
+        return self
+    
+    def transform(self, X):
+        return X[:, self.columns_]
+
+def tfidf_from_counts(count_vectorizer, df_filter, tfidf_transformer):
+    """
+    The TfidfVectorizer equivalent to counts -> df_filter -> tfidf_transformer.
+    
+    Lets a pipeline searched on cached counts be exported with a plain
+    TfidfVectorizer step, as the server and compact_model.py expect.
+    """
+    terms = count_vectorizer.get_feature_names_out()[df_filter.columns_]
     vectorizer = TfidfVectorizer(
-        min_df=MIN_DF,
-        max_df=MAX_DF,
+        min_df=df_filter.min_df,
+        max_df=df_filter.max_df,
+        norm=tfidf_transformer.norm,
+        use_idf=tfidf_transformer.use_idf,
+        smooth_idf=tfidf_transformer.smooth_idf,
+        sublinear_tf=tfidf_transformer.sublinear_tf,
+        **ANALYZER_SETTINGS
+    )
+    vectorizer.vocabulary_ = {term: i for i, term in enumerate(terms)}
+    if tfidf_transformer.use_idf:
+        vectorizer.idf_ = tfidf_transformer.idf_
+    return vectorizer
+
+def _records(f):
+    """
+    Yield (record bytes, end offset) for the CSV records of a binary file.
+    
+    A record ends at a newline outside quotes; quoted fields may span lines.
+    """
+    record = []
+    in_quotes = False
+    for line in iter(f.readline, b''):
+        record.append(line)
+        if line.count(b'"') % 2:
+            in_quotes = not in_quotes
+        if not in_quotes:
+            yield b''.join(record), f.tell()
+            record = []
+    if record:
+        yield b''.join(record), f.tell()
+
+def csv_record_offset(path, records):
+    """Byte offset just after the header and the first `records` data records."""
+    with open(path, 'rb') as f:
+        offset = len(f.readline())
+        for i, (_, end) in enumerate(_records(f)):
+            if i == records:
+                break
+            offset = end
+    return offset
+
+def iter_chunks(path, chunksize, offset=0):
+    """
+    Read a CSV in chunks instead of loading it all at once.
+    
+    Resuming seeks straight to a byte offset returned with an earlier
+    chunk, so rows already consumed are never read again.
+    
+    Args:
+        path (str): CSV file with a header row
+        chunksize (int): Rows per chunk
+        offset (int): Byte offset to start at; 0 starts after the header
+        
+    Yields:
+        tuple: (pd.DataFrame chunk, byte offset just after the chunk)
+    """
+    with open(path, 'rb') as f:
+        header = f.readline()
+        if offset > os.path.getsize(path):
+            raise ValueError(f"{path} is shorter than the resume offset {offset}; it was rewritten")
+        if offset > len(header):
+            f.seek(offset)
+        records = []
+        end = f.tell()
+        for record, end in _records(f):
+            records.append(record)
+            if len(records) >= chunksize:
+                yield pd.read_csv(io.BytesIO(header + b''.join(records))), end
+                records = []
+        if records:
+            yield pd.read_csv(io.BytesIO(header + b''.join(records))), end
+
+def make_hashing_vectorizer(n_features=2 ** 20):
+    """
+    Stateless vectorizer for streaming training.
+    
+    Unlike TfidfVectorizer it has no vocabulary to fit, so any chunk can be
+    transformed on its own and new data never invalidates old features.
+    
+    Returns:
+        HashingVectorizer: Vectorizer using the TF-IDF text settings
+    """
+    return HashingVectorizer(
+        n_features=n_features,
         ngram_range=NGRAM_RANGE,
         strip_accents='unicode',
-        lowercase=True
+        lowercase=True,
+        alternate_sign=False,
+        norm='l2'
     )
-    
-    X = vectorizer.fit_transform(df[text_column])
-    print(f"Vectorized {X.shape[0]} messages with {X.shape[1]} features")
-    return X, vectorizer
 
 def split_dataset(X, y):
     """
@@ -81,10 +297,12 @@ def main():
     y = df['label'].values
     
     # Split dataset
-    X_train, X_test, y_train, y_test = split_dataset(X, y)
+    with stage('split'):
+        X_train, X_test, y_train, y_test = split_dataset(X, y)
     
     print(f"Training set size: {X_train.shape[0]}")
     print(f"Testing set size: {X_test.shape[0]}")
+    report()
     
     return X_train, X_test, y_train, y_test, vectorizer
 
@@ -1,108 +1,578 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
+from lexicon import MESSAGE_RULES, RULESET_VERSION, scan
+from timing import report, stage, timed_iter
+
+INPUT_PATH = 'text_messages_to_v.csv'
+OUTPUT_PATH = 'text_messages_to_v_analyzed.csv'
+INPUT_COLUMNS = ['time_stamp', 'user_name', 'narrative_entry']
+RESULT_COLUMNS = ['incident_type', 'user_emotional_state', 'severity_score', 'potential_crime']
+CATEGORICAL_COLUMNS = ['incident_type', 'user_emotional_state', 'potential_crime']
+# Row hashes in the incremental state's side file
+HASH_DTYPE = np.dtype('<u8')
+
+# Messages from this sender are treated as friendly unless explicitly threatening
+FRIEND_SENDER = "Sanya"
+
+NORMAL = {
+    "incident_type": "Normal Communication",
+    "user_emotional_state": "Neutral",
+    "severity_score": 1,
+    "potential_crime": "N"
+}
+
+FRIENDLY = {
+    "incident_type": "Friendly",
+    "user_emotional_state": "Neutral",
+    "severity_score": 1,
+    "potential_crime": "N"
+}
+
+DEATH_THREAT = {
+    "incident_type": "Death Threat",
+    "user_emotional_state": "Fearful",
+    "severity_score": 5,
+    "potential_crime": "Y"
+}
+
+# Rules for other senders, checked in order; phrases are in lexicon.MESSAGE_RULES
+RULE_OUTCOMES = [
+    # Stalking behavior
+    ('stalking', {
+        "incident_type": "Stalking",
+        "user_emotional_state": "Fearful",
+        "severity_score": 4,
+        "potential_crime": "Y"
+    }),
+    # Controlling behavior
+    ('control', {
+        "incident_type": "Coercive Control",
+        "user_emotional_state": "Manipulated",
+        "severity_score": 3,
+        "potential_crime": "N"
+    }),
+    # Death threats or extreme hostility
+    ('threat', DEATH_THREAT),
+    # Emotional manipulation
+    ('manipulation', {
+        "incident_type": "Emotional Manipulation",
+        "user_emotional_state": "Manipulated",
+        "severity_score": 3,
+        "potential_crime": "N"
+    }),
+    # Location monitoring
+    ('location', {
+        "incident_type": "Location Monitoring",
+        "user_emotional_state": "Concerned",
+        "severity_score": 2,
+        "potential_crime": "N"
+    }),
+]
+
+# Every outcome analyze_message can return, used for vectorized lookups
+OUTCOMES = [DEATH_THREAT, FRIENDLY] + [outcome for _, outcome in RULE_OUTCOMES] + [NORMAL]
+
+# Identifies the phrase lists and outcome table; stored with incremental
+# results so rows analyzed under older rules are detected and redone
+RULES_VERSION = hashlib.sha256(json.dumps(
+    [RULESET_VERSION, FRIEND_SENDER, [rule for rule, _ in RULE_OUTCOMES], OUTCOMES], sort_keys=True
+).encode()).hexdigest()[:12]
+
 
 def analyze_message(text, sender):
-    text = str(text).lower()
-    
-    # Initialize default values
-    incident_type = "Normal Communication"
-    emotional_state = "Neutral"
-    severity_score = 1
-    potential_crime = "N"
+    hits = scan(text)
 
     # If the sender is Sanya, treat as friendly unless explicitly threatening
-    if sender == "Sanya":
-        if any(word in text for word in ["kill", "death", "die", "hurt"]):
-            return {
-                "incident_type": "Death Threat",
-                "user_emotional_state": "Fearful",
-                "severity_score": 5,
-                "potential_crime": "Y"
-            }
-        else:
-            return {
-                "incident_type": "Friendly",
-                "user_emotional_state": "Neutral",
-                "severity_score": 1,
-                "potential_crime": "N"
-            }
+    if sender == FRIEND_SENDER:
+        if hits.get('rule:friend_threat'):
+            return dict(DEATH_THREAT)
+        return dict(FRIENDLY)
 
     # For other senders, analyze for concerning patterns
-    # Stalking behavior
-    if any(phrase in text for phrase in ["outside your place", "been watching", "following you", "saw you at", "make sure you're okay"]):
-        return {
-            "incident_type": "Stalking",
-            "user_emotional_state": "Fearful",
-            "severity_score": 4,
-            "potential_crime": "Y"
-        }
+    for rule, outcome in RULE_OUTCOMES:
+        if hits.get(f'rule:{rule}'):
+            return dict(outcome)
 
-    # Controlling behavior
-    if any(phrase in text for phrase in ["shouldn't", "can't handle", "know what's best", "must", "have to", "walk home alone", "shouldn't walk"]):
-        return {
-            "incident_type": "Coercive Control",
-            "user_emotional_state": "Manipulated",
-            "severity_score": 3,
-            "potential_crime": "N"
-        }
+    return dict(NORMAL)
 
-    # Death threats or extreme hostility
-    if any(word in text for word in ["kill", "death", "die", "hurt", "regret it", "you'll regret"]):
-        return {
-            "incident_type": "Death Threat",
-            "user_emotional_state": "Fearful",
-            "severity_score": 5,
-            "potential_crime": "Y"
-        }
 
-    # Emotional manipulation
-    if any(phrase in text for phrase in [
-        "your fault", "making me", "because of you", "no one else will", "no one will",
-        "if you just", "wouldn't be having", "imagining things", "make me the bad",
-        "always make me", "you always", "you're just", "you never"
-    ]):
-        return {
-            "incident_type": "Emotional Manipulation",
-            "user_emotional_state": "Manipulated",
-            "severity_score": 3,
-            "potential_crime": "N"
-        }
+def _contains_any(text, phrases):
+    pattern = '|'.join(re.escape(phrase) for phrase in phrases)
+    return text.str.contains(pattern, regex=True).to_numpy()
 
-    # Location monitoring
-    if any(phrase in text for phrase in ["where are you", "why aren't you", "when will you", "why did you"]):
-        return {
-            "incident_type": "Location Monitoring",
-            "user_emotional_state": "Concerned",
-            "severity_score": 2,
-            "potential_crime": "N"
-        }
-
-    return {
-        "incident_type": incident_type,
-        "user_emotional_state": emotional_state,
-        "severity_score": severity_score,
-        "potential_crime": potential_crime
+
+def classify_chunk(chunk):
+    """
+    Classify a chunk of messages with vectorized string operations.
+
+    Gives the same labels as calling analyze_message on every row.
+
+    Args:
+        chunk (pd.DataFrame): Rows with 'narrative_entry' and 'user_name'
+
+    Returns:
+        pd.DataFrame: The chunk with the four result columns added
+    """
+    text = chunk['narrative_entry'].astype(str).str.lower()
+    is_friend = (chunk['user_name'] == FRIEND_SENDER).to_numpy()
+
+    # The outcome only depends on the lowercased text and whether the sender
+    # is FRIEND_SENDER, so repeated messages are only matched once
+    codes, _ = pd.factorize(pd.Series(np.where(is_friend, '1', '0')) + text.to_numpy())
+    first = np.unique(codes, return_index=True)[1]
+    text, is_friend = text.iloc[first], is_friend[first]
+
+    conditions = [is_friend & _contains_any(text, MESSAGE_RULES['friend_threat']), is_friend]
+    for rule, _ in RULE_OUTCOMES:
+        conditions.append(_contains_any(text, MESSAGE_RULES[rule]))
+    # np.select picks the first matching condition, like the early returns above
+    outcome_index = np.select(conditions, np.arange(len(conditions)), default=len(OUTCOMES) - 1)[codes]
+
+    chunk = chunk.copy()
+    for column in RESULT_COLUMNS:
+        values = np.array([outcome[column] for outcome in OUTCOMES])
+        chunk[column] = values[outcome_index]
+    return chunk
+
+
+def _classify_timed(chunk):
+    with stage('classify'):
+        return classify_chunk(chunk)
+
+
+def _categorize(df):
+    """Use fixed categories so every chunk shares one Parquet schema."""
+    for column in CATEGORICAL_COLUMNS:
+        categories = sorted({outcome[column] for outcome in OUTCOMES})
+        df[column] = pd.Categorical(df[column], categories=categories)
+    return df
+
+
+def _parquet_schema(columns):
+    """
+    Arrow schema for analyzed chunks with these columns.
+
+    Input columns are read as text, so they are strings regardless of what
+    a chunk's values look like; pinning every column keeps all row groups
+    on one schema.
+    """
+    import pyarrow as pa
+
+    fields = []
+    for column in columns:
+        if column in CATEGORICAL_COLUMNS:
+            fields.append(pa.field(column, pa.dictionary(pa.int8(), pa.string())))
+        elif column == 'severity_score':
+            fields.append(pa.field(column, pa.int64()))
+        else:
+            fields.append(pa.field(column, pa.string()))
+    return pa.schema(fields)
+
+
+def _bounded_map(pool, fn, items, window):
+    """Like pool.map, but keeps at most `window` items in flight."""
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+class _ChunkWriter:
+    """Append analyzed chunks to a CSV or Parquet file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith('.parquet')
+        self._writer = None
+        self._first = True
+
+    def write(self, chunk):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, _parquet_schema(chunk.columns))
+            table = pa.Table.from_pandas(_categorize(chunk), schema=self._writer.schema, preserve_index=False)
+            self._writer.write_table(table)
+        else:
+            chunk.to_csv(self.path, mode='w' if self._first else 'a', header=self._first, index=False)
+        self._first = False
+
+    @property
+    def empty(self):
+        return self._first
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def process_in_batches(input_path, output_path, chunksize=100_000, workers=0):
+    """
+    Stream input_path through classify_chunk and write results incrementally.
+
+    Memory use is bounded by the chunk size (times the number of workers),
+    not by the size of the input.
+
+    Args:
+        input_path (str): CSV with time_stamp, user_name, narrative_entry
+        output_path (str): Output .csv or .parquet file
+        chunksize (int): Rows per chunk
+        workers (int): Worker processes; 0 classifies in this process
+
+    Returns:
+        dict: Column name -> Counter of result values
+    """
+    counters = {column: Counter() for column in RESULT_COLUMNS}
+    discard_state(output_path)
+    writer = _ChunkWriter(output_path)
+    chunks = _read_chunks(input_path, chunksize)
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers else None
+    try:
+        if pool:
+            # Time spent waiting for the workers, which includes reading ahead
+            results = timed_iter(_bounded_map(pool, classify_chunk, chunks, window=workers * 2), 'classify')
+        else:
+            results = map(_classify_timed, chunks)
+        for chunk in results:
+            _count_results(counters, chunk)
+            with stage('write'):
+                writer.write(chunk)
+    finally:
+        writer.close()
+        if pool:
+            pool.shutdown()
+    return counters
+
+
+def process_all(input_path, output_path):
+    """
+    Classify the whole file in memory, one row at a time.
+
+    Returns:
+        pd.DataFrame: The analyzed dataset
+    """
+    with stage('read'):
+        df = pd.read_csv(input_path)
+    with stage('classify'):
+        results = [analyze_message(text, sender) for text, sender in zip(df['narrative_entry'], df['user_name'])]
+        for column in RESULT_COLUMNS:
+            df[column] = [result[column] for result in results]
+    with stage('write'):
+        discard_state(output_path)
+        df.to_csv(output_path, index=False)
+    return df
+
+
+def row_hashes(df):
+    """Content hash of each row's input columns."""
+    keys = df[INPUT_COLUMNS[0]].astype(str)
+    for column in INPUT_COLUMNS[1:]:
+        keys = keys + '\x1f' + df[column].astype(str)
+    return [hashlib.sha1(key.encode('utf-8')).hexdigest()[:16] for key in keys]
+
+
+def _read_chunks(path, chunksize):
+    # Read everything as text, so values such as "+15551234" or "007" are
+    # written back unchanged and hashes match between the input and the output
+    return timed_iter(pd.read_csv(path, chunksize=chunksize, dtype=str, keep_default_na=False), 'read')
+
+
+def _state_path(output_path):
+    return f'{output_path}.state.json'
+
+
+def _hashes_path(output_path):
+    return f'{output_path}.hashes'
+
+
+def discard_state(output_path):
+    """
+    Forget the incremental state of an output that is about to be rewritten.
+
+    Without a state the next incremental run rebuilds, and readers that
+    tail the output (rollup.py, similarity.py) see no generation and start
+    over instead of resuming at a stale byte offset.
+    """
+    for path in (_state_path(output_path), _hashes_path(output_path)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _load_state(output_path):
+    """
+    Load the incremental state, or return (None, None, reason) if a rebuild is needed.
+
+    Returns:
+        tuple: (state, row hash Counter, reason)
+    """
+    try:
+        with open(_state_path(output_path)) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None, None, "no previous state"
+    if state.get('rules_version') != RULES_VERSION:
+        return None, None, f"rules changed ({state.get('rules_version')} -> {RULES_VERSION})"
+    if not os.path.exists(output_path) or os.path.getsize(output_path) != state.get('output_bytes'):
+        return None, None, "output file does not match the saved state"
+    if 'rows' in state:
+        # Older states kept the row hashes in the JSON itself
+        return state, Counter(state['rows']), None
+    hashes_path = _hashes_path(output_path)
+    if not os.path.exists(hashes_path) or os.path.getsize(hashes_path) != state.get('hash_bytes'):
+        return None, None, "row hashes do not match the saved state"
+    with stage('load state'):
+        known = Counter(format(h, '016x') for h in np.fromfile(hashes_path, dtype=HASH_DTYPE).tolist())
+    return state, known, None
+
+
+def _write_hashes(f, hashes):
+    np.array([int(h, 16) for h in hashes], dtype=HASH_DTYPE).tofile(f)
+
+
+def _save_state(output_path, hashes, watermark, generation, appended=None):
+    """
+    Save the state after a run.
+
+    The row hashes are a multiset, kept as 8 bytes per output row in a
+    side file. When the run only appended rows, pass their hashes as
+    appended, so only those are written instead of the whole history.
+    """
+    hashes_path = _hashes_path(output_path)
+    if appended is None:
+        with open(f'{hashes_path}.tmp', 'wb') as f:
+            _write_hashes(f, hashes.elements())
+        os.replace(f'{hashes_path}.tmp', hashes_path)
+    elif appended:
+        # A crash before the state is saved leaves hash_bytes mismatched,
+        # which forces a rebuild
+        with open(hashes_path, 'ab') as f:
+            _write_hashes(f, appended)
+    state = {
+        'rules_version': RULES_VERSION,
+        # Changes whenever the output is rewritten rather than appended to,
+        # so readers that tail the output (rollup.py) know to start over
+        'generation': generation,
+        'watermark': watermark,
+        'output_bytes': os.path.getsize(output_path),
+        'hash_bytes': os.path.getsize(hashes_path),
     }
+    tmp_path = f'{_state_path(output_path)}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, _state_path(output_path))
+
+
+def _max_timestamp(values, current):
+    values = [v for v in values if v]
+    latest = max(values) if values else None
+    if current is None or (latest is not None and latest > current):
+        return latest
+    return current
+
+
+def _count_results(counters, chunk):
+    for column in RESULT_COLUMNS:
+        counters[column].update(chunk[column].value_counts().to_dict())
+
+
+def _rebuild(input_path, output_path, chunksize, counters):
+    """Classify every row into a fresh output and return its row hashes and watermark."""
+    hashes = Counter()
+    watermark = None
+    tmp_path = f'{output_path}.tmp'
+    writer = _ChunkWriter(tmp_path)
+    for chunk in _read_chunks(input_path, chunksize):
+        with stage('hash'):
+            hashes.update(row_hashes(chunk))
+        watermark = _max_timestamp(chunk['time_stamp'], watermark)
+        chunk = _classify_timed(chunk)
+        _count_results(counters, chunk)
+        with stage('write'):
+            writer.write(chunk)
+    if writer.empty:
+        pd.DataFrame(columns=INPUT_COLUMNS + RESULT_COLUMNS).to_csv(tmp_path, index=False)
+    os.replace(tmp_path, output_path)
+    return hashes, watermark
+
+
+def process_incremental(input_path, output_path, chunksize=100_000):
+    """
+    Classify only rows that are new or changed since the last run.
+
+    The state file next to the output keeps a content hash per row, the
+    watermark (latest time_stamp processed) and the rules version. New rows
+    are appended to the output; if rows disappeared from the input (they
+    were edited or deleted) the output is rewritten without them, via a
+    temporary file. A missing or stale state, or a rules change, falls
+    back to a full rebuild.
+
+    Returns:
+        dict: Column name -> Counter of result values for the rows classified
+    """
+    if output_path.endswith('.parquet'):
+        raise ValueError("Incremental mode only supports CSV output")
+
+    counters = {column: Counter() for column in RESULT_COLUMNS}
+    state, known, reason = _load_state(output_path)
+    if state is None:
+        print(f"Full rebuild: {reason}")
+        hashes, watermark = _rebuild(input_path, output_path, chunksize, counters)
+        _save_state(output_path, hashes, watermark, os.urandom(8).hex())
+        return counters
+
+    watermark = state['watermark']
+    generation = state.get('generation')
+
+    # Classify rows beyond the known count of their hash into a side file
+    current = Counter()
+    new_path = f'{output_path}.new'
+    new_writer = _ChunkWriter(new_path)
+    new_hashes = []
+    new_rows = late_rows = 0
+    latest = watermark
+    for chunk in _read_chunks(input_path, chunksize):
+        with stage('hash'):
+            hashes = row_hashes(chunk)
+        is_new = []
+        for h in hashes:
+            current[h] += 1
+            is_new.append(current[h] > known[h])
+        fresh = chunk[is_new]
+        new_hashes.extend(h for h, new in zip(hashes, is_new) if new)
+        if len(fresh):
+            late_rows += int((fresh['time_stamp'] <= watermark).sum()) if watermark else 0
+            new_rows += len(fresh)
+            latest = _max_timestamp(fresh['time_stamp'], latest)
+            fresh = _classify_timed(fresh)
+            _count_results(counters, fresh)
+            with stage('write'):
+                new_writer.write(fresh)
+
+    removed = sum((known - current).values())
+    print(f"Incremental run: {new_rows} new or changed rows ({late_rows} at or before the "
+          f"watermark {watermark}), {removed} removed")
+
+    if removed:
+        # Rewrite: keep output rows still present in the input, then add the new ones
+        with stage('rewrite'):
+            tmp_path = f'{output_path}.tmp'
+            writer = _ChunkWriter(tmp_path)
+            kept = Counter()
+            for chunk in _read_chunks(output_path, chunksize):
+                keep = []
+                for h in row_hashes(chunk):
+                    kept[h] += 1
+                    keep.append(kept[h] <= current[h])
+                writer.write(chunk[keep])
+            if new_rows:
+                writer.write(pd.read_csv(new_path, dtype=str, keep_default_na=False))
+            if writer.empty:
+                pd.DataFrame(columns=INPUT_COLUMNS + RESULT_COLUMNS).to_csv(tmp_path, index=False)
+            os.replace(tmp_path, output_path)
+            generation = os.urandom(8).hex()
+    elif new_rows:
+        # Append the new rows without their header. A crash before the state
+        # is saved leaves the output size mismatched, which forces a rebuild.
+        with stage('append'), open(new_path, 'rb') as src, open(output_path, 'ab') as dst:
+            src.readline()
+            for block in iter(lambda: src.read(1 << 20), b''):
+                dst.write(block)
+            dst.flush()
+            os.fsync(dst.fileno())
+
+    if os.path.exists(new_path):
+        os.remove(new_path)
+    # A legacy state has no hash file to append to yet
+    appended = None if removed or 'rows' in state else new_hashes
+    _save_state(output_path, current, latest, generation, appended)
+    return counters
+
+
+def print_summary(counters):
+    """Print value counts for each result column from running counters."""
+    print("\nSummary of analysis:")
+    sections = [
+        ("Incident Types", 'incident_type'),
+        ("Emotional States", 'user_emotional_state'),
+        ("Severity Scores", 'severity_score'),
+        ("Potential Crimes", 'potential_crime'),
+    ]
+    for title, column in sections:
+        counts = pd.Series(counters[column], name='count', dtype='int64')
+        counts.index.name = column
+        if column == 'severity_score':
+            counts = counts.sort_index()
+        else:
+            counts = counts.sort_values(ascending=False)
+        print(f"\n{title}:")
+        print(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classify messages with the rule-based analyzer")
+    parser.add_argument('--input', default=INPUT_PATH)
+    parser.add_argument('--output', default=OUTPUT_PATH,
+                        help="Output file; a .parquet extension writes Parquet with categorical columns")
+    parser.add_argument('--batch', action='store_true',
+                        help="Stream the input in chunks instead of loading it all at once")
+    parser.add_argument('--chunksize', type=int, default=100_000)
+    parser.add_argument('--workers', type=int, default=0,
+                        help="Classify chunks across this many processes (batch mode only)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only classify rows that are new or changed since the last incremental run")
+    parser.add_argument('--rollup', metavar='PATH',
+                        help="Also bring this per-contact rollup index up to date (CSV output only)")
+    parser.add_argument('--escalations', metavar='PATH',
+                        help="Also write per-sender severity escalation alerts to this CSV (CSV output only)")
+    args = parser.parse_args()
+
+    if args.output.endswith('.parquet'):
+        csv_only = [flag for flag, value in (('--incremental', args.incremental), ('--rollup', args.rollup),
+                                             ('--escalations', args.escalations)) if value]
+        if csv_only:
+            parser.error(f"{', '.join(csv_only)} need a CSV --output, not Parquet")
+
+    if args.incremental:
+        counters = process_incremental(args.input, args.output, args.chunksize)
+    elif args.batch or args.output.endswith('.parquet'):
+        counters = process_in_batches(args.input, args.output, args.chunksize, args.workers)
+    else:
+        df = process_all(args.input, args.output)
+        counters = {column: Counter(df[column]) for column in RESULT_COLUMNS}
+
+    print(f"Analysis complete. Results saved to {args.output}")
+    print_summary(counters)
+
+    if args.rollup:
+        from rollup import update_rollup
+
+        with stage('rollup'):
+            rows_added, rebuilt = update_rollup(args.output, args.rollup)
+        print(f"\n{'Rebuilt' if rebuilt else 'Updated'} {args.rollup} with {rows_added} rows")
+
+    if args.escalations:
+        from escalation import scan_csv
+
+        with stage('escalations'):
+            stats = scan_csv(args.output, args.escalations).stats()
+        print(f"\n{stats['alerts']} escalation alerts written to {args.escalations}")
+
+    report()
+
 
-# Read the existing CSV file
-df = pd.read_csv('text_messages_to_v.csv')
-
-# Process each message and add new columns
-for index, row in df.iterrows():
-    analysis = analyze_message(row['narrative_entry'], row['user_name'])
-    df.at[index, 'incident_type'] = analysis['incident_type']
-    df.at[index, 'user_emotional_state'] = analysis['user_emotional_state']
-    df.at[index, 'severity_score'] = analysis['severity_score']
-    df.at[index, 'potential_crime'] = analysis['potential_crime']
-
-# Save the enriched dataset
-df.to_csv('text_messages_to_v_analyzed.csv', index=False)
-print("Analysis complete. Results saved to text_messages_to_v_analyzed.csv")
-print("\nSummary of analysis:")
-print("\nIncident Types:")
-print(df['incident_type'].value_counts())
-print("\nEmotional States:")
-print(df['user_emotional_state'].value_counts())
-print("\nSeverity Scores:")
-print(df['severity_score'].value_counts().sort_index())
-print("\nPotential Crimes:")
-print(df['potential_crime'].value_counts()) 
\ No newline at end of file
+if __name__ == '__main__':
+    main()
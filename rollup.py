@@ -0,0 +1,295 @@
+"""
+Per-contact rollup of the analyzed messages.
+
+Builds, once, the aggregates the dashboard pages otherwise compute in the
+browser from the whole analyzed CSV: incident-type counts, severity
+histogram and daily timeline, emotional-state distribution and the latest
+flagged messages for every user_name. The index remembers how far into
+the analyzed CSV it has read, so later runs only read appended rows.
+
+Usage:
+    python rollup.py [--input text_messages_to_v_analyzed.csv] [--output contact_rollup.json]
+"""
+import argparse
+import csv
+import heapq
+import io
+import json
+import os
+import threading
+
+ANALYZED_PATH = 'text_messages_to_v_analyzed.csv'
+ROLLUP_PATH = 'contact_rollup.json'
+
+# Columns written by process_messages.py, for analyzed CSVs without a header
+ANALYZED_COLUMNS = [
+    'time_stamp', 'user_name', 'narrative_entry', 'incident_type',
+    'user_emotional_state', 'severity_score', 'potential_crime',
+]
+
+# Latest flagged messages kept per contact
+MAX_FLAGGED = 50
+
+# Incident types that are not flagged
+UNFLAGGED_TYPES = {'normal communication', 'friendly', 'neutral'}
+
+
+def _new_contact():
+    return {
+        'total': 0,
+        'flagged': 0,
+        'maxSeverity': 0,
+        'incidentTypes': {},
+        'severity': {},
+        'emotionalStates': {},
+        'timeline': {},
+        'latestFlagged': [],
+    }
+
+
+def _increment(counts, key, amount=1):
+    counts[key] = counts.get(key, 0) + amount
+
+
+def _severity(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class ContactRollup:
+    """
+    Aggregates per user_name, updated one analyzed row at a time.
+
+    Memory per contact is bounded by the number of distinct labels, days
+    and MAX_FLAGGED, not by the number of messages.
+    """
+
+    def __init__(self, data=None):
+        data = data or {}
+        self.contacts = data.get('contacts', {})
+        self.source = data.get('source', {})
+        self._sequence = data.get('sequence', 0)
+
+    def add(self, row):
+        """Add one analyzed row (a dict with the analyzed CSV columns)."""
+        name = row.get('user_name') or ''
+        contact = self.contacts.setdefault(name, _new_contact())
+        severity = _severity(row.get('severity_score'))
+        incident = row.get('incident_type') or ''
+        timestamp = row.get('time_stamp') or ''
+
+        contact['total'] += 1
+        _increment(contact['incidentTypes'], incident)
+        _increment(contact['emotionalStates'], row.get('user_emotional_state') or '')
+        if severity is not None:
+            _increment(contact['severity'], str(severity))
+            contact['maxSeverity'] = max(contact['maxSeverity'], severity)
+
+        day = contact['timeline'].setdefault(timestamp[:10], {'count': 0, 'severitySum': 0, 'maxSeverity': 0})
+        day['count'] += 1
+        if severity is not None:
+            day['severitySum'] += severity
+            day['maxSeverity'] = max(day['maxSeverity'], severity)
+
+        if incident.lower() not in UNFLAGGED_TYPES or row.get('potential_crime') == 'Y':
+            contact['flagged'] += 1
+            # Min-heap on (time_stamp, sequence) keeps the latest MAX_FLAGGED
+            self._sequence += 1
+            entry = [timestamp, self._sequence, {
+                'time_stamp': timestamp,
+                'narrative_entry': row.get('narrative_entry'),
+                'incident_type': incident,
+                'user_emotional_state': row.get('user_emotional_state'),
+                'severity_score': severity,
+                'potential_crime': row.get('potential_crime'),
+            }]
+            if len(contact['latestFlagged']) < MAX_FLAGGED:
+                heapq.heappush(contact['latestFlagged'], entry)
+            else:
+                heapq.heappushpop(contact['latestFlagged'], entry)
+
+    def to_dict(self):
+        return {'contacts': self.contacts, 'source': self.source, 'sequence': self._sequence}
+
+
+def output_generation(analyzed_path):
+    """Generation of the analyzed CSV from process_messages' incremental state, if any."""
+    try:
+        with open(f'{analyzed_path}.state.json') as f:
+            return json.load(f).get('generation')
+    except (OSError, ValueError):
+        return None
+
+
+def update_rollup(analyzed_path=ANALYZED_PATH, rollup_path=ROLLUP_PATH):
+    """
+    Bring the rollup index up to date with the analyzed CSV.
+
+    Only rows appended since the last update are read, as long as
+    process_messages' incremental state shows the file was only appended
+    to. Otherwise the index is rebuilt from the whole file.
+
+    Returns:
+        tuple: (rows_added, rebuilt)
+    """
+    rollup = load_rollup(rollup_path)
+    generation = output_generation(analyzed_path)
+    size = os.path.getsize(analyzed_path)
+    source = rollup.source
+    resume = (
+        generation is not None
+        and source.get('path') == os.path.abspath(analyzed_path)
+        and source.get('generation') == generation
+        and source.get('offset', 0) <= size
+    )
+    if not resume:
+        rollup = ContactRollup()
+
+    rows_added = 0
+    with open(analyzed_path, 'rb') as f:
+        for row in iter_analyzed(f, source.get('offset', 0) if resume else 0):
+            rollup.add(row)
+            rows_added += 1
+        offset = f.tell()
+
+    rollup.source = {'path': os.path.abspath(analyzed_path), 'generation': generation, 'offset': offset}
+    save_rollup(rollup, rollup_path)
+    return rows_added, not resume
+
+
+def iter_analyzed(f, offset=0):
+    """
+    Rows of an analyzed CSV as dicts, with or without a header.
+
+    Args:
+        f: The CSV opened in binary mode
+        offset (int): Byte offset of a row to start reading at
+
+    Yields:
+        dict: Column name -> value. Once exhausted, f.tell() is the offset
+            to resume from when more rows are appended.
+    """
+    header = next(csv.reader([f.readline().decode('utf-8')]), [])
+    if 'user_name' in header:
+        columns = header
+    else:
+        columns = ANALYZED_COLUMNS
+        f.seek(0)
+    if offset:
+        f.seek(offset)
+    text = io.TextIOWrapper(f, encoding='utf-8', newline='')
+    for values in csv.reader(text):
+        # Skip blank lines and stray header rows from appended files
+        if values and values != columns:
+            yield dict(zip(columns, values))
+    # Leave f open for the caller
+    text.detach()
+
+
+def load_rollup(path=ROLLUP_PATH):
+    try:
+        with open(path) as f:
+            return ContactRollup(json.load(f))
+    except (OSError, ValueError):
+        return ContactRollup()
+
+
+def save_rollup(rollup, path=ROLLUP_PATH):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(rollup.to_dict(), f)
+    os.replace(tmp_path, path)
+
+
+def _page(items, offset, limit):
+    return {'total': len(items), 'offset': offset, 'limit': limit, 'items': items[offset:offset + limit]}
+
+
+def contact_list(rollup, offset=0, limit=50):
+    """Contacts ordered by number of flagged messages."""
+    contacts = sorted(rollup.contacts.items(), key=lambda item: (-item[1]['flagged'], item[0]))
+    return _page([
+        {'name': name, 'total': c['total'], 'flagged': c['flagged'], 'maxSeverity': c['maxSeverity']}
+        for name, c in contacts
+    ], offset, limit)
+
+
+def contact_summary(rollup, name):
+    """Counts and distributions for one contact, or None if unknown."""
+    contact = rollup.contacts.get(name)
+    if contact is None:
+        return None
+    return {
+        'name': name,
+        'total': contact['total'],
+        'flagged': contact['flagged'],
+        'maxSeverity': contact['maxSeverity'],
+        'incidentTypes': dict(sorted(contact['incidentTypes'].items(), key=lambda item: -item[1])),
+        'severityHistogram': {k: contact['severity'][k] for k in sorted(contact['severity'], key=int)},
+        'emotionalStates': dict(sorted(contact['emotionalStates'].items(), key=lambda item: -item[1])),
+        'days': len(contact['timeline']),
+    }
+
+
+def contact_timeline(rollup, name, offset=0, limit=90):
+    """Daily message counts and severities for one contact, oldest first."""
+    contact = rollup.contacts.get(name)
+    if contact is None:
+        return None
+    days = [
+        {
+            'date': date,
+            'count': day['count'],
+            'maxSeverity': day['maxSeverity'],
+            'meanSeverity': round(day['severitySum'] / day['count'], 2) if day['count'] else None,
+        }
+        for date, day in sorted(contact['timeline'].items())
+    ]
+    return _page(days, offset, limit)
+
+
+def contact_flagged(rollup, name, offset=0, limit=20):
+    """Latest flagged messages for one contact, newest first."""
+    contact = rollup.contacts.get(name)
+    if contact is None:
+        return None
+    messages = [entry[2] for entry in sorted(contact['latestFlagged'], reverse=True)]
+    return _page(messages, offset, limit)
+
+
+class RollupStore:
+    """Serve a rollup file, reloading it whenever it changes on disk."""
+
+    def __init__(self, path=ROLLUP_PATH):
+        self.path = path
+        self._mtime = None
+        self._rollup = ContactRollup()
+        self._lock = threading.Lock()
+
+    def get(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return self._rollup
+        with self._lock:
+            if mtime != self._mtime:
+                self._rollup = load_rollup(self.path)
+                self._mtime = mtime
+            return self._rollup
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or update the per-contact rollup index")
+    parser.add_argument('--input', default=ANALYZED_PATH)
+    parser.add_argument('--output', default=ROLLUP_PATH)
+    args = parser.parse_args()
+
+    rows_added, rebuilt = update_rollup(args.input, args.output)
+    action = "Rebuilt" if rebuilt else "Updated"
+    print(f"{action} {args.output} with {rows_added} rows")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,292 @@
+"""
+Message analysis shared by the Flask and ASGI front ends.
+
+Holds the models, the result cache and the cascade, and knows nothing
+about HTTP, so it can also be imported by process pool workers.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+# The phrase lexicon is shared with the offline scripts in the repo root
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, REPO_ROOT)
+from escalation import DAY, EscalationDetector, parse_timestamp
+from lexicon import RULESET_VERSION, scan
+from timing import stage
+from neardup import NORMALIZE_VERSION, NearDuplicateIndex, rule_key
+from rollup import RollupStore
+from cache import ResultCache, is_uncased, model_version
+from cascade import DEFAULT_SENTIMENT_MODEL, MODEL_DIR, Cascade, behavior_flags
+from registry import ModelRegistry, load_artifact
+
+SENTIMENT_MODEL = os.getenv('ML_SENTIMENT_MODEL', DEFAULT_SENTIMENT_MODEL)
+
+# Output columns of the behavior classifier trained by export_model.py
+CLASSIFIER_COLUMNS = ['incident_type', 'user_emotional_state', 'severity_score', 'potential_crime']
+
+def load_sentiment_model():
+    # Imported here so the server starts answering health checks immediately
+    from transformers import pipeline
+    return pipeline('sentiment-analysis', model=SENTIMENT_MODEL)
+
+# Models load when start() is called; /readyz reports when the ones /analyze
+# needs are available and the state of every other model
+registry = ModelRegistry()
+registry.register('sentiment', load_sentiment_model)
+registry.register('behavior_classifier', lambda: load_artifact(os.path.join(MODEL_DIR, 'behavior_classifier.joblib')),
+                  required=False)
+registry.register('label_encoders', lambda: load_artifact(os.path.join(MODEL_DIR, 'label_encoders.joblib')),
+                  required=False)
+
+# ML_COMPACT_MODEL=1 serves /classify from the NumPy export written by compact_model.py
+COMPACT_MODEL = os.getenv('ML_COMPACT_MODEL', '0') == '1'
+if COMPACT_MODEL:
+    from compact_model import CompactPredictor
+    registry.register('compact_classifier', lambda: CompactPredictor(os.path.join(MODEL_DIR, 'compact')),
+                      required=False)
+
+# ML_SIMILAR=1 serves /similar from the index built by `python similarity.py build`
+SIMILAR_ENABLED = os.getenv('ML_SIMILAR', '0') == '1'
+if SIMILAR_ENABLED:
+    from similarity import SimilarityIndex
+    registry.register('similarity_index', SimilarityIndex.load, required=False)
+_started = False
+
+def start(background=None):
+    """
+    Start loading the models, once per process.
+    
+    By default loading happens in the background unless ML_BLOCKING_LOAD=1,
+    e.g. for gunicorn --preload, whose forked workers then share the loaded
+    pages copy-on-write.
+    """
+    global _started
+    if _started:
+        return
+    _started = True
+    if background is None:
+        background = os.getenv('ML_BLOCKING_LOAD', '0') != '1'
+    registry.start(background=background)
+
+# Largest number of messages per sentiment pipeline call
+MAX_BATCH_SIZE = int(os.getenv('ML_MAX_BATCH_SIZE', '32'))
+
+# Cascade mode only runs the transformer for messages the cheaper tiers can't settle
+CASCADE_ENABLED = os.getenv('ML_CASCADE', '0') == '1'
+CASCADE_THRESHOLD = float(os.getenv('ML_CASCADE_THRESHOLD', '0.9'))
+cascade = Cascade(threshold=CASCADE_THRESHOLD, sentiment_model=SENTIMENT_MODEL) if CASCADE_ENABLED else None
+
+# ML_NEARDUP=1 reuses the result of an earlier near-duplicate message with the
+# same lexicon hits instead of running the models again
+NEARDUP_ENABLED = os.getenv('ML_NEARDUP', '0') == '1'
+NEARDUP_DISTANCE = int(os.getenv('ML_NEARDUP_DISTANCE', '3'))
+
+# Result cache keyed by message text and model version; ML_CACHE_SIZE=0 disables it.
+# Near-duplicate reuse returns approximate results, so its settings are part
+# of the version too
+CACHE_SIZE = int(os.getenv('ML_CACHE_SIZE', '10000'))
+# Messages differing only in case share an entry unless the sentiment model is cased
+CACHE_CASEFOLD = os.getenv('ML_CACHE_CASEFOLD', '1' if is_uncased(SENTIMENT_MODEL) else '0') == '1'
+MODEL_VERSION = model_version(
+    [os.path.join(MODEL_DIR, name) for name in os.listdir(MODEL_DIR) if name.endswith('.joblib')],
+    SENTIMENT_MODEL,
+    RULESET_VERSION,
+    CASCADE_ENABLED and CASCADE_THRESHOLD,
+    NEARDUP_ENABLED and (NEARDUP_DISTANCE, NORMALIZE_VERSION),
+    CACHE_CASEFOLD,
+)
+result_cache = ResultCache(
+    MODEL_VERSION,
+    max_entries=CACHE_SIZE,
+    ttl_seconds=float(os.getenv('ML_CACHE_TTL', '86400')),
+    path=os.getenv('ML_CACHE_PATH'),
+    casefold=CACHE_CASEFOLD,
+) if CACHE_SIZE else None
+
+neardup_index = NearDuplicateIndex(
+    max_distance=NEARDUP_DISTANCE,
+    max_clusters=int(os.getenv('ML_NEARDUP_MAX_CLUSTERS', '100000')),
+) if NEARDUP_ENABLED else None
+
+# Per-contact aggregates precomputed by rollup.py, reloaded when the file changes
+rollup_store = RollupStore(os.getenv('ML_ROLLUP_PATH', os.path.join(REPO_ROOT, 'contact_rollup.json')))
+
+# Per-sender escalation tracking for /analyze requests that name a sender
+escalation_detector = EscalationDetector(
+    window_seconds=float(os.getenv('ML_ESCALATION_WINDOW_DAYS', '7')) * DAY,
+    idle_seconds=float(os.getenv('ML_ESCALATION_IDLE_DAYS', '30')) * DAY,
+    max_senders=int(os.getenv('ML_ESCALATION_MAX_SENDERS', '1000000')),
+)
+
+def analyze_text(text, sentiment=None, hits=None):
+    # This is where you'll integrate your actual ML model
+    # For now, using a simple rule-based system combined with sentiment analysis
+    
+    # Analyze sentiment, unless it was already computed as part of a batch
+    if sentiment is None:
+        sentiment = registry.get('sentiment')(text)[0]
+    sentiment_score = sentiment['score']
+    
+    # Check for presence of concerning behaviors (keywords in lexicon.SERVER_KEYWORDS)
+    if hits is None:
+        hits = scan(text)
+    has_threats, has_stalking, has_obsession = behavior_flags(hits)
+    
+    # Calculate severity score (1-5)
+    severity = 1
+    if has_threats:
+        severity += 2
+    if has_stalking:
+        severity += 1
+    if has_obsession:
+        severity += 1
+    if sentiment['label'] == 'NEGATIVE' and sentiment_score > 0.8:
+        severity += 1
+    
+    # Determine receiver emotion
+    if has_threats:
+        emotion = 'Fear'
+    elif has_stalking:
+        emotion = 'Anxiety'
+    elif has_obsession:
+        emotion = 'Discomfort'
+    elif sentiment['label'] == 'NEGATIVE':
+        emotion = 'Distress'
+    else:
+        emotion = 'Neutral'
+    
+    # Determine perpetrator behavior
+    if has_threats:
+        behavior = 'Threatening'
+    elif has_stalking:
+        behavior = 'Stalking'
+    elif has_obsession:
+        behavior = 'Obsessive'
+    elif sentiment['label'] == 'NEGATIVE':
+        behavior = 'Hostile'
+    else:
+        behavior = 'Normal'
+    
+    return {
+        'isCrime': has_threats or (has_stalking and severity >= 3),
+        'severityScore': min(severity, 5),
+        'receiverEmotion': emotion,
+        'perpetratorBehavior': behavior
+    }
+
+def _analyze_uncached(texts):
+    with stage('rules'):
+        if cascade is not None:
+            hits, sentiments = cascade.resolve(texts)
+        else:
+            hits, sentiments = [scan(text) for text in texts], [None] * len(texts)
+    
+    pending = [i for i, sentiment in enumerate(sentiments) if sentiment is None]
+    sentiment_analyzer = registry.get('sentiment') if pending else None
+    for start in range(0, len(pending), MAX_BATCH_SIZE):
+        chunk = pending[start:start + MAX_BATCH_SIZE]
+        with stage('sentiment'):
+            batch = sentiment_analyzer([texts[i] for i in chunk])
+        for i, sentiment in zip(chunk, batch):
+            sentiments[i] = sentiment
+    with stage('scoring'):
+        return [analyze_text(*args) for args in zip(texts, sentiments, hits)]
+
+def _analyze_new(texts):
+    if neardup_index is None:
+        return _analyze_uncached(texts)
+    
+    with stage('neardup'):
+        keys = [rule_key(scan(text)) for text in texts]
+        clusters = [neardup_index.lookup(text, key) for text, key in zip(texts, keys)]
+    results = [cluster and cluster['result'] for cluster in clusters]
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        for i, result in zip(missing, _analyze_uncached([texts[i] for i in missing])):
+            results[i] = result
+    # Every message joins a cluster, so cluster sizes count repeats
+    for text, key, result in zip(texts, keys, results):
+        neardup_index.add(text, result, key)
+    return results
+
+def analyze_texts(texts):
+    """Analyze a list of messages with batched sentiment inference."""
+    if result_cache is None:
+        return _analyze_new(texts)
+    
+    with stage('cache'):
+        results = [result_cache.get(text) for text in texts]
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        computed = _analyze_new([texts[i] for i in missing])
+        for i, result in zip(missing, computed):
+            results[i] = result
+        result_cache.put_many([(texts[i], result) for i, result in zip(missing, computed)])
+    return results
+
+def classify_texts(texts):
+    """Predict the export_model.py labels for a list of messages."""
+    if COMPACT_MODEL:
+        with stage('classifier'):
+            return registry.get('compact_classifier').predict_labels(texts)
+    
+    classifier = registry.get('behavior_classifier')
+    label_encoders = registry.get('label_encoders')
+    with stage('classifier'):
+        predictions = np.asarray(classifier.predict(texts)).astype(int)
+    
+    columns = {}
+    for i, column in enumerate(CLASSIFIER_COLUMNS):
+        if column in label_encoders:
+            columns[column] = label_encoders[column].inverse_transform(predictions[:, i]).tolist()
+        else:
+            columns[column] = predictions[:, i].tolist()
+    return [
+        {column: columns[column][row] for column in CLASSIFIER_COLUMNS}
+        for row in range(len(texts))
+    ]
+
+def track_escalation(data, result):
+    """
+    Feed an /analyze result into the escalation detector.
+    
+    Returns the result with an 'escalation' entry when the request names a
+    sender, else the result unchanged. Cached results are never modified.
+    """
+    sender = data.get('sender')
+    if not isinstance(sender, str) or not sender:
+        return result
+    timestamp = parse_timestamp(data['timestamp']) if data.get('timestamp') else None
+    # A client clock ahead of ours must not hold the sender's window open
+    if timestamp is not None:
+        timestamp = min(timestamp, time.time())
+    escalation = escalation_detector.update(
+        sender, result['severityScore'], result['perpetratorBehavior'], timestamp)
+    return {**result, 'escalation': escalation}
+
+def similar_messages(text, k=10):
+    """The k indexed messages most similar to text, with their cosine scores."""
+    return registry.get('similarity_index').query(text, k)
+
+def parse_message(data):
+    """
+    Return (data['message'], None) if it is a string, else (None, error).
+    
+    Checked before a message joins a shared batch, where a bad one would
+    fail every other request in it.
+    """
+    if not isinstance(data, dict) or 'message' not in data:
+        return None, 'No message provided'
+    if not isinstance(data['message'], str):
+        return None, 'Expected "message" to be a string'
+    return data['message'], None
+
+def parse_messages(data):
+    """Return data['messages'] if it is a list of strings, else None."""
+    messages = data.get('messages') if isinstance(data, dict) else None
+    if not isinstance(messages, list) or not all(isinstance(m, str) for m in messages):
+        return None
+    return messages
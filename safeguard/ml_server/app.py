@@ -1,88 +1,219 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
-import joblib
-import numpy as np
-from transformers import pipeline
-import torch
+import os
+import sys
+import time
+
+# rollup and timing (which metrics imports) live in the repo root, so it has
+# to be on the path before they are imported
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import metrics
+import ndjson
+import rollup
+from batching import MicroBatcher
+from registry import ModelNotReady
+from analysis import (
+    MAX_BATCH_SIZE, SIMILAR_ENABLED, analyze_texts, cascade, classify_texts, parse_message,
+    parse_messages, escalation_detector, neardup_index, registry, result_cache, rollup_store,
+    similar_messages, start, track_escalation,
+)
+from timing import stage
 
 app = Flask(__name__)
 CORS(app)
 
-# Load your trained model here
-# model = joblib.load('your_model.pkl')
+start()
 
-# Initialize the sentiment analysis pipeline
-sentiment_analyzer = pipeline('sentiment-analysis')
+# Micro-batching of concurrent /analyze calls. The batches run on the
+# batcher's thread, where cProfile has to run to see them
+MAX_WAIT_MS = float(os.getenv('ML_MAX_WAIT_MS', '5'))
+batcher = MicroBatcher(metrics.profiler.wrap(analyze_texts, 'analyze-batch', modes=('cprofile',)),
+                       max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS)
 
-def analyze_text(text):
-    # This is where you'll integrate your actual ML model
-    # For now, using a simple rule-based system combined with sentiment analysis
-    
-    # Analyze sentiment
-    sentiment = sentiment_analyzer(text)[0]
-    sentiment_score = sentiment['score']
-    
-    # Define keywords for different behaviors
-    threatening_words = ['kill', 'hurt', 'harm', 'die', 'death']
-    stalking_words = ['following', 'watching', 'where are you', 'saw you', 'found you']
-    obsessive_words = ['always', 'never', 'every time', 'constantly', 'forever']
+# Profiling settings can be changed at runtime by callers sending this token
+ADMIN_TOKEN = os.getenv('ML_ADMIN_TOKEN')
+
+@app.before_request
+def start_request_timing():
+    g.request_started = time.perf_counter()
+    # In cprofile mode /analyze would only show the wait for the batcher
+    batched = request.endpoint == 'analyze' and metrics.profiler.mode == 'cprofile'
+    g.profile = None if batched else metrics.profiler.start()
+
+@app.teardown_request
+def finish_request_timing(exc):
+    if 'request_started' not in g:
+        return
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.endpoint_timings.observe(endpoint, time.perf_counter() - g.request_started)
+    metrics.profiler.finish(g.profile, endpoint)
+
+@app.route('/analyze', methods=['POST'])
+def analyze():
+    with stage('parse'):
+        data = request.get_json()
+    text, error = parse_message(data)
+    if error:
+        return jsonify({'error': error}), 400
     
-    # Check for presence of concerning behaviors
-    has_threats = any(word in text.lower() for word in threatening_words)
-    has_stalking = any(word in text.lower() for word in stalking_words)
-    has_obsession = any(word in text.lower() for word in obsessive_words)
+    result = batcher(text)
+    metrics.count_results([result])
+    with stage('serialize'):
+        return jsonify(track_escalation(data, result))
+
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
+    with stage('parse'):
+        messages = parse_messages(request.get_json())
+    if messages is None:
+        return jsonify({'error': 'Expected "messages" to be a list of strings'}), 400
     
-    # Calculate severity score (1-5)
-    severity = 1
-    if has_threats:
-        severity += 2
-    if has_stalking:
-        severity += 1
-    if has_obsession:
-        severity += 1
-    if sentiment['label'] == 'NEGATIVE' and sentiment_score > 0.8:
-        severity += 1
+    results = analyze_texts(messages)
+    metrics.count_results(results)
+    with stage('serialize'):
+        return jsonify({'results': results})
+
+@app.route('/analyze/stream', methods=['POST'])
+def analyze_stream():
+    # Fail before the 200 goes out; later errors can only be reported per line
+    registry.get('sentiment')
+    batches = ndjson.iter_batches(ndjson.read_lines(request.stream), MAX_BATCH_SIZE)
     
-    # Determine receiver emotion
-    if has_threats:
-        emotion = 'Fear'
-    elif has_stalking:
-        emotion = 'Anxiety'
-    elif has_obsession:
-        emotion = 'Discomfort'
-    elif sentiment['label'] == 'NEGATIVE':
-        emotion = 'Distress'
-    else:
-        emotion = 'Neutral'
+    def generate():
+        # One batch is read, analyzed and written at a time
+        for batch in batches:
+            texts = ndjson.batch_texts(batch)
+            try:
+                results = analyze_texts(texts) if texts else []
+            except ModelNotReady as e:
+                yield b''.join(ndjson.output_lines(batch, error=str(e)))
+                continue
+            metrics.count_results(results)
+            with stage('serialize'):
+                lines = list(ndjson.output_lines(batch, results, track_escalation))
+            yield b''.join(lines)
     
-    # Determine perpetrator behavior
-    if has_threats:
-        behavior = 'Threatening'
-    elif has_stalking:
-        behavior = 'Stalking'
-    elif has_obsession:
-        behavior = 'Obsessive'
-    elif sentiment['label'] == 'NEGATIVE':
-        behavior = 'Hostile'
-    else:
-        behavior = 'Normal'
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/classify', methods=['POST'])
+def classify():
+    with stage('parse'):
+        messages = parse_messages(request.get_json())
+    if messages is None:
+        return jsonify({'error': 'Expected "messages" to be a list of strings'}), 400
     
-    return {
-        'isCrime': has_threats or (has_stalking and severity >= 3),
-        'severityScore': min(severity, 5),
-        'receiverEmotion': emotion,
-        'perpetratorBehavior': behavior
-    }
+    results = classify_texts(messages)
+    with stage('serialize'):
+        return jsonify({'results': results})
 
-@app.route('/analyze', methods=['POST'])
-def analyze():
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    status = registry.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    extra = {'safeguard_escalation_senders': escalation_detector.stats()['senders']}
+    counters = {}
+    if result_cache is not None:
+        cache = result_cache.stats()
+        counters = {'safeguard_cache_hits_total': cache['hits'], 'safeguard_cache_misses_total': cache['misses']}
+    return Response(metrics.render(extra, counters), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/profile', methods=['GET', 'POST'])
+def admin_profile():
+    if not ADMIN_TOKEN or request.headers.get('X-Admin-Token') != ADMIN_TOKEN:
+        return jsonify({'error': 'Set ML_ADMIN_TOKEN and send it in X-Admin-Token'}), 403
+    if request.method == 'POST':
+        data = request.get_json() or {}
+        settings = metrics.profiler.settings()
+        try:
+            metrics.profiler.configure(
+                mode=data.get('mode', settings['mode']),
+                slow_ms=data.get('slowMs', settings['slowMs']),
+                sample_rate=data.get('sampleRate', settings['sampleRate']),
+                out_dir=settings['outDir'],
+                interval_ms=data.get('intervalMs', settings['intervalMs']),
+            )
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+    return jsonify(metrics.profiler.settings())
+
+@app.errorhandler(ModelNotReady)
+def model_not_ready(e):
+    return jsonify({'error': str(e)}), 503
+
+@app.route('/cascade/stats', methods=['GET'])
+def cascade_stats():
+    if cascade is None:
+        return jsonify({'error': 'Cascade mode is disabled; set ML_CASCADE=1'}), 404
+    return jsonify(cascade.stats())
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    if result_cache is None:
+        return jsonify({'error': 'Result cache is disabled; set ML_CACHE_SIZE'}), 404
+    return jsonify(result_cache.stats())
+
+@app.route('/similar', methods=['POST'])
+def similar():
+    if not SIMILAR_ENABLED:
+        return jsonify({'error': 'Similar-message search is disabled; set ML_SIMILAR=1'}), 404
     data = request.get_json()
-    if not data or 'message' not in data:
+    if not data or not isinstance(data.get('message'), str):
         return jsonify({'error': 'No message provided'}), 400
+    k = data.get('k', 10)
+    if not isinstance(k, int) or not 1 <= k <= 100:
+        return jsonify({'error': '"k" must be an integer from 1 to 100'}), 400
     
-    text = data['message']
-    result = analyze_text(text)
-    return jsonify(result)
+    return jsonify({'results': similar_messages(data['message'], k)})
+
+@app.route('/duplicates', methods=['GET'])
+def duplicates():
+    if neardup_index is None:
+        return jsonify({'error': 'Near-duplicate reuse is disabled; set ML_NEARDUP=1'}), 404
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    min_count = request.args.get('minCount', 2, type=int)
+    stats = dict(neardup_index.stats(), memoryBytes=neardup_index.memory_bytes())
+    return jsonify({'stats': stats, 'clusters': neardup_index.top_clusters(limit, min_count)})
+
+@app.route('/escalation/stats', methods=['GET'])
+def escalation_stats():
+    return jsonify(escalation_detector.stats())
+
+def _page_args():
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+    return offset, limit
+
+@app.route('/contacts', methods=['GET'])
+def contacts():
+    return jsonify(rollup.contact_list(rollup_store.get(), *_page_args()))
+
+@app.route('/contacts/<name>/summary', methods=['GET'])
+def contact_summary(name):
+    summary = rollup.contact_summary(rollup_store.get(), name)
+    if summary is None:
+        return jsonify({'error': f'Unknown contact {name!r}'}), 404
+    return jsonify(summary)
+
+@app.route('/contacts/<name>/timeline', methods=['GET'])
+def contact_timeline(name):
+    timeline = rollup.contact_timeline(rollup_store.get(), name, *_page_args())
+    if timeline is None:
+        return jsonify({'error': f'Unknown contact {name!r}'}), 404
+    return jsonify(timeline)
+
+@app.route('/contacts/<name>/flagged', methods=['GET'])
+def contact_flagged(name):
+    flagged = rollup.contact_flagged(rollup_store.get(), name, *_page_args())
+    if flagged is None:
+        return jsonify({'error': f'Unknown contact {name!r}'}), 404
+    return jsonify(flagged)
 
 if __name__ == '__main__':
-    app.run(port=5000, debug=True) 
\ No newline at end of file
+    app.run(port=int(os.getenv('ML_PORT', '5000')), debug=os.getenv('ML_DEBUG', '1') == '1') 
\ No newline at end of file
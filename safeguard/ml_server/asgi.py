@@ -0,0 +1,475 @@
+"""
+Production front end: async HTTP with a process pool for inference.
+
+The event loop only parses requests and waits on futures; analyze_texts
+and classify_texts run in a bounded pool of worker processes.
+
+By default workers are spawned and each loads its own copy of the models
+(the transformer, the forest's tree arrays and the TF-IDF vocabulary are
+all private to a worker). With ML_POOL_START=fork the models are loaded
+once in the server process before the workers are forked, and the
+workers share those pages copy-on-write; pages holding Python objects
+are still copied gradually as reference counts change, but the large
+tensor and array buffers stay shared.
+
+Run with:
+
+    uvicorn asgi:app --port 5000
+
+Settings:
+    ML_WORKERS      worker processes (default: all cores)
+    ML_MAX_PENDING  requests admitted at once before answering 429
+                    (default: 4 per worker)
+    ML_POOL_START   'spawn' (default) or 'fork', see above
+    ML_DEADLINE_MS  default per-request deadline; clients may ask for a
+                    shorter one with the X-Request-Deadline-Ms header
+                    (on /analyze/stream it applies to each batch)
+    ML_STREAM_INFLIGHT  batches of one /analyze/stream request analyzed at
+                    once (default: 2)
+    ML_PROFILE      'stacks' or 'cprofile' profiles slow calls inside the
+                    workers (see metrics.py), with ML_PROFILE_SLOW_MS,
+                    ML_PROFILE_SAMPLE_RATE and ML_PROFILE_DIR
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+import analysis
+import metrics
+import ndjson
+import rollup
+from registry import ModelNotReady
+from timing import stage, timings
+
+WORKERS = int(os.getenv('ML_WORKERS', '0')) or os.cpu_count() or 1
+MAX_PENDING = int(os.getenv('ML_MAX_PENDING', '0')) or WORKERS * 4
+DEADLINE_MS = float(os.getenv('ML_DEADLINE_MS', '10000'))
+POOL_START = os.getenv('ML_POOL_START', 'spawn')
+STREAM_INFLIGHT = int(os.getenv('ML_STREAM_INFLIGHT', '2'))
+
+
+def _init_worker():
+    # Each worker loads its models before taking any work
+    analysis.start(background=False)
+
+
+def _worker_status():
+    return analysis.registry.status()
+
+
+# Cache lookups counted in this worker but not yet sent to the parent
+_reported_cache = {'hits': 0, 'misses': 0}
+
+
+def _drain_cache_counts():
+    if analysis.result_cache is None:
+        return None
+    stats = analysis.result_cache.stats()
+    counts = {key: stats[key] - reported for key, reported in _reported_cache.items()}
+    _reported_cache.update((key, stats[key]) for key in _reported_cache)
+    return counts
+
+
+def _run_timed(fn, *args):
+    # Ship the worker's stage timings and cache lookups back with each
+    # result, so /metrics in the parent covers every worker. ML_PROFILE also
+    # applies here: slow calls are profiled in the worker and dumped under
+    # its pid
+    result = metrics.profiler.wrap(fn, fn.__name__)(*args)
+    return result, (timings.drain(), _drain_cache_counts())
+
+
+# Cache lookups summed over every worker, for /metrics
+cache_counts = {'hits': 0, 'misses': 0}
+
+
+def _merge_worker_stats(worker_stats):
+    worker_timings, worker_cache = worker_stats
+    timings.merge(worker_timings)
+    for key, count in (worker_cache or {}).items():
+        cache_counts[key] += count
+
+
+def _worker_duplicates(limit, min_count):
+    index = analysis.neardup_index
+    stats = dict(index.stats(), memoryBytes=index.memory_bytes())
+    return {'stats': stats, 'clusters': index.top_clusters(limit, min_count)}
+
+
+class InferencePool:
+    """Process pool with admission control and per-call deadlines."""
+
+    def __init__(self, workers, max_pending, start_method='spawn'):
+        if start_method not in ('spawn', 'fork'):
+            raise ValueError("ML_POOL_START must be 'spawn' or 'fork'")
+        self.workers = workers
+        self.max_pending = max_pending
+        self.start_method = start_method
+        self.pending = 0
+        self.executor = None
+        # registry.status() of the current workers, once one has loaded
+        self.status = None
+
+    def start(self):
+        if self.start_method == 'fork':
+            # Load in this process first, before any model thread or
+            # inference has started, so the forked workers inherit the
+            # loaded models and _init_worker has nothing left to do
+            analysis.start(background=False)
+        # spawn, the default, keeps the event loop's threads out of the workers
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context(self.start_method),
+            initializer=_init_worker,
+        )
+        self.status = None
+        self._warm_up(self.executor)
+
+    def _warm_up(self, executor):
+        # Start every worker now rather than on the first requests. Each
+        # answer comes from a worker that has run its initializer, and
+        # readiness is then served from self.status without going through
+        # the admission-limited queue
+        def record(future):
+            if self.executor is executor and not future.cancelled() and future.exception() is None:
+                self.status = future.result()
+
+        try:
+            for _ in range(self.workers):
+                executor.submit(_worker_status).add_done_callback(record)
+        except BrokenProcessPool:
+            pass
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+
+    def _replace(self, broken):
+        """
+        Start a new executor after a worker died, e.g. OOM-killed while
+        loading the transformer. Calls failing on the same broken executor
+        only replace it once.
+        """
+        if self.executor is not broken:
+            return
+        broken.shutdown(wait=False, cancel_futures=True)
+        self.start()
+
+    def saturated(self):
+        return self.pending >= self.max_pending
+
+    async def run(self, fn, *args, deadline_ms):
+        """
+        Run fn(*args) in a worker, waiting at most deadline_ms.
+
+        The admission slot is held until the worker actually finishes, so
+        requests that time out still count against the queue bound. If the
+        pool is broken the call raises BrokenProcessPool and the pool is
+        replaced.
+        """
+        executor = self.executor
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._replace(executor)
+            raise
+        self.pending += 1
+
+        def release(_):
+            self.pending -= 1
+
+        loop = asyncio.get_running_loop()
+        future.add_done_callback(lambda f: loop.call_soon_threadsafe(release, f))
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), deadline_ms / 1000.0)
+        except asyncio.TimeoutError:
+            future.cancel()
+            raise
+        except BrokenProcessPool:
+            # This call fails, the next ones go to a fresh pool
+            self._replace(executor)
+            raise
+
+
+pool = InferencePool(WORKERS, MAX_PENDING, POOL_START)
+
+
+def _deadline_ms(request):
+    requested = request.headers.get('x-request-deadline-ms')
+    try:
+        return min(float(requested), DEADLINE_MS) if requested else DEADLINE_MS
+    except ValueError:
+        return DEADLINE_MS
+
+
+async def _dispatch(request, fn, *args):
+    if pool.saturated():
+        return JSONResponse({'error': 'Server is busy, try again shortly'}, status_code=429,
+                            headers={'Retry-After': '1'})
+    try:
+        result, worker_stats = await pool.run(_run_timed, fn, *args, deadline_ms=_deadline_ms(request))
+        _merge_worker_stats(worker_stats)
+        return result
+    except asyncio.TimeoutError:
+        return JSONResponse({'error': 'Deadline exceeded'}, status_code=504)
+    except (ModelNotReady, BrokenProcessPool) as e:
+        return JSONResponse({'error': str(e) or 'Worker pool unavailable'}, status_code=503)
+
+
+async def _json(request):
+    body = await request.body()
+    with stage('parse'):
+        try:
+            return json.loads(body)
+        except ValueError:
+            return None
+
+
+def _response(content):
+    with stage('serialize'):
+        return JSONResponse(content)
+
+
+async def analyze(request):
+    data = await _json(request)
+    text, error = analysis.parse_message(data)
+    if error:
+        return JSONResponse({'error': error}, status_code=400)
+
+    results = await _dispatch(request, analysis.analyze_texts, [text])
+    if isinstance(results, JSONResponse):
+        return results
+    metrics.count_results(results)
+    # Escalation state lives in this process, shared by all workers' results
+    return _response(analysis.track_escalation(data, results[0]))
+
+
+async def analyze_batch(request):
+    messages = analysis.parse_messages(await _json(request))
+    if messages is None:
+        return JSONResponse({'error': 'Expected "messages" to be a list of strings'}, status_code=400)
+
+    results = await _dispatch(request, analysis.analyze_texts, messages)
+    if isinstance(results, JSONResponse):
+        return results
+    metrics.count_results(results)
+    return _response({'results': results})
+
+
+async def _analyze_stream_batch(batch, deadline_ms):
+    """Encoded output lines for one batch of an /analyze/stream request."""
+    texts = ndjson.batch_texts(batch)
+    if not texts:
+        return b''.join(ndjson.output_lines(batch))
+    try:
+        results, worker_stats = await pool.run(_run_timed, analysis.analyze_texts, texts,
+                                               deadline_ms=deadline_ms)
+    except asyncio.TimeoutError:
+        return b''.join(ndjson.output_lines(batch, error='Deadline exceeded'))
+    except (ModelNotReady, BrokenProcessPool) as e:
+        return b''.join(ndjson.output_lines(batch, error=str(e) or 'Worker pool unavailable'))
+    _merge_worker_stats(worker_stats)
+    metrics.count_results(results)
+    with stage('serialize'):
+        return b''.join(ndjson.output_lines(batch, results, analysis.track_escalation))
+
+
+async def _stream_results(request, deadline_ms):
+    # Batches in flight, oldest first so results keep the input order. The
+    # body is only read while fewer than STREAM_INFLIGHT batches are
+    # pending, so a slow client or a busy pool pushes back on the sender.
+    pending = deque()
+    batch = []
+    number = 0
+    try:
+        async for line in ndjson.aiter_lines(request.stream()):
+            number += 1
+            entry = ndjson.parse_entry(number, line)
+            if entry is None:
+                continue
+            batch.append(entry)
+            if len(batch) < analysis.MAX_BATCH_SIZE:
+                continue
+            pending.append(asyncio.ensure_future(_analyze_stream_batch(batch, deadline_ms)))
+            batch = []
+            while pending and (pending[0].done() or len(pending) >= STREAM_INFLIGHT):
+                yield await pending.popleft()
+        if batch:
+            pending.append(asyncio.ensure_future(_analyze_stream_batch(batch, deadline_ms)))
+        while pending:
+            yield await pending.popleft()
+    finally:
+        # The client went away; workers finish what they started
+        for task in pending:
+            task.cancel()
+
+
+async def analyze_stream(request):
+    if pool.saturated():
+        return JSONResponse({'error': 'Server is busy, try again shortly'}, status_code=429,
+                            headers={'Retry-After': '1'})
+    return StreamingResponse(_stream_results(request, _deadline_ms(request)), media_type='application/x-ndjson')
+
+
+async def classify(request):
+    messages = analysis.parse_messages(await _json(request))
+    if messages is None:
+        return JSONResponse({'error': 'Expected "messages" to be a list of strings'}, status_code=400)
+
+    results = await _dispatch(request, analysis.classify_texts, messages)
+    if isinstance(results, JSONResponse):
+        return results
+    return _response({'results': results})
+
+
+async def healthz(request):
+    return JSONResponse({'status': 'ok', 'pending': pool.pending, 'maxPending': pool.max_pending})
+
+
+async def readyz(request):
+    # Reported by the workers once loaded, so a saturated pool still reads
+    # as ready instead of answering 429 or 504
+    status = pool.status
+    if status is None:
+        return JSONResponse({'ready': False, 'error': 'Workers are still loading', 'workers': pool.workers},
+                            status_code=503)
+    return JSONResponse(dict(status, workers=pool.workers), status_code=200 if status['ready'] else 503)
+
+
+async def similar(request):
+    if not analysis.SIMILAR_ENABLED:
+        return JSONResponse({'error': 'Similar-message search is disabled; set ML_SIMILAR=1'}, status_code=404)
+    data = await _json(request)
+    if not isinstance(data, dict) or not isinstance(data.get('message'), str):
+        return JSONResponse({'error': 'No message provided'}, status_code=400)
+    k = data.get('k', 10)
+    if not isinstance(k, int) or not 1 <= k <= 100:
+        return JSONResponse({'error': '"k" must be an integer from 1 to 100'}, status_code=400)
+
+    results = await _dispatch(request, analysis.similar_messages, data['message'], k)
+    if isinstance(results, JSONResponse):
+        return results
+    return JSONResponse({'results': results})
+
+
+async def duplicates(request):
+    if analysis.neardup_index is None:
+        return JSONResponse({'error': 'Near-duplicate reuse is disabled; set ML_NEARDUP=1'}, status_code=404)
+    try:
+        limit = min(max(int(request.query_params.get('limit', 50)), 1), 500)
+        min_count = int(request.query_params.get('minCount', 2))
+    except ValueError:
+        return JSONResponse({'error': 'limit and minCount must be integers'}, status_code=400)
+    # Each worker has its own index; this answers with one worker's view
+    result = await _dispatch(request, _worker_duplicates, limit, min_count)
+    if isinstance(result, JSONResponse):
+        return result
+    return JSONResponse(result)
+
+
+async def escalation_stats(request):
+    return JSONResponse(analysis.escalation_detector.stats())
+
+
+def _page_args(request):
+    try:
+        offset = max(int(request.query_params.get('offset', 0)), 0)
+        limit = min(max(int(request.query_params.get('limit', 50)), 1), 500)
+    except ValueError:
+        offset, limit = 0, 50
+    return offset, limit
+
+
+def _contact_response(name, result):
+    if result is None:
+        return JSONResponse({'error': f'Unknown contact {name!r}'}, status_code=404)
+    return JSONResponse(result)
+
+
+# Rollup reads are dictionary lookups, so they run on the event loop
+async def contacts(request):
+    return JSONResponse(rollup.contact_list(analysis.rollup_store.get(), *_page_args(request)))
+
+
+async def contact_summary(request):
+    name = request.path_params['name']
+    return _contact_response(name, rollup.contact_summary(analysis.rollup_store.get(), name))
+
+
+async def contact_timeline(request):
+    name = request.path_params['name']
+    return _contact_response(
+        name, rollup.contact_timeline(analysis.rollup_store.get(), name, *_page_args(request)))
+
+
+async def contact_flagged(request):
+    name = request.path_params['name']
+    return _contact_response(
+        name, rollup.contact_flagged(analysis.rollup_store.get(), name, *_page_args(request)))
+
+
+async def prometheus_metrics(request):
+    extra = {
+        'safeguard_pending_requests': pool.pending,
+        'safeguard_escalation_senders': analysis.escalation_detector.stats()['senders'],
+    }
+    counters = {}
+    if analysis.result_cache is not None:
+        # Each worker has its own cache; these are lookups summed over all of them
+        counters = {'safeguard_cache_hits_total': cache_counts['hits'],
+                    'safeguard_cache_misses_total': cache_counts['misses']}
+    return PlainTextResponse(metrics.render(extra, counters), media_type='text/plain; version=0.0.4')
+
+
+def _timed(endpoint, handler):
+    async def timed(request):
+        started = time.perf_counter()
+        try:
+            return await handler(request)
+        finally:
+            metrics.endpoint_timings.observe(endpoint, time.perf_counter() - started)
+    return timed
+
+
+async def warm_up():
+    pool.start()
+
+
+app = Starlette(
+    routes=[
+        Route('/analyze', _timed('/analyze', analyze), methods=['POST']),
+        Route('/analyze/batch', _timed('/analyze/batch', analyze_batch), methods=['POST']),
+        Route('/analyze/stream', _timed('/analyze/stream', analyze_stream), methods=['POST']),
+        Route('/classify', _timed('/classify', classify), methods=['POST']),
+        Route('/healthz', _timed('/healthz', healthz), methods=['GET']),
+        Route('/readyz', _timed('/readyz', readyz), methods=['GET']),
+        Route('/similar', _timed('/similar', similar), methods=['POST']),
+        Route('/duplicates', _timed('/duplicates', duplicates), methods=['GET']),
+        Route('/escalation/stats', _timed('/escalation/stats', escalation_stats), methods=['GET']),
+        Route('/contacts', _timed('/contacts', contacts), methods=['GET']),
+        Route('/contacts/{name}/summary', _timed('/contacts/{name}/summary', contact_summary), methods=['GET']),
+        Route('/contacts/{name}/timeline', _timed('/contacts/{name}/timeline', contact_timeline), methods=['GET']),
+        Route('/contacts/{name}/flagged', _timed('/contacts/{name}/flagged', contact_flagged), methods=['GET']),
+        Route('/metrics', prometheus_metrics, methods=['GET']),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    on_startup=[warm_up],
+    on_shutdown=[pool.shutdown],
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(app, port=5000)
@@ -0,0 +1,67 @@
+"""
+Micro-batching for model inference.
+
+Concurrent callers each submit one item; a background thread groups
+whatever arrives within a short window into a single batched call.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Merge concurrent single-item calls into batched calls of `fn`.
+
+    Args:
+        fn: Function taking a list of items and returning a list of results
+            in the same order
+        max_batch_size (int): Largest batch passed to fn
+        max_wait_ms (float): How long the first item of a batch waits for
+            more items before the batch is run anyway
+    """
+
+    def __init__(self, fn, max_batch_size=32, max_wait_ms=5):
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """Queue an item and return a Future for its result."""
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item):
+        """Run fn on item as part of a batch and wait for its result."""
+        return self.submit(item).result()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+            try:
+                results = self.fn(items)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
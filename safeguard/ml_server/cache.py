@@ -0,0 +1,159 @@
+"""
+Content-addressed cache for analysis results.
+
+Entries are keyed by a hash of the normalized message text and the model
+version, so retraining or swapping a model invalidates old results.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_text(text, casefold=True):
+    """
+    Normalize text without changing its analysis.
+
+    Surrounding whitespace never affects the result. The keyword rules
+    lowercase text, so case only matters to the sentiment model: pass
+    casefold=False when it is cased.
+    """
+    text = str(text).strip()
+    return text.lower() if casefold else text
+
+
+def is_uncased(model_name):
+    """Whether a Hugging Face model name marks the model as uncased."""
+    return 'uncased' in model_name.lower()
+
+
+def model_version(paths, *extra):
+    """
+    Fingerprint a set of model artifacts.
+
+    Args:
+        paths (list): Artifact files; missing files are skipped
+        *extra: Any other values that change results (model names, settings)
+
+    Returns:
+        str: Short hex digest
+    """
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        if os.path.exists(path):
+            stat = os.stat(path)
+            digest.update(f'{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}'.encode())
+    for value in extra:
+        digest.update(repr(value).encode())
+    return digest.hexdigest()[:16]
+
+
+class ResultCache:
+    """
+    Bounded LRU cache with a TTL and optional SQLite persistence.
+
+    Args:
+        version (str): Model version mixed into every key
+        max_entries (int): In-memory capacity
+        ttl_seconds (float): Entry lifetime; 0 keeps entries until evicted
+        path (str): SQLite file to persist entries across restarts
+        casefold (bool): Treat messages differing only in case as the same;
+            only safe when every model behind the results is uncased
+    """
+
+    def __init__(self, version, max_entries=10000, ttl_seconds=86400, path=None, casefold=True):
+        self.version = version
+        self.casefold = casefold
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_hits = 0
+        self._db = None
+        if path:
+            self._open(path)
+
+    def _open(self, path):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS results '
+            '(key TEXT PRIMARY KEY, version TEXT, value TEXT, created REAL)'
+        )
+        # Drop rows from other model versions or past their TTL
+        self._db.execute('DELETE FROM results WHERE version != ?', (self.version,))
+        if self.ttl:
+            self._db.execute('DELETE FROM results WHERE created < ?', (time.time() - self.ttl,))
+        self._db.commit()
+
+    def key(self, text):
+        return hashlib.sha256(f'{self.version}\0{normalize_text(text, self.casefold)}'.encode()).hexdigest()
+
+    def _expired(self, created):
+        return self.ttl and time.time() - created > self.ttl
+
+    def get(self, text):
+        """Return the cached result for text, or None."""
+        key = self.key(text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[1]):
+                del self._entries[key]
+                self.evictions += 1
+                entry = None
+            if entry is None and self._db is not None:
+                row = self._db.execute('SELECT value, created FROM results WHERE key = ?', (key,)).fetchone()
+                if row and not self._expired(row[1]):
+                    entry = (json.loads(row[0]), row[1])
+                    self._store(key, entry)
+                    self.disk_hits += 1
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[0])
+
+    def put(self, text, result):
+        """Cache result for text."""
+        self.put_many([(text, result)])
+
+    def put_many(self, items):
+        """Cache (text, result) pairs, persisting them in one transaction."""
+        now = time.time()
+        rows = [(self.key(text), dict(result)) for text, result in items]
+        with self._lock:
+            for key, result in rows:
+                self._store(key, (result, now))
+            if self._db is not None and rows:
+                self._db.executemany(
+                    'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+                    [(key, self.version, json.dumps(result), now) for key, result in rows],
+                )
+                self._db.commit()
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'version': self.version,
+                'size': len(self._entries),
+                'maxEntries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'diskHits': self.disk_hits,
+                'evictions': self.evictions,
+                'hitRate': self.hits / lookups if lookups else 0.0,
+            }
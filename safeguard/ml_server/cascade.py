@@ -0,0 +1,181 @@
+"""
+Tiered cascade inference for analyze_text.
+
+Messages are resolved by the cheapest tier that can do so confidently:
+
+1. rules: keyword hits already fix every output field
+2. linear: a TF-IDF + logistic regression sentiment scorer is confident
+3. transformer: everything else goes to the sentiment pipeline
+
+Fit the linear scorer from messages labelled by the transformer with:
+
+    python cascade.py fit ../public/text_messages_to_v_analyzed.csv
+"""
+import argparse
+import os
+import sys
+import threading
+from collections import Counter
+
+import joblib
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from lexicon import scan
+from rollup import iter_analyzed
+
+MODEL_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', 'model'))
+VECTORIZER_PATH = os.path.join(MODEL_DIR, 'tfidf_vectorizer.joblib')
+SCORER_PATH = os.path.join(MODEL_DIR, 'sentiment_linear.joblib')
+
+TIERS = ['rules', 'linear', 'transformer']
+
+# Stand-in sentiment for messages the rules decide on their own
+RULES_DECISIVE = {'label': 'NEUTRAL', 'score': 0.0}
+
+# pipeline('sentiment-analysis') default, which scorers without a recorded model were fitted on
+DEFAULT_SENTIMENT_MODEL = 'distilbert-base-uncased-finetuned-sst-2-english'
+
+
+def behavior_flags(hits):
+    """Return (has_threats, has_stalking, has_obsession) from lexicon hits."""
+    return (
+        bool(hits.get('server:threats')),
+        bool(hits.get('server:stalking')),
+        bool(hits.get('server:obsession')),
+    )
+
+
+def rule_severity(hits):
+    """Severity from keyword hits alone, before any sentiment bonus."""
+    has_threats, has_stalking, has_obsession = behavior_flags(hits)
+    return 1 + 2 * has_threats + has_stalking + has_obsession
+
+
+class Cascade:
+    """
+    Decide which messages still need the transformer.
+
+    Args:
+        threshold (float): Minimum linear-scorer confidence to accept its label
+        scorer_path (str): Joblib file written by `python cascade.py fit`;
+            the linear tier is skipped when it does not exist
+        sentiment_model (str): Model served by the transformer tier; the
+            linear tier is also skipped when the scorer was distilled from
+            a different one
+    """
+
+    def __init__(self, threshold=0.9, scorer_path=SCORER_PATH, sentiment_model=None):
+        self.threshold = threshold
+        self.scorer = joblib.load(scorer_path) if os.path.exists(scorer_path) else None
+        fitted_on = self.scorer and self.scorer.get('sentiment_model', DEFAULT_SENTIMENT_MODEL)
+        if sentiment_model and fitted_on and fitted_on != sentiment_model:
+            print(f"Ignoring {scorer_path}: fitted on {fitted_on}, not {sentiment_model}; "
+                  f"re-run `python cascade.py fit`", file=sys.stderr)
+            self.scorer = None
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def _linear_sentiments(self, texts):
+        vectorizer = self.scorer['vectorizer']
+        classifier = self.scorer['classifier']
+        negative = list(classifier.classes_).index('NEGATIVE')
+        probabilities = classifier.predict_proba(vectorizer.transform(texts))[:, negative]
+        return [
+            {'label': 'NEGATIVE' if p >= 0.5 else 'POSITIVE', 'score': float(max(p, 1 - p))}
+            for p in probabilities
+        ]
+
+    def resolve(self, texts):
+        """
+        Run the rule and linear tiers over a batch of messages.
+
+        Args:
+            texts (list): Message strings
+
+        Returns:
+            tuple: (hits, sentiments) lists aligned with texts. A sentiment
+                is None when the message still needs the transformer.
+        """
+        hits = [scan(text) for text in texts]
+        sentiments = [None] * len(texts)
+        tally = Counter()
+
+        # Sentiment adds 1 to severity, which also decides isCrime for
+        # stalking, and picks the labels when no keyword fired. Only when
+        # severity already hits the cap of 5 (threats, stalking and
+        # obsession together) can it change nothing, so this tier is exact
+        # and it's the linear tier that keeps most messages off the transformer
+        undecided = []
+        for i, message_hits in enumerate(hits):
+            if rule_severity(message_hits) >= 5:
+                sentiments[i] = RULES_DECISIVE
+                tally['rules'] += 1
+            else:
+                undecided.append(i)
+
+        if self.scorer is not None and undecided:
+            scored = self._linear_sentiments([texts[i] for i in undecided])
+            for i, sentiment in zip(undecided, scored):
+                if sentiment['score'] >= self.threshold:
+                    sentiments[i] = sentiment
+                    tally['linear'] += 1
+
+        tally['transformer'] += sum(1 for s in sentiments if s is None)
+        with self._lock:
+            self._counts.update(tally)
+        return hits, sentiments
+
+    def stats(self):
+        """Per-tier message counts and hit rates."""
+        with self._lock:
+            counts = dict(self._counts)
+        total = sum(counts.values())
+        return {
+            'total': total,
+            'tiers': {
+                tier: {
+                    'count': counts.get(tier, 0),
+                    'rate': counts.get(tier, 0) / total if total else 0.0,
+                }
+                for tier in TIERS
+            },
+        }
+
+
+def fit_scorer(texts, output_path=SCORER_PATH):
+    """
+    Distill the transformer's sentiment labels into a linear scorer.
+
+    Uses the saved TF-IDF vectorizer so no new vocabulary is learned, and
+    the same sentiment model as the server (ML_SENTIMENT_MODEL).
+    """
+    from sklearn.linear_model import LogisticRegression
+    from analysis import SENTIMENT_MODEL, load_sentiment_model
+
+    sentiment_analyzer = load_sentiment_model()
+    labels = [s['label'] for s in sentiment_analyzer(texts)]
+    vectorizer = joblib.load(VECTORIZER_PATH)
+    classifier = LogisticRegression(max_iter=1000, class_weight='balanced')
+    classifier.fit(vectorizer.transform(texts), labels)
+    joblib.dump({'vectorizer': vectorizer, 'classifier': classifier, 'sentiment_model': SENTIMENT_MODEL},
+                output_path)
+    print(f"Linear scorer fitted on {len(texts)} messages from {SENTIMENT_MODEL} and saved to {output_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cascade inference utilities")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    fit = subparsers.add_parser('fit', help="Fit the linear sentiment scorer")
+    fit.add_argument('csv')
+    fit.add_argument('--column', default='narrative_entry')
+    args = parser.parse_args()
+
+    if args.command == 'fit':
+        # process_messages.py may write the analyzed CSV without a header
+        with open(args.csv, 'rb') as f:
+            texts = [row[args.column] for row in iter_analyzed(f) if row.get(args.column)]
+        fit_scorer(texts)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+"""
+Server instrumentation: stage timings, result counters, Prometheus text
+and an opt-in profiler for slow requests.
+
+Stage histograms come from timing.timings, which analysis.py fills in
+(rules, sentiment, classifier) along with the front ends (parse,
+serialize). Request latencies are kept per endpoint.
+
+Profiling is off unless ML_PROFILE is set to 'stacks' or 'cprofile', or
+it is switched on through POST /admin/profile (Flask only). A sampled
+request that takes longer than ML_PROFILE_SLOW_MS is dumped to
+ML_PROFILE_DIR:
+
+    stacks    <time>-<ms>-<endpoint>-<pid>.folded, one "thread;frame;frame
+              count" line per stack sampled from every thread while the
+              request ran (input for flamegraph.pl or speedscope)
+    cprofile  <time>-<ms>-<endpoint>-<pid>.prof, pstats of one thread
+
+cProfile only sees the thread it runs on, so work handed to another
+thread or process is profiled there with Profiler.wrap: the Flask
+micro-batcher's batches and the ASGI pool workers' calls, named after
+the function they run.
+"""
+import cProfile
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from timing import StageTimings, timings
+
+PROFILE_MODES = ('stacks', 'cprofile')
+
+endpoint_timings = StageTimings()
+_results = {'behavior': Counter(), 'severity': Counter()}
+_results_lock = threading.Lock()
+
+
+def count_results(results):
+    """Count analyzed messages by perpetratorBehavior and severityScore."""
+    with _results_lock:
+        for result in results:
+            _results['behavior'][result['perpetratorBehavior']] += 1
+            _results['severity'][str(result['severityScore'])] += 1
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _histogram(lines, name, help_text, label, stages, buckets):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} histogram')
+    for key, s in stages.items():
+        labels = f'{label}="{_escape(key)}"'
+        cumulative = 0
+        for bound, count in zip(list(buckets) + ['+Inf'], s['counts']):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{labels}}} {s["sum"]}')
+        lines.append(f'{name}_count{{{labels}}} {s["count"]}')
+
+
+def render(extra=None, counters=None):
+    """
+    All metrics in the Prometheus text exposition format.
+
+    Args:
+        extra (dict): Additional gauges, name -> value
+        counters (dict): Additional counters, name -> value
+    """
+    lines = []
+    _histogram(lines, 'safeguard_stage_seconds', 'Time spent per processing stage.', 'stage',
+               timings.snapshot(), timings.buckets)
+    _histogram(lines, 'safeguard_request_seconds', 'Request latency per endpoint.', 'endpoint',
+               endpoint_timings.snapshot(), endpoint_timings.buckets)
+    with _results_lock:
+        behavior = dict(_results['behavior'])
+        severity = dict(_results['severity'])
+    lines.append('# HELP safeguard_results_total Analyzed messages by perpetrator behavior.')
+    lines.append('# TYPE safeguard_results_total counter')
+    for value, count in sorted(behavior.items()):
+        lines.append(f'safeguard_results_total{{behavior="{_escape(value)}"}} {count}')
+    lines.append('# HELP safeguard_severity_total Analyzed messages by severity score.')
+    lines.append('# TYPE safeguard_severity_total counter')
+    for value, count in sorted(severity.items()):
+        lines.append(f'safeguard_severity_total{{severity="{_escape(value)}"}} {count}')
+    for name, value in (extra or {}).items():
+        lines.append(f'# TYPE {name} gauge')
+        lines.append(f'{name} {value}')
+    for name, value in (counters or {}).items():
+        lines.append(f'# TYPE {name} counter')
+        lines.append(f'{name} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+class _StackSampler(threading.Thread):
+    """Collect the stacks of every other thread at a fixed interval."""
+
+    def __init__(self, interval):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        names = {}
+        while not self._stop_event.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for ident, frame in sys._current_frames().items():
+                if ident == self.ident:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+                    frame = frame.f_back
+                self.stacks[';'.join([names.get(ident, str(ident))] + frames[::-1])] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class Profiler:
+    """
+    Profile a sample of requests and keep the slow ones.
+
+    Args:
+        mode (str): 'stacks', 'cprofile' or None (off)
+        slow_ms (float): Requests at least this slow are written out
+        sample_rate (float): Share of requests that are profiled
+        out_dir (str): Where profiles are written
+        interval_ms (float): Sampling interval of the 'stacks' mode
+    """
+
+    def __init__(self, mode=None, slow_ms=500, sample_rate=1.0, out_dir='profiles', interval_ms=5):
+        self.configure(mode, slow_ms, sample_rate, out_dir, interval_ms)
+        self.dumped = 0
+        # One request is profiled at a time: cProfile allows a single active
+        # profiler, and one stack sampler already sees every thread
+        self._busy = threading.Lock()
+
+    def configure(self, mode=None, slow_ms=500, sample_rate=1.0, out_dir='profiles', interval_ms=5):
+        if mode not in PROFILE_MODES + (None,):
+            raise ValueError(f"Profile mode must be one of {PROFILE_MODES} or None")
+        self.mode = mode
+        self.slow_ms = float(slow_ms)
+        self.sample_rate = float(sample_rate)
+        self.out_dir = out_dir
+        self.interval_ms = float(interval_ms)
+
+    def settings(self):
+        return {
+            'mode': self.mode,
+            'slowMs': self.slow_ms,
+            'sampleRate': self.sample_rate,
+            'outDir': self.out_dir,
+            'intervalMs': self.interval_ms,
+            'dumped': self.dumped,
+        }
+
+    def start(self):
+        """Begin profiling the current request; returns a handle for finish(), or None."""
+        if self.mode is None or random.random() >= self.sample_rate:
+            return None
+        if not self._busy.acquire(blocking=False):
+            return None
+        if self.mode == 'cprofile':
+            profile = cProfile.Profile()
+            profile.enable()
+            return self.mode, profile, time.perf_counter()
+        sampler = _StackSampler(self.interval_ms / 1000.0)
+        sampler.start()
+        return self.mode, sampler, time.perf_counter()
+
+    def wrap(self, fn, name, modes=PROFILE_MODES):
+        """
+        fn, with every call profiled like a request to `name`.
+
+        Args:
+            modes (tuple): Only profile while the profiler is in one of
+                these modes
+        """
+        def profiled(*args):
+            handle = self.start() if self.mode in modes else None
+            try:
+                return fn(*args)
+            finally:
+                self.finish(handle, name)
+        return profiled
+
+    def finish(self, handle, endpoint):
+        """Stop profiling and write the profile if the request was slow."""
+        if handle is None:
+            return None
+        mode, profiler, started = handle
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if mode == 'cprofile':
+            profiler.disable()
+        else:
+            profiler.stop()
+        self._busy.release()
+        if elapsed_ms < self.slow_ms:
+            return None
+
+        os.makedirs(self.out_dir, exist_ok=True)
+        name = endpoint.strip('/').replace('/', '_') or 'root'
+        path = os.path.join(self.out_dir,
+                            f'{time.strftime("%Y%m%d-%H%M%S")}-{int(elapsed_ms)}ms-{name}-{os.getpid()}')
+        if mode == 'cprofile':
+            path += '.prof'
+            profiler.dump_stats(path)
+        else:
+            path += '.folded'
+            with open(path, 'w') as f:
+                for stack, count in profiler.stacks.most_common():
+                    f.write(f'{stack} {count}\n')
+        self.dumped += 1
+        return path
+
+
+profiler = Profiler(
+    mode=os.getenv('ML_PROFILE') or None,
+    slow_ms=float(os.getenv('ML_PROFILE_SLOW_MS', '500')),
+    sample_rate=float(os.getenv('ML_PROFILE_SAMPLE_RATE', '1.0')),
+    out_dir=os.getenv('ML_PROFILE_DIR', 'profiles'),
+)
@@ -0,0 +1,244 @@
+"""
+Line-by-line (NDJSON) analysis of message streams.
+
+Each input line is a JSON object holding the message under "message",
+"text" or "narrative_entry"; "id", "sender" and "timestamp" are copied to
+the output. Each output line is the analyze_texts result for one input
+line, in input order, with its 1-based "line" number, or an "error" for
+lines that could not be parsed. When a line names a "sender" the result
+also goes through the escalation detector, like /analyze.
+
+Lines are read, analyzed and written in batches, so memory stays bounded
+by the batch size times the batches in flight, however long the input.
+
+The same format is served on POST /analyze/stream and by this CLI:
+
+    python ndjson.py < messages.jsonl > results.jsonl
+    python ndjson.py --workers 4 --input export.jsonl --output results.jsonl
+
+The iMessage export from scripts/extract_messages.js is a JSON document
+grouped by contact; flatten it to lines first, e.g.
+
+    jq -c '.[] | .name as $n | .messages[] | {id, text, timestamp, sender: $n}' messages.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+TEXT_FIELDS = ('message', 'text', 'narrative_entry')
+PASSTHROUGH_FIELDS = ('id', 'sender', 'timestamp')
+
+# Longer lines are answered with an error and never held in memory whole
+MAX_LINE_BYTES = int(os.getenv('ML_STREAM_MAX_LINE', str(1 << 20)))
+
+
+def read_lines(stream):
+    """
+    Yield the lines of a binary stream, cutting overlong lines short.
+
+    A line longer than MAX_LINE_BYTES is yielded as its first
+    MAX_LINE_BYTES + 1 bytes, which parse_entry rejects, and the rest of it
+    is skipped.
+    """
+    while True:
+        line = stream.readline(MAX_LINE_BYTES + 1)
+        if not line:
+            return
+        if len(line) > MAX_LINE_BYTES and not line.endswith(b'\n'):
+            rest = line
+            while rest and not rest.endswith(b'\n'):
+                rest = stream.readline(MAX_LINE_BYTES + 1)
+        yield line
+
+
+async def aiter_lines(chunks):
+    """read_lines for an async iterable of byte chunks, e.g. a request body."""
+    buffer = bytearray()
+    skipping = False
+    async for chunk in chunks:
+        start = 0
+        while True:
+            end = chunk.find(b'\n', start)
+            if end < 0:
+                break
+            if not skipping:
+                buffer += chunk[start:end + 1]
+                yield bytes(buffer[:MAX_LINE_BYTES + 1])
+            buffer.clear()
+            skipping = False
+            start = end + 1
+        if not skipping:
+            buffer += chunk[start:]
+            if len(buffer) > MAX_LINE_BYTES:
+                yield bytes(buffer[:MAX_LINE_BYTES + 1])
+                buffer.clear()
+                skipping = True
+    if buffer:
+        yield bytes(buffer)
+
+
+def parse_entry(number, line):
+    """
+    Parse one input line.
+
+    Args:
+        number (int): 1-based line number
+        line (bytes): The line, with or without its newline
+
+    Returns:
+        tuple: (number, record, text, error), with record and text None
+            when the line could not be used, or None for a blank line
+    """
+    line = line.rstrip(b'\r\n')
+    if not line.strip():
+        return None
+    if len(line) > MAX_LINE_BYTES:
+        return number, None, None, f"Line longer than {MAX_LINE_BYTES} bytes"
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return number, None, None, "Invalid JSON"
+    if isinstance(record, dict):
+        for field in TEXT_FIELDS:
+            if isinstance(record.get(field), str):
+                return number, record, record[field], None
+    return number, None, None, f"Expected an object with a string in one of {', '.join(TEXT_FIELDS)}"
+
+
+def iter_batches(lines, batch_size):
+    """
+    Parse lines lazily and group them for analysis.
+
+    Yields:
+        list: Up to batch_size parse_entry tuples
+    """
+    batch = []
+    for number, line in enumerate(lines, start=1):
+        entry = parse_entry(number, line)
+        if entry is None:
+            continue
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def batch_texts(batch):
+    """The texts of a batch's usable lines, in order."""
+    return [text for _, record, text, _ in batch if record is not None]
+
+
+def output_lines(batch, results=None, track=None, error=None):
+    """
+    Encoded output lines for a batch.
+
+    Args:
+        batch (list): parse_entry tuples
+        results (list): analyze_texts(batch_texts(batch))
+        track: Optional function (record, result) -> result, e.g.
+            analysis.track_escalation
+        error (str): Reported for every usable line instead of results
+    """
+    results = iter(results or ())
+    for number, record, _, line_error in batch:
+        out = {'line': number}
+        if record is None or error is not None:
+            out['error'] = line_error or error
+        else:
+            result = next(results)
+            out.update({field: record[field] for field in PASSTHROUGH_FIELDS if field in record})
+            out.update(track(record, result) if track is not None else result)
+        yield (json.dumps(out) + '\n').encode('utf-8')
+
+
+def _init_worker():
+    import analysis
+    analysis.start(background=False)
+
+
+def _analyze(texts):
+    import analysis
+    return analysis.analyze_texts(texts) if texts else []
+
+
+def run(stream, out, workers=0, batch_size=64):
+    """
+    Analyze NDJSON from a binary stream and write NDJSON results to another.
+
+    Args:
+        stream: Binary file-like object to read lines from
+        out: Binary file-like object
+        workers (int): Worker processes; 0 analyzes in this process
+        batch_size (int): Lines per analyze_texts call
+
+    Returns:
+        int: Number of lines written
+    """
+    import analysis
+
+    batches = iter_batches(read_lines(stream), batch_size)
+    written = 0
+
+    def write(batch, results):
+        nonlocal written
+        for line in output_lines(batch, results, analysis.track_escalation):
+            out.write(line)
+            written += 1
+
+    if not workers:
+        analysis.start(background=False)
+        for batch in batches:
+            texts = batch_texts(batch)
+            write(batch, analysis.analyze_texts(texts) if texts else [])
+        return written
+
+    # spawn, as in asgi.py; each worker loads its own models in the initializer
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=_init_worker)
+    # Oldest batch first, so results keep the input order; two batches per
+    # worker keep every worker busy while the oldest is written
+    pending = deque()
+    try:
+        for batch in batches:
+            pending.append((batch, pool.submit(_analyze, batch_texts(batch))))
+            if len(pending) >= workers * 2:
+                done, future = pending.popleft()
+                write(done, future.result())
+        while pending:
+            done, future = pending.popleft()
+            write(done, future.result())
+    finally:
+        pool.shutdown(cancel_futures=True)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze NDJSON messages from stdin or a file")
+    parser.add_argument('--input', help="Input file (default: stdin)")
+    parser.add_argument('--output', help="Output file (default: stdout)")
+    parser.add_argument('--workers', type=int, default=0, help="Worker processes (default: analyze in-process)")
+    parser.add_argument('--batch-size', type=int, default=64)
+    args = parser.parse_args()
+
+    source = open(args.input, 'rb') if args.input else sys.stdin.buffer
+    sink = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        written = run(source, sink, args.workers, args.batch_size)
+    finally:
+        if args.input:
+            source.close()
+        if args.output:
+            sink.close()
+        else:
+            sink.flush()
+    print(f"Analyzed {written} lines", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""
+Model registry with background loading.
+
+Models are registered as named loader functions and loaded on a
+background thread, so the server can answer health checks while the
+transformer is still being read from disk. Only required models gate
+readiness; an optional model that fails to load (e.g. a classifier
+pickled with another scikit-learn version) only fails the endpoints that
+use it.
+"""
+import os
+import resource
+import threading
+import time
+
+import joblib
+
+
+class ModelNotReady(Exception):
+    """Raised when a model is requested before it has finished loading."""
+
+
+def load_artifact(path):
+    """
+    Load a joblib artifact with its NumPy arrays memory-mapped read-only.
+
+    Only arrays that stay plain NumPy arrays after unpickling remain
+    mapped, e.g. the TF-IDF idf_ weights. Scikit-learn trees copy their
+    node arrays into private memory and the vocabulary is a dict, so each
+    process that loads a forest holds its own copy. To share the models
+    between workers, load them once before forking (ML_BLOCKING_LOAD=1
+    with a preloading server, or ML_POOL_START=fork in asgi.py), or serve
+    /classify from the compact .npy export (ML_COMPACT_MODEL=1).
+    """
+    return joblib.load(path, mmap_mode='r')
+
+
+def memory_usage():
+    """
+    Memory of this process in kilobytes.
+
+    Returns:
+        dict: rss (resident), pss (proportional share, Linux only) and
+            peakRss
+    """
+    usage = {'peakRss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+    for path, field, name in [('/proc/self/status', 'VmRSS:', 'rss'), ('/proc/self/smaps_rollup', 'Pss:', 'pss')]:
+        try:
+            with open(path) as f:
+                for line in f:
+                    if line.startswith(field):
+                        usage[name] = int(line.split()[1])
+                        break
+        except OSError:
+            pass
+    return usage
+
+
+class ModelRegistry:
+    """Named models loaded once, in the background, in registration order."""
+
+    def __init__(self):
+        self._loaders = {}
+        self._required = set()
+        self._models = {}
+        self._errors = {}
+        self._load_seconds = {}
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._started = time.monotonic()
+        self._ready_after = None
+
+    def register(self, name, loader, required=True):
+        """
+        Register a zero-argument function that returns the model.
+
+        Args:
+            required (bool): Whether the server is ready only once this
+                model has loaded
+        """
+        self._loaders[name] = loader
+        if required:
+            self._required.add(name)
+
+    def start(self, background=True):
+        """Load every registered model, on a daemon thread by default."""
+        if background:
+            threading.Thread(target=self.load_all, name='model-loader', daemon=True).start()
+        else:
+            self.load_all()
+
+    def load_all(self):
+        for name, loader in self._loaders.items():
+            started = time.monotonic()
+            try:
+                model = loader()
+            except Exception as e:
+                with self._lock:
+                    self._errors[name] = f'{type(e).__name__}: {e}'
+                continue
+            with self._lock:
+                self._models[name] = model
+                self._load_seconds[name] = round(time.monotonic() - started, 3)
+        self._ready_after = round(time.monotonic() - self._started, 3)
+        self._done.set()
+
+    def get(self, name):
+        """Return a loaded model or raise ModelNotReady."""
+        with self._lock:
+            if name in self._models:
+                return self._models[name]
+            if name in self._errors:
+                raise ModelNotReady(f'{name} failed to load: {self._errors[name]}')
+        raise ModelNotReady(f'{name} is still loading')
+
+    def wait(self, timeout=None):
+        """Block until loading has finished; returns True if every required model loaded."""
+        self._done.wait(timeout)
+        return self.ready()
+
+    def ready(self):
+        with self._lock:
+            return self._required.issubset(self._models)
+
+    def status(self):
+        with self._lock:
+            models = {}
+            for name in self._loaders:
+                if name in self._models:
+                    models[name] = {'state': 'loaded', 'loadSeconds': self._load_seconds[name]}
+                elif name in self._errors:
+                    models[name] = {'state': 'failed', 'error': self._errors[name]}
+                else:
+                    models[name] = {'state': 'loading'}
+                models[name]['required'] = name in self._required
+        return {
+            'ready': all(m['state'] == 'loaded' for m in models.values() if m['required']),
+            'models': models,
+            'coldStartSeconds': self._ready_after,
+            'pid': os.getpid(),
+            'memoryKb': memory_usage(),
+        }
@@ -0,0 +1,343 @@
+"""
+Top-k similar-message search over TF-IDF vectors.
+
+An inverted index maps every vocabulary term to the messages containing
+it and their TF-IDF weights. The saved vectorizer L2-normalizes its
+output, so the cosine similarity to a query is the sparse dot product:
+the sum of query weight times posting weight over the query's terms.
+Only postings of the query's terms are read, so query time depends on
+how common those terms are, not on the number of messages.
+
+Terms found in more than max_df_fraction of the messages are skipped at
+query time (unless the query has no other terms). They add almost the
+same amount to every score but would dominate the work, so results are
+approximate only for queries made mostly of such terms.
+
+A saved index is opened with its arrays memory-mapped: the postings are
+CSR-style .npy files and the stored messages stay in docs.jsonl, read by
+byte offset only for the matches returned. Every worker process that
+opens the same index shares those pages through the OS page cache.
+
+Each save writes a new generation directory inside the index directory
+and then switches manifest.json to it, so an index is always opened as a
+consistent set of files, even while another process saves.
+
+Build the index from an analyzed CSV, or bring it up to date after
+process_messages.py appended to it, with:
+
+    python similarity.py build ../../text_messages_to_v_analyzed.csv
+"""
+import argparse
+import json
+import os
+import shutil
+
+import joblib
+import numpy as np
+
+from cascade import MODEL_DIR, VECTORIZER_PATH
+# cascade puts the repo root on sys.path
+from rollup import iter_analyzed, output_generation
+
+INDEX_DIR = os.path.join(MODEL_DIR, 'similar_index')
+# CSR-style postings: terms[i]'s postings are ids/weights[indptr[i]:indptr[i + 1]]
+POSTINGS_ARRAYS = ('terms', 'indptr', 'ids', 'weights')
+DOCS_FILE = 'docs.jsonl'
+# Byte offset of every line of DOCS_FILE, plus its size
+DOC_OFFSETS_FILE = 'doc_offsets.npy'
+# Names the current generation directory and records the indexed sources
+MANIFEST_FILE = 'manifest.json'
+
+# Fields kept per message and returned with every match
+DOC_FIELDS = ['time_stamp', 'user_name', 'narrative_entry', 'incident_type', 'severity_score']
+
+
+class _Postings:
+    """
+    Growable (doc id, weight) arrays for one term.
+
+    Loaded postings are exact-size views of the memory-mapped arrays, so
+    the first extend copies them into private memory.
+    """
+
+    __slots__ = ('ids', 'weights', 'size')
+
+    def __init__(self, ids=None, weights=None):
+        self.ids = ids if ids is not None else np.empty(8, dtype=np.int32)
+        self.weights = weights if weights is not None else np.empty(8, dtype=np.float32)
+        self.size = len(ids) if ids is not None else 0
+
+    def extend(self, ids, weights):
+        needed = self.size + len(ids)
+        if needed > len(self.ids):
+            capacity = max(needed, 2 * len(self.ids))
+            self.ids = np.resize(self.ids, capacity)
+            self.weights = np.resize(self.weights, capacity)
+        self.ids[self.size:needed] = ids
+        self.weights[self.size:needed] = weights
+        self.size = needed
+
+
+class SimilarityIndex:
+    """
+    Inverted index for top-k cosine queries, with incremental inserts.
+
+    Args:
+        vectorizer: Fitted TfidfVectorizer with l2 norm
+        max_df_fraction (float): Terms in more than this share of the
+            indexed messages are skipped when querying
+    """
+
+    def __init__(self, vectorizer, max_df_fraction=0.2):
+        if getattr(vectorizer, 'norm', None) != 'l2':
+            raise ValueError("Cosine scores need a vectorizer with norm='l2'")
+        self.vectorizer = vectorizer
+        self.max_df_fraction = max_df_fraction
+        self.postings = {}
+        # Messages added since the index was loaded
+        self.docs = []
+        # Messages saved in docs.jsonl, read on demand
+        self._doc_offsets = np.zeros(1, dtype=np.int64)
+        self._docs_fd = None
+        # Analyzed CSV path -> {'generation', 'offset'} read so far, see build()
+        self.sources = {}
+        self._generation = 0
+
+    def __len__(self):
+        return self._stored + len(self.docs)
+
+    @property
+    def _stored(self):
+        return len(self._doc_offsets) - 1
+
+    def doc(self, i):
+        """Stored fields of message i."""
+        if i >= self._stored:
+            return self.docs[i - self._stored]
+        begin, end = int(self._doc_offsets[i]), int(self._doc_offsets[i + 1])
+        # pread leaves the file position alone, so concurrent queries are safe
+        return json.loads(os.pread(self._docs_fd, end - begin, begin))
+
+    def add(self, texts, docs=None):
+        """
+        Index a batch of messages.
+
+        Args:
+            texts (list): Message texts
+            docs (list): Dict per message returned with matches;
+                defaults to {'narrative_entry': text}
+        """
+        if docs is None:
+            docs = [{'narrative_entry': text} for text in texts]
+        start = len(self)
+        # Column-major, so each term's new postings are one contiguous slice
+        X = self.vectorizer.transform(texts).tocsc()
+        X.sort_indices()
+        for term in np.flatnonzero(np.diff(X.indptr)):
+            begin, end = X.indptr[term], X.indptr[term + 1]
+            postings = self.postings.get(int(term))
+            if postings is None:
+                postings = self.postings[int(term)] = _Postings()
+            postings.extend(X.indices[begin:end] + start, X.data[begin:end])
+        self.docs.extend(docs)
+
+    def query(self, text, k=10, min_score=0.0):
+        """
+        The k indexed messages most similar to text.
+
+        Returns:
+            list: Dicts with 'score' plus the stored fields, best first
+        """
+        q = self.vectorizer.transform([text])
+        terms = [(int(term), float(weight)) for term, weight in zip(q.indices, q.data) if int(term) in self.postings]
+        if not terms:
+            return []
+        limit = self.max_df_fraction * len(self)
+        selective = [(term, weight) for term, weight in terms if self.postings[term].size <= limit]
+        terms = selective or terms
+
+        ids = np.concatenate([self.postings[term].ids[:self.postings[term].size] for term, _ in terms])
+        weights = np.concatenate([
+            self.postings[term].weights[:self.postings[term].size] * weight for term, weight in terms
+        ])
+        # Sum the contributions per message
+        candidates, inverse = np.unique(ids, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights)
+
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            dict(self.doc(int(candidates[i])), score=round(float(scores[i]), 4))
+            for i in top if scores[i] > min_score
+        ]
+
+    def save(self, index_dir=INDEX_DIR):
+        """
+        Write the postings as CSR-style .npy arrays plus one JSON line per message.
+
+        The files go to a new generation directory and manifest.json is
+        renamed over the old one last, so load() never pairs files from two
+        saves. The previous generation is kept for loads that read the old
+        manifest just before the switch; older ones are removed.
+        """
+        os.makedirs(index_dir, exist_ok=True)
+        generation = max(self._generation, _read_manifest(index_dir).get('generation', 0)) + 1
+        target = os.path.join(index_dir, _generation_dir(generation))
+        shutil.rmtree(target, ignore_errors=True)
+        os.makedirs(target)
+
+        terms = np.array(sorted(self.postings), dtype=np.int64)
+        sizes = np.array([self.postings[term].size for term in terms], dtype=np.int64)
+        arrays = {
+            'terms': terms,
+            'indptr': np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64),
+            'ids': np.concatenate([self.postings[t].ids[:self.postings[t].size] for t in terms])
+            if len(terms) else np.empty(0, dtype=np.int32),
+            'weights': np.concatenate([self.postings[t].weights[:self.postings[t].size] for t in terms])
+            if len(terms) else np.empty(0, dtype=np.float32),
+        }
+
+        # Stored docs are copied as bytes, then the new ones appended
+        offsets = [self._doc_offsets]
+        with open(os.path.join(target, DOCS_FILE), 'wb') as f:
+            stored_size = int(self._doc_offsets[-1])
+            for begin in range(0, stored_size, 1 << 20):
+                f.write(os.pread(self._docs_fd, min(1 << 20, stored_size - begin), begin))
+            position = stored_size
+            new_offsets = []
+            for doc in self.docs:
+                line = (json.dumps(doc) + '\n').encode('utf-8')
+                f.write(line)
+                position += len(line)
+                new_offsets.append(position)
+        offsets.append(np.array(new_offsets, dtype=np.int64))
+        arrays['doc_offsets'] = np.concatenate(offsets)
+
+        for name, array in arrays.items():
+            np.save(os.path.join(target, f'{name}.npy'), array)
+
+        manifest_path = os.path.join(index_dir, MANIFEST_FILE)
+        with open(f'{manifest_path}.tmp', 'w') as f:
+            json.dump({'generation': generation, 'sources': self.sources}, f)
+        os.replace(f'{manifest_path}.tmp', manifest_path)
+        self._generation = generation
+
+        for name in os.listdir(index_dir):
+            if name.startswith('gen-') and name not in (_generation_dir(generation), _generation_dir(generation - 1)):
+                shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+
+    @classmethod
+    def load(cls, index_dir=INDEX_DIR, vectorizer_path=VECTORIZER_PATH, **options):
+        """Open a saved index with its arrays memory-mapped read-only."""
+        manifest = _read_manifest(index_dir)
+        if not manifest:
+            raise FileNotFoundError(f"No similarity index in {index_dir}; run `python similarity.py build`")
+        source = os.path.join(index_dir, _generation_dir(manifest['generation']))
+        index = cls(joblib.load(vectorizer_path), **options)
+        arrays = {name: np.load(os.path.join(source, f'{name}.npy'), mmap_mode='r') for name in POSTINGS_ARRAYS}
+        terms, indptr, ids, weights = (arrays[name] for name in POSTINGS_ARRAYS)
+        for i, term in enumerate(terms.tolist()):
+            begin, end = indptr[i], indptr[i + 1]
+            index.postings[term] = _Postings(ids[begin:end], weights[begin:end])
+        index._doc_offsets = np.load(os.path.join(source, DOC_OFFSETS_FILE), mmap_mode='r')
+        index._docs_fd = os.open(os.path.join(source, DOCS_FILE), os.O_RDONLY)
+        index.sources = manifest.get('sources', {})
+        index._generation = manifest['generation']
+        return index
+
+
+def _generation_dir(generation):
+    return f'gen-{generation:06d}'
+
+
+def _read_manifest(index_dir):
+    try:
+        with open(os.path.join(index_dir, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _resumable(source, generation, size):
+    """Whether a CSV was only appended to since it was indexed, as in rollup.update_rollup."""
+    return (
+        generation is not None
+        and source.get('generation') == generation
+        and source.get('offset', 0) <= size
+    )
+
+
+def build(csv_paths, index_dir=INDEX_DIR, vectorizer_path=VECTORIZER_PATH, chunksize=100_000):
+    """
+    Bring the index up to date with analyzed CSVs, creating it if needed.
+
+    The index records how far into each CSV it has read, and only rows
+    appended since are added, as long as process_messages' incremental
+    state shows the files were only appended to. If one of them was
+    rewritten, the index is rebuilt from csv_paths alone, so no message is
+    ever indexed twice.
+
+    Returns:
+        tuple: (index, messages_added, rebuilt)
+    """
+    paths = {os.path.abspath(path): path for path in csv_paths}
+    generations = {source: output_generation(path) for source, path in paths.items()}
+    index = None
+    if _read_manifest(index_dir):
+        index = SimilarityIndex.load(index_dir, vectorizer_path)
+        if not all(
+            _resumable(index.sources[source], generations[source], os.path.getsize(path))
+            for source, path in paths.items() if source in index.sources
+        ):
+            index = None
+    rebuilt = index is None
+    if rebuilt:
+        index = SimilarityIndex(joblib.load(vectorizer_path))
+
+    added = 0
+    for source, path in paths.items():
+        offset = index.sources.get(source, {}).get('offset', 0)
+        with open(path, 'rb') as f:
+            rows = []
+            for row in iter_analyzed(f, offset):
+                rows.append(row)
+                if len(rows) >= chunksize:
+                    added += _add_rows(index, rows)
+                    rows = []
+            added += _add_rows(index, rows)
+            index.sources[source] = {'generation': generations[source], 'offset': f.tell()}
+    index.save(index_dir)
+    return index, added, rebuilt
+
+
+def _add_rows(index, rows):
+    rows = [row for row in rows if row.get('narrative_entry')]
+    if rows:
+        index.add([row['narrative_entry'] for row in rows],
+                  [{field: row[field] for field in DOC_FIELDS if field in row} for row in rows])
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the similar-message index")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help="Add the messages of analyzed CSVs to the index")
+    build_parser.add_argument('csv', nargs='+')
+    query_parser = subparsers.add_parser('query', help="Print the messages most similar to a text")
+    query_parser.add_argument('text')
+    query_parser.add_argument('-k', type=int, default=10)
+    parser.add_argument('--index', default=INDEX_DIR)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        index, added, rebuilt = build(args.csv, args.index)
+        print(f"{'Rebuilt' if rebuilt else 'Updated'} {args.index}: {added} messages added, "
+              f"{len(index)} in {len(index.postings)} terms")
+    else:
+        for match in SimilarityIndex.load(args.index).query(args.text, args.k):
+            print(f"{match['score']:.3f}  {match.get('narrative_entry')}")
+
+
+if __name__ == '__main__':
+    main()
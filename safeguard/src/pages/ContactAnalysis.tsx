@@ -7,27 +7,13 @@ import { SafetyContext } from '../App'
 import { processedMessages } from '../data/messages'
 import type { Message as BaseMessage } from '../data/messages'
 import { analyzeMessages, type IncidentAnalysis } from '../services/mlAnalysis'
-import { parse } from 'papaparse'
+import { fetchContactSummary, fetchContactTimeline, fetchContactFlagged } from '../services/contactsApi'
 
 interface Message extends BaseMessage {
   severity?: number;
   highlighted?: boolean;
 }
 
-interface CSVRow {
-  [key: number]: string;
-}
-
-interface CSVMessage {
-  time_stamp: string;
-  user_name: string;
-  narrative_entry: string;
-  incident_type: string;
-  user_emotional_state: string;
-  severity_score: string;
-  potential_crime: string;
-}
-
 interface IncidentMessage {
   text: string;
   timestamp: string;
@@ -712,6 +698,9 @@ const GraphTitle = styled.h2`
   margin: 0 0 24px 0;
 `
 
+const TIMELINE_DAYS = 90
+const FLAGGED_MESSAGES = 50
+
 interface DataPoint {
   date: string;
   severity: number;
@@ -774,61 +763,49 @@ const ContactAnalysis = () => {
   };
 
   useEffect(() => {
-    const loadCSVData = async () => {
+    const loadContactData = async () => {
       try {
-        const response = await fetch('/text_messages_to_v_analyzed.csv');
-        const csvText = await response.text();
-        const parseResult = parse<CSVRow>(csvText, {
-          header: false,
-          skipEmptyLines: true
-        });
-
         const contactName = getContactName(id || '');
-        const contactMessages = parseResult.data
-          .map(row => ({
-            time_stamp: row[0],
-            user_name: row[1],
-            narrative_entry: row[2],
-            incident_type: row[3],
-            user_emotional_state: row[4],
-            severity_score: row[5],
-            potential_crime: row[6]
-          }))
-          .filter(msg => msg.user_name === contactName);
+        const summary = await fetchContactSummary(contactName);
+        // Only the most recent TIMELINE_DAYS days and the latest flagged
+        // messages are requested, so the page does not grow with history
+        const [timeline, flagged] = await Promise.all([
+          fetchContactTimeline(contactName, Math.max(summary.days - TIMELINE_DAYS, 0), TIMELINE_DAYS),
+          fetchContactFlagged(contactName, 0, FLAGGED_MESSAGES)
+        ]);
 
         // Process data for the graph
-        const graphPoints = contactMessages.map(msg => ({
-          date: msg.time_stamp,
-          severity: parseInt(msg.severity_score),
-          message: msg.narrative_entry
-        })).sort((a, b) => new Date(a.date).getTime() - new Date(b.date).getTime());
+        const graphPoints = timeline.items.map(day => ({
+          date: day.date,
+          severity: day.meanSeverity ?? 0,
+          message: `${day.count} message${day.count === 1 ? '' : 's'}, highest severity ${day.maxSeverity}/5`
+        }));
 
         setGraphData(graphPoints);
 
-        // Group messages by incident type
-        const groupedMessages = contactMessages.reduce<Record<string, IncidentMessage[]>>((acc, msg) => {
+        // Group the latest flagged messages by incident type
+        const groupedMessages = flagged.items.reduce<Record<string, IncidentMessage[]>>((acc, msg) => {
           if (!acc[msg.incident_type]) {
             acc[msg.incident_type] = [];
           }
           acc[msg.incident_type].push({
             text: msg.narrative_entry,
             timestamp: msg.time_stamp,
-            severity: parseInt(msg.severity_score),
+            severity: msg.severity_score ?? 0,
             emotionalState: msg.user_emotional_state,
             confidence: 100
           });
           return acc;
         }, {});
 
-        // Convert to array and sort by count
-        let processedIncidents: IncidentType[] = Object.entries(groupedMessages)
-          .map(([type, messages]) => ({
+        // Incident counts come from the summary and are already sorted by count
+        let processedIncidents: IncidentType[] = Object.entries(summary.incidentTypes)
+          .map(([type, count]) => ({
             type,
-            count: messages.length,
+            count,
             color: getColorForIncidentType(type),
-            messages
-          }))
-          .sort((a, b) => b.count - a.count);
+            messages: groupedMessages[type] ?? []
+          }));
 
         // Only filter out friendly/neutral for non-Sanya contacts
         if (contactName !== 'Sanya') {
@@ -838,11 +815,11 @@ const ContactAnalysis = () => {
 
         setIncidentTypes(processedIncidents.slice(0, 3)); // Take top 3 after filtering
       } catch (error) {
-        console.error('Error loading CSV data:', error);
+        console.error('Error loading contact data:', error);
       }
     };
 
-    loadCSVData();
+    loadContactData();
   }, [id]);
 
   const CustomTooltip = ({ active, payload }: any) => {
@@ -892,7 +869,7 @@ const ContactAnalysis = () => {
         />
 
         <GraphContainer>
-          <GraphTitle>Message Severity Over Time</GraphTitle>
+          <GraphTitle>Daily Message Severity</GraphTitle>
           <LineChart
             width={1000}
             height={200}
@@ -7,6 +7,7 @@ import { SafetyContext } from '../App';
 import { processedMessages } from '../data/messages';
 import type { Message as BaseMessage } from '../data/messages';
 import { analyzeMessages, type IncidentAnalysis } from '../services/mlAnalysis';
+import { fetchContacts, fetchContactSummary, fetchContactFlagged } from '../services/contactsApi';
 
 interface Message {
   time_stamp: string;
@@ -15,6 +16,9 @@ interface Message {
   user_emotional_state: string;
 }
 
+const CONTACT_LIMIT = 50;
+const FLAGGED_PER_CONTACT = 20;
+
 const Container = styled.div`
   display: flex;
   height: 100vh;
@@ -389,30 +393,50 @@ const SupportiveText = styled.p`
 const EmotionalEvaluation: React.FC = () => {
   const [isSidebarOpen, setIsSidebarOpen] = useState(false);
   const [messages, setMessages] = useState<Message[]>([]);
+  const [emotionCounts, setEmotionCounts] = useState<Record<string, number>>({});
+  const [totalMessages, setTotalMessages] = useState(0);
   const [selectedFilter, setSelectedFilter] = useState<string>('all');
 
   useEffect(() => {
-    // Fetch and parse the CSV data
-    fetch('/text_messages_to_v_analyzed.csv')
-      .then(response => response.text())
-      .then(data => {
-        const rows = data.split('\n');
-        const parsedMessages = rows.slice(1, -1).map(row => {
-          const [time_stamp, user_name, narrative_entry, _, user_emotional_state] = row.split(',');
-          return {
-            time_stamp,
-            user_name,
-            narrative_entry: narrative_entry.replace(/"/g, ''),
-            user_emotional_state
-          };
+    // Counts come from the per-contact summaries and the list from each
+    // contact's latest flagged messages, so nothing here grows with history
+    const loadEvaluation = async () => {
+      try {
+        const contacts = await fetchContacts(0, CONTACT_LIMIT);
+        const results = await Promise.all(contacts.items.map(contact => Promise.all([
+          fetchContactSummary(contact.name),
+          fetchContactFlagged(contact.name, 0, FLAGGED_PER_CONTACT)
+        ])));
+
+        const counts: Record<string, number> = {};
+        let total = 0;
+        const flaggedMessages: Message[] = [];
+        results.forEach(([summary, flagged]) => {
+          total += summary.total;
+          Object.entries(summary.emotionalStates).forEach(([emotion, count]) => {
+            counts[emotion] = (counts[emotion] || 0) + count;
+          });
+          flagged.items.forEach(msg => flaggedMessages.push({
+            time_stamp: msg.time_stamp,
+            user_name: summary.name,
+            narrative_entry: msg.narrative_entry,
+            user_emotional_state: msg.user_emotional_state
+          }));
         });
-        setMessages(parsedMessages);
-      })
-      .catch(error => console.error('Error loading messages:', error));
+        flaggedMessages.sort((a, b) => b.time_stamp.localeCompare(a.time_stamp));
+
+        setEmotionCounts(counts);
+        setTotalMessages(total);
+        setMessages(flaggedMessages);
+      } catch (error) {
+        console.error('Error loading messages:', error);
+      }
+    };
+
+    loadEvaluation();
   }, []);
 
-  // Get unique emotional states from the messages
-  const uniqueEmotions = Array.from(new Set(messages.map(m => m.user_emotional_state))).sort();
+  const uniqueEmotions = Object.keys(emotionCounts);
   const filteredMessages = selectedFilter === 'all' 
     ? messages 
     : messages.filter(m => m.user_emotional_state === selectedFilter);
@@ -444,20 +468,15 @@ const EmotionalEvaluation: React.FC = () => {
             <StatCard>
               <h3>Most Common Emotion</h3>
               <div className="value">
-                {messages.length > 0 
-                  ? Object.entries(
-                      messages.reduce((acc, msg) => {
-                        acc[msg.user_emotional_state] = (acc[msg.user_emotional_state] || 0) + 1;
-                        return acc;
-                      }, {} as Record<string, number>)
-                    ).sort((a, b) => b[1] - a[1])[0][0]
+                {uniqueEmotions.length > 0 
+                  ? Object.entries(emotionCounts).sort((a, b) => b[1] - a[1])[0][0]
                   : 'Loading...'}
               </div>
               <div className="description">Based on message analysis</div>
             </StatCard>
             <StatCard>
               <h3>Total Messages</h3>
-              <div className="value">{messages.length}</div>
+              <div className="value">{totalMessages}</div>
               <div className="description">Number of analyzed messages</div>
             </StatCard>
             <StatCard>
@@ -0,0 +1,73 @@
+// Client for the ML server's per-contact rollup endpoints. The server keeps
+// these aggregates up to date as messages are analyzed, so the payloads here
+// stay the same size however long a contact's history gets.
+const ML_SERVER_URL = import.meta.env.VITE_ML_SERVER_URL ?? 'http://localhost:5000';
+
+export interface Page<T> {
+  total: number;
+  offset: number;
+  limit: number;
+  items: T[];
+}
+
+export interface ContactListItem {
+  name: string;
+  total: number;
+  flagged: number;
+  maxSeverity: number;
+}
+
+export interface ContactSummary {
+  name: string;
+  total: number;
+  flagged: number;
+  maxSeverity: number;
+  incidentTypes: Record<string, number>;
+  severityHistogram: Record<string, number>;
+  emotionalStates: Record<string, number>;
+  days: number;
+}
+
+export interface TimelineDay {
+  date: string;
+  count: number;
+  maxSeverity: number;
+  meanSeverity: number | null;
+}
+
+export interface FlaggedMessage {
+  time_stamp: string;
+  narrative_entry: string;
+  incident_type: string;
+  user_emotional_state: string;
+  severity_score: number | null;
+  potential_crime: string;
+}
+
+async function getJSON<T>(path: string): Promise<T> {
+  const response = await fetch(`${ML_SERVER_URL}${path}`);
+  if (!response.ok) {
+    throw new Error(`GET ${path} failed with ${response.status}`);
+  }
+  return response.json();
+}
+
+function contactPath(name: string, resource: string): string {
+  return `/contacts/${encodeURIComponent(name)}/${resource}`;
+}
+
+export function fetchContacts(offset = 0, limit = 50): Promise<Page<ContactListItem>> {
+  return getJSON(`/contacts?offset=${offset}&limit=${limit}`);
+}
+
+export function fetchContactSummary(name: string): Promise<ContactSummary> {
+  return getJSON(contactPath(name, 'summary'));
+}
+
+export function fetchContactTimeline(name: string, offset = 0, limit = 90): Promise<Page<TimelineDay>> {
+  return getJSON(`${contactPath(name, 'timeline')}?offset=${offset}&limit=${limit}`);
+}
+
+export function fetchContactFlagged(name: string, offset = 0, limit = 20): Promise<Page<FlaggedMessage>> {
+  return getJSON(`${contactPath(name, 'flagged')}?offset=${offset}&limit=${limit}`);
+}
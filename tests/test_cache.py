@@ -0,0 +1,23 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'safeguard', 'ml_server')))
+from cache import ResultCache, is_uncased, normalize_text
+
+
+def test_case_is_only_folded_for_uncased_models():
+    assert normalize_text('  I HATE you ') == 'i hate you'
+    assert normalize_text('  I HATE you ', casefold=False) == 'I HATE you'
+    assert is_uncased('distilbert-base-uncased-finetuned-sst-2-english')
+    assert not is_uncased('cardiffnlp/twitter-roberta-base-sentiment-latest')
+
+
+def test_cased_cache_keeps_case_variants_apart():
+    cache = ResultCache('v1', casefold=False)
+    cache.put('I HATE you', {'label': 'NEGATIVE'})
+    assert cache.get('i hate you') is None
+    assert cache.get(' I HATE you') == {'label': 'NEGATIVE'}
+
+    uncased = ResultCache('v1')
+    uncased.put('I HATE you', {'label': 'NEGATIVE'})
+    assert uncased.get('i hate you') == {'label': 'NEGATIVE'}
@@ -0,0 +1,77 @@
+import csv
+import os
+
+import pytest
+
+pytest.importorskip('sklearn')
+pytest.importorskip('pandas')
+pytest.importorskip('dotenv')
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.multioutput import MultiOutputClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import LabelEncoder
+
+from compact_model import CompactPredictor, export_compact
+from export_model import y_columns
+from preprocess import ANALYZER_SETTINGS
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Unseen wording, casing, accents and out-of-vocabulary messages
+EXTRA_TEXTS = [
+    "",
+    "WHERE ARE YOU RIGHT NOW",
+    "Café tomorrow? I hope you're doing okay",
+    "You'll regret it if you leave, I saw you at the gym",
+    "completely unrelated words only",
+    "you always make me the bad guy, it's your fault",
+    "Naïve of you to think you can walk home alone",
+]
+
+
+def _training_data():
+    with open(os.path.join(REPO_ROOT, 'text_messages_to_v_analyzed.csv'), newline='', encoding='utf-8') as f:
+        rows = [row for row in csv.reader(f) if row and row[0] != 'time_stamp']
+    texts = [row[2] for row in rows]
+    labels = {column: [row[3 + i] for row in rows] for i, column in enumerate(y_columns)}
+    encoders, y = {}, []
+    for column in y_columns:
+        if column == 'severity_score':
+            y.append([int(value) for value in labels[column]])
+        else:
+            encoders[column] = LabelEncoder().fit(labels[column])
+            y.append(encoders[column].transform(labels[column]))
+    return texts, list(zip(*y)), encoders
+
+
+def _decoded(pipeline, encoders, texts):
+    predictions = pipeline.predict(texts)
+    return [
+        {column: encoders[column].inverse_transform([int(value)])[0] if column in encoders else int(value)
+         for column, value in zip(y_columns, row)}
+        for row in predictions
+    ]
+
+
+@pytest.mark.parametrize('vectorizer', [
+    # export_model.py's settings and train.py's analyzer settings
+    lambda: TfidfVectorizer(max_features=1000, ngram_range=(1, 3), stop_words='english'),
+    lambda: TfidfVectorizer(sublinear_tf=True, **ANALYZER_SETTINGS),
+])
+@pytest.mark.parametrize('estimator', [
+    lambda: RandomForestClassifier(n_estimators=25, random_state=0),
+    lambda: LogisticRegression(max_iter=1000),
+])
+def test_compact_predictions_match_sklearn(tmp_path, vectorizer, estimator):
+    texts, y, encoders = _training_data()
+    pipeline = Pipeline([
+        ('tfidf', vectorizer()),
+        ('classifier', MultiOutputClassifier(estimator())),
+    ]).fit(texts, y)
+    export_compact(pipeline, encoders, y_columns, str(tmp_path))
+
+    messages = texts + EXTRA_TEXTS
+    predicted = CompactPredictor(str(tmp_path)).predict_labels(messages)
+    assert predicted == _decoded(pipeline, encoders, messages)
@@ -0,0 +1,78 @@
+import csv
+
+from escalation import DAY, EscalationDetector, parse_timestamp, scan_csv
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_message_time_stamps_do_not_evict_other_senders():
+    clock = FakeClock()
+    detector = EscalationDetector(idle_seconds=30 * DAY, clock=clock)
+    base = parse_timestamp('2025-03-01')
+    for i in range(1000):
+        detector.update(f'sender-{i}', 2, 'Friendly', base + i)
+
+    detector.update('future', 5, 'Death Threat', parse_timestamp('2099-01-01'))
+    detector.update('no-time-stamp', 3, 'Emotional Abuse')
+    assert detector.stats()['senders'] == 1002
+    assert detector.stats()['evicted'] == 0
+
+    # Idle senders still go once the detector's own clock has moved on
+    clock.now = 31 * DAY
+    detector.update('late', 1, 'Friendly', base)
+    assert detector.stats()['senders'] == 1
+    assert detector.stats()['evicted'] == 1002
+
+
+def test_max_senders_evicts_least_recently_updated():
+    detector = EscalationDetector(max_senders=2, clock=FakeClock())
+    for sender in ('a', 'b', 'a', 'c'):
+        detector.update(sender, 1, 'Friendly', 0)
+    assert list(detector.senders) == ['a', 'c']
+
+
+def _write_rows(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerows(rows)
+
+
+def _alerts(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+ESCALATING_ROWS = [
+    ['2025-03-01', 'Mouni', 'Where are you right now?', 'Location Monitoring', 'Anxious', '2', 'N'],
+    ['2025-03-02', 'Sanya', 'Want to get lunch?', 'Friendly', 'Neutral', '1', 'N'],
+    ['2025-03-03', 'Mouni', 'I saw you at the cafe with him.', 'Stalking', 'Fearful', '4', 'N'],
+    ['2025-03-04', 'Mouni', 'You will regret this.', 'Death Threat', 'Fearful', '5', 'Y'],
+    ['2025-03-05', 'Sanya', 'See you tomorrow!', 'Friendly', 'Neutral', '1', 'N'],
+]
+
+
+def test_scan_csv_sorts_rows_by_time(tmp_path):
+    ordered = tmp_path / 'ordered.csv'
+    shuffled = tmp_path / 'shuffled.csv'
+    header = ['time_stamp', 'user_name', 'narrative_entry', 'incident_type', 'user_emotional_state',
+              'severity_score', 'potential_crime']
+    _write_rows(ordered, [header] + ESCALATING_ROWS)
+    _write_rows(shuffled, [header] + ESCALATING_ROWS[::-1] + [['not a date', 'Mouni', '', '', '', '5', 'N']])
+
+    expected = _alerts_for(ordered, tmp_path / 'ordered_alerts.csv')
+    assert [(a['user_name'], a['severity'], a['from_severity']) for a in expected] == [
+        ('Mouni', '4', '2'), ('Mouni', '5', '2')]
+    # Small runs force the spill-and-merge path
+    assert _alerts_for(shuffled, tmp_path / 'shuffled_alerts.csv', run_size=2) == expected
+    assert _alerts_for(shuffled, tmp_path / 'shuffled_alerts.csv') == expected
+
+
+def _alerts_for(path, alerts_path, **options):
+    detector = scan_csv(str(path), str(alerts_path), EscalationDetector(), **options)
+    assert detector.stats()['evicted'] == 0
+    return _alerts(alerts_path)
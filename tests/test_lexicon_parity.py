@@ -0,0 +1,292 @@
+"""
+Label parity between the lexicon-based analyzers and the original ones.
+
+The functions below are frozen copies of analyze_message, extract_features,
+calculate_severity and the server's keyword flags as they were before the
+phrase lists moved into lexicon.py. Any change to the lexicon that alters a
+label for the generated corpus fails here.
+"""
+import csv
+import os
+import random
+import sys
+
+import pytest
+
+import lexicon
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SERVER_DIR = os.path.join(REPO_ROOT, 'safeguard', 'ml_server')
+
+CORPUS_SIZE = 50_000
+
+
+# Frozen baseline of process_messages.analyze_message
+def baseline_analyze_message(text, sender):
+    text = text.lower()
+
+    if sender == "Sanya":
+        if any(word in text for word in ["kill", "death", "die", "hurt"]):
+            return {"incident_type": "Death Threat", "user_emotional_state": "Fearful",
+                    "severity_score": 5, "potential_crime": "Y"}
+        return {"incident_type": "Friendly", "user_emotional_state": "Neutral",
+                "severity_score": 1, "potential_crime": "N"}
+
+    if any(phrase in text for phrase in ["outside your place", "been watching", "following you",
+                                         "saw you at", "make sure you're okay"]):
+        return {"incident_type": "Stalking", "user_emotional_state": "Fearful",
+                "severity_score": 4, "potential_crime": "Y"}
+    if any(phrase in text for phrase in ["shouldn't", "can't handle", "know what's best", "must",
+                                         "have to", "walk home alone", "shouldn't walk"]):
+        return {"incident_type": "Coercive Control", "user_emotional_state": "Manipulated",
+                "severity_score": 3, "potential_crime": "N"}
+    if any(word in text for word in ["kill", "death", "die", "hurt", "regret it", "you'll regret"]):
+        return {"incident_type": "Death Threat", "user_emotional_state": "Fearful",
+                "severity_score": 5, "potential_crime": "Y"}
+    if any(phrase in text for phrase in ["your fault", "making me", "because of you", "no one else will",
+                                         "no one will", "if you just", "wouldn't be having",
+                                         "imagining things", "make me the bad", "always make me",
+                                         "you always", "you're just", "you never"]):
+        return {"incident_type": "Emotional Manipulation", "user_emotional_state": "Manipulated",
+                "severity_score": 3, "potential_crime": "N"}
+    if any(phrase in text for phrase in ["where are you", "why aren't you", "when will you", "why did you"]):
+        return {"incident_type": "Location Monitoring", "user_emotional_state": "Concerned",
+                "severity_score": 2, "potential_crime": "N"}
+    return {"incident_type": "Normal Communication", "user_emotional_state": "Neutral",
+            "severity_score": 1, "potential_crime": "N"}
+
+
+# Frozen baseline of export_model.py's pattern lists
+BASELINE_FRIENDLY_PATTERNS = [
+    'movie night', 'lunch', 'checking in', 'hope', 'sending love', 'let me know',
+    'want to talk', 'doing okay', '💛', 'gentle', 'talk', 'chat'
+]
+
+BASELINE_CONCERNING_PATTERNS = {
+    'Gaslighting': [
+        'imagining things', 'overreacting', 'too sensitive', 'making things up',
+        'always make me', 'your fault', 'being dramatic'
+    ],
+    'Coercive Control': [
+        'should listen', 'have to', 'must', 'need to', 'make you', 'your own good',
+        'know what\'s best', 'can\'t handle', 'lucky I even'
+    ],
+    'Stalking': [
+        'been outside', 'watching you', 'following', 'saw you at', 'noticed you',
+        'been around', 'where are you', 'who were you with'
+    ],
+    'Verbal Threats': [
+        'regret', 'threat', 'warning', 'careful', 'sorry if', 'what happens',
+        'no one else', 'won\'t believe'
+    ]
+}
+
+BASELINE_EMOTIONAL_STATES = {
+    'Neutral': ['checking in', 'movie night', 'lunch', 'chat', 'talk'],
+    'Concerned': ['hope you\'re okay', 'worried', 'care about'],
+    'Anxious': ['should', 'have to', 'need to', 'careful'],
+    'Fearful': ['threat', 'warning', 'regret', 'scared'],
+    'Manipulated': ['your fault', 'making me', 'because of you'],
+    'Distressed': ['always', 'never', 'every time', 'everyone']
+}
+
+
+def baseline_extract_features(text):
+    text = text.lower()
+    features = [sum(1 for pattern in BASELINE_FRIENDLY_PATTERNS if pattern in text)]
+    for patterns in BASELINE_CONCERNING_PATTERNS.values():
+        features.append(sum(1 for pattern in patterns if pattern in text))
+    for patterns in BASELINE_EMOTIONAL_STATES.values():
+        features.append(sum(1 for pattern in patterns if pattern in text))
+    return features
+
+
+def baseline_calculate_severity(text):
+    text = text.lower()
+    severity = 1
+    high_severity = ['threat', 'regret', 'warning', 'never', 'always', 'must', 'have to']
+    medium_severity = ['should', 'need to', 'careful', 'watching', 'following']
+    low_severity = ['hope', 'chat', 'talk', 'checking in', 'movie', 'lunch']
+    if any(indicator in text for indicator in high_severity):
+        severity = 5
+    elif any(indicator in text for indicator in medium_severity):
+        severity = 3
+    elif any(indicator in text for indicator in low_severity):
+        severity = 1
+    return severity
+
+
+# Frozen baseline of the keyword part of the server's analyze_text
+def baseline_server_flags(text):
+    threatening_words = ['kill', 'hurt', 'harm', 'die', 'death']
+    stalking_words = ['following', 'watching', 'where are you', 'saw you', 'found you']
+    obsessive_words = ['always', 'never', 'every time', 'constantly', 'forever']
+    return (
+        any(word in text.lower() for word in threatening_words),
+        any(word in text.lower() for word in stalking_words),
+        any(word in text.lower() for word in obsessive_words),
+    )
+
+
+def baseline_analyze_text(text, sentiment):
+    has_threats, has_stalking, has_obsession = baseline_server_flags(text)
+    sentiment_score = sentiment['score']
+
+    severity = 1
+    if has_threats:
+        severity += 2
+    if has_stalking:
+        severity += 1
+    if has_obsession:
+        severity += 1
+    if sentiment['label'] == 'NEGATIVE' and sentiment_score > 0.8:
+        severity += 1
+
+    if has_threats:
+        emotion, behavior = 'Fear', 'Threatening'
+    elif has_stalking:
+        emotion, behavior = 'Anxiety', 'Stalking'
+    elif has_obsession:
+        emotion, behavior = 'Discomfort', 'Obsessive'
+    elif sentiment['label'] == 'NEGATIVE':
+        emotion, behavior = 'Distress', 'Hostile'
+    else:
+        emotion, behavior = 'Neutral', 'Normal'
+
+    return {
+        'isCrime': has_threats or (has_stalking and severity >= 3),
+        'severityScore': min(severity, 5),
+        'receiverEmotion': emotion,
+        'perpetratorBehavior': behavior
+    }
+
+
+def _baseline_phrases():
+    phrases = [
+        "kill", "death", "die", "hurt", "outside your place", "been watching", "following you",
+        "saw you at", "make sure you're okay", "shouldn't", "can't handle", "know what's best",
+        "must", "have to", "walk home alone", "shouldn't walk", "regret it", "you'll regret",
+        "your fault", "making me", "because of you", "no one else will", "no one will",
+        "if you just", "wouldn't be having", "imagining things", "make me the bad",
+        "always make me", "you always", "you're just", "you never", "where are you",
+        "why aren't you", "when will you", "why did you", "harm", "following", "watching",
+        "saw you", "found you", "always", "never", "every time", "constantly", "forever",
+        "threat", "regret", "warning", "should", "need to", "careful", "hope", "chat", "talk",
+        "checking in", "movie", "lunch",
+    ]
+    phrases += BASELINE_FRIENDLY_PATTERNS
+    for lists in (BASELINE_CONCERNING_PATTERNS, BASELINE_EMOTIONAL_STATES):
+        for patterns in lists.values():
+            phrases += patterns
+    return sorted(set(phrases))
+
+
+def _dataset_messages():
+    path = os.path.join(REPO_ROOT, 'text_messages_to_v.csv')
+    if not os.path.exists(path):
+        return []
+    with open(path, newline='', encoding='utf-8') as f:
+        return [(row['narrative_entry'], row['user_name']) for row in csv.DictReader(f)]
+
+
+def _corpus(size=CORPUS_SIZE, seed=20250301):
+    """
+    Deterministic (text, sender) pairs built from the baseline phrases.
+
+    Phrases are mixed with filler words, glued to their neighbours, cut
+    short, re-cased and given typographic apostrophes, so near misses and
+    overlapping matches are covered as well as plain hits.
+    """
+    rng = random.Random(seed)
+    phrases = _baseline_phrases()
+    filler = ["ok", "so", "you", "are", "the", "place", "me", "at", "i", "will", "why",
+              "dying", "skill", "mustard", "shouldn", "talking", "hopeless", "😊", "💛", "ß", "İ"]
+    senders = ["Sanya", "sanya", "Shreya", "Alex", ""]
+    messages = _dataset_messages()
+    corpus = list(messages)
+    while len(corpus) < size:
+        parts = []
+        for _ in range(rng.randint(0, 6)):
+            if rng.random() < 0.5:
+                part = rng.choice(phrases)
+                roll = rng.random()
+                if roll < 0.1:
+                    part = part[:rng.randint(1, len(part))]
+                elif roll < 0.2:
+                    part = part.replace("'", "’")
+            else:
+                part = rng.choice(filler)
+            parts.append(part)
+        text = rng.choice(["", " ", "  "]).join(parts)
+        if messages and rng.random() < 0.1:
+            text = rng.choice(messages)[0] + " " + text
+        case = rng.random()
+        if case < 0.2:
+            text = text.upper()
+        elif case < 0.3:
+            text = text.title()
+        corpus.append((text, rng.choice(senders)))
+    return corpus
+
+
+@pytest.fixture(scope='module')
+def corpus():
+    return _corpus()
+
+
+def test_lexicon_counts_match_baseline_lists(corpus):
+    # export_model.py reads these counts straight from the lexicon
+    for text, _ in corpus:
+        hits = lexicon.scan(text)
+        features = [hits.get('friendly', 0)]
+        features += [hits.get(f'concerning:{name}', 0) for name in BASELINE_CONCERNING_PATTERNS]
+        features += [hits.get(f'emotion:{name}', 0) for name in BASELINE_EMOTIONAL_STATES]
+        assert features == baseline_extract_features(text), text
+        server = tuple(bool(hits.get(f'server:{name}')) for name in ('threats', 'stalking', 'obsession'))
+        assert server == baseline_server_flags(text), text
+
+
+def test_analyze_message_matches_baseline(corpus):
+    pytest.importorskip('pandas')
+    import process_messages
+
+    for text, sender in corpus:
+        assert process_messages.analyze_message(text, sender) == baseline_analyze_message(text, sender), text
+
+
+def test_classify_chunk_matches_baseline(corpus):
+    pd = pytest.importorskip('pandas')
+    import process_messages
+
+    texts, senders = zip(*corpus)
+    chunk = pd.DataFrame({'user_name': senders, 'narrative_entry': texts})
+    result = process_messages.classify_chunk(chunk)
+    for column in process_messages.RESULT_COLUMNS:
+        expected = [baseline_analyze_message(text, sender)[column] for text, sender in corpus]
+        assert result[column].tolist() == expected, column
+
+
+def test_export_model_features_match_baseline(corpus):
+    pytest.importorskip('sklearn')
+    pytest.importorskip('joblib')
+    import export_model
+
+    for text, _ in corpus:
+        assert export_model.extract_features(text) == baseline_extract_features(text), text
+        assert export_model.calculate_severity(text) == baseline_calculate_severity(text), text
+
+
+def test_server_analyze_text_matches_baseline(corpus):
+    pytest.importorskip('numpy')
+    pytest.importorskip('joblib')
+    sys.path.insert(0, SERVER_DIR)
+    import analysis
+
+    sentiments = [
+        {'label': 'POSITIVE', 'score': 0.99},
+        {'label': 'NEGATIVE', 'score': 0.5},
+        {'label': 'NEGATIVE', 'score': 0.95},
+    ]
+    for i, (text, _) in enumerate(corpus):
+        sentiment = sentiments[i % len(sentiments)]
+        assert analysis.analyze_text(text, sentiment) == baseline_analyze_text(text, sentiment), text
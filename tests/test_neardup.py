@@ -0,0 +1,22 @@
+from neardup import NearDuplicateIndex, cluster_ids, normalize
+
+
+def test_normalize_keeps_words_in_any_script():
+    assert normalize('Я тебя НЕНАВИЖУ!!!') == ['я', 'тебя', 'ненавижу']
+    assert normalize('where are youuuu???') == ['where', 'are', 'youu']
+    assert normalize('😡😡😡') == []
+
+
+def test_messages_in_other_scripts_do_not_share_results():
+    index = NearDuplicateIndex()
+    index.add('я тебя люблю', {'label': 'Friendly'}, key=())
+    assert index.lookup('я тебя ненавижу', key=()) is None
+    assert index.lookup('я тебя люблю', key=())['result'] == {'label': 'Friendly'}
+
+
+def test_messages_without_tokens_are_never_indexed():
+    index = NearDuplicateIndex()
+    assert index.add('😡', {'label': 'Friendly'}, key=()) is None
+    assert index.lookup('🔪', key=()) is None
+    assert index.stats()['clusters'] == 0
+    assert cluster_ids(['😡', '😡', 'see you soon', 'see you soon']) == [-1, -2, 0, 0]
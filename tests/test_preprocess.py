@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('sklearn')
+pytest.importorskip('pandas')
+pytest.importorskip('dotenv')
+from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer, TfidfVectorizer
+
+from preprocess import ANALYZER_SETTINGS, DocumentFrequencyFilter, tfidf_from_counts
+
+TEXTS = [
+    "where are you right now",
+    "where were you last night",
+    "you never listen to me",
+    "lunch tomorrow?",
+    "are you coming to lunch",
+    "I saw you at the park",
+    "you always do this",
+    "where are you going",
+]
+
+
+def test_tfidf_from_counts_matches_a_fitted_vectorizer():
+    counter = CountVectorizer(**ANALYZER_SETTINGS)
+    counts = counter.fit_transform(TEXTS)
+    df_filter = DocumentFrequencyFilter(min_df=2, max_df=0.6).fit(counts)
+    tfidf = TfidfTransformer().fit(df_filter.transform(counts))
+
+    expected = TfidfVectorizer(min_df=2, max_df=0.6, **ANALYZER_SETTINGS).fit(TEXTS)
+    combined = tfidf_from_counts(counter, df_filter, tfidf)
+    assert combined.vocabulary_ == expected.vocabulary_
+    np.testing.assert_allclose(combined.transform(TEXTS).toarray(), expected.transform(TEXTS).toarray())
+
+
+def test_document_frequencies_come_from_training_rows_only():
+    counter = CountVectorizer(**ANALYZER_SETTINGS)
+    counts = counter.fit_transform(TEXTS)
+    train = [0, 1, 2, 3, 4]
+    df_filter = DocumentFrequencyFilter(min_df=2, max_df=1.0).fit(counts[train])
+    kept = set(counter.get_feature_names_out()[df_filter.columns_])
+    # 'lunch' is in two training rows; 'where are' only reaches two rows with a test row
+    assert 'lunch' in kept
+    assert 'where are' not in kept
@@ -0,0 +1,57 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip('pandas')
+import process_messages
+
+ROWS = [
+    "2025-03-01,Alex,where are you right now",
+    "2025-03-02,Sam,lunch tomorrow?",
+]
+
+
+def _write_input(path, rows):
+    path.write_text('time_stamp,user_name,narrative_entry\n' + '\n'.join(rows) + '\n')
+
+
+def _state(output):
+    with open(f'{output}.state.json') as f:
+        return json.load(f)
+
+
+def test_incremental_runs_append_row_hashes(tmp_path):
+    source, output = tmp_path / 'in.csv', str(tmp_path / 'out.csv')
+    _write_input(source, ROWS)
+    process_messages.process_incremental(str(source), output)
+    generation = _state(output)['generation']
+    assert os.path.getsize(f'{output}.hashes') == 16
+
+    _write_input(source, ROWS + ["2025-03-03,Alex,I saw you at the gym"])
+    process_messages.process_incremental(str(source), output)
+    state = _state(output)
+    assert state['generation'] == generation
+    assert state['hash_bytes'] == os.path.getsize(f'{output}.hashes') == 24
+
+
+def test_full_runs_discard_the_incremental_state(tmp_path):
+    source, output = tmp_path / 'in.csv', str(tmp_path / 'out.csv')
+    _write_input(source, ROWS)
+    process_messages.process_incremental(str(source), output)
+    process_messages.process_in_batches(str(source), output)
+    assert not os.path.exists(f'{output}.state.json')
+    assert not os.path.exists(f'{output}.hashes')
+
+
+@pytest.mark.parametrize('flag', [['--incremental'], ['--rollup', 'rollup.json'], ['--escalations', 'alerts.csv']])
+def test_csv_only_options_reject_parquet_output(tmp_path, monkeypatch, capsys, flag):
+    source = tmp_path / 'in.csv'
+    _write_input(source, ROWS)
+    output = str(tmp_path / 'out.parquet')
+    monkeypatch.setattr('sys.argv', ['process_messages.py', '--input', str(source), '--output', output] + flag)
+    with pytest.raises(SystemExit) as excinfo:
+        process_messages.main()
+    assert excinfo.value.code == 2
+    assert flag[0] in capsys.readouterr().err
+    assert not os.path.exists(output)
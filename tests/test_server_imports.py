@@ -0,0 +1,72 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'safeguard', 'ml_server'))
+
+
+def _import_in_server_dir(module):
+    # The way the README starts the servers: from their own directory
+    env = dict(os.environ, HF_HUB_OFFLINE='1', PYTHONPATH='')
+    return subprocess.run([sys.executable, '-c', f'import {module}'], cwd=SERVER_DIR, env=env,
+                          capture_output=True, text=True, timeout=120)
+
+
+def test_flask_app_imports():
+    pytest.importorskip('flask')
+    pytest.importorskip('flask_cors')
+    result = _import_in_server_dir('app')
+    assert result.returncode == 0, result.stderr
+
+
+def test_asgi_app_imports():
+    pytest.importorskip('starlette')
+    result = _import_in_server_dir('asgi')
+    assert result.returncode == 0, result.stderr
+
+
+@pytest.fixture
+def server_path(monkeypatch):
+    monkeypatch.setenv('HF_HUB_OFFLINE', '1')
+    monkeypatch.syspath_prepend(SERVER_DIR)
+
+
+@pytest.mark.parametrize('body', [{}, {'message': None}, {'message': 123}, {'message': ['hi']}, ['hi']])
+def test_flask_analyze_rejects_non_string_messages(server_path, body):
+    pytest.importorskip('flask')
+    pytest.importorskip('flask_cors')
+    import app
+
+    response = app.app.test_client().post('/analyze', json=body)
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('body', [{}, {'message': None}, {'message': 123}, {'message': ['hi']}, ['hi']])
+def test_asgi_analyze_rejects_non_string_messages(server_path, body):
+    pytest.importorskip('starlette')
+    from starlette.testclient import TestClient
+    import asgi
+
+    # Without a `with` block the pool is never started; bad input must not need it
+    response = TestClient(asgi.app).post('/analyze', json=body)
+    assert response.status_code == 400
+
+
+def test_asgi_metrics_sum_worker_cache_lookups(server_path):
+    pytest.importorskip('starlette')
+    from starlette.testclient import TestClient
+    import asgi
+
+    if asgi.analysis.result_cache is None:
+        pytest.skip('result cache disabled')
+    asgi.analysis.result_cache.put_many([('hello', {'severityScore': 1})])
+    # What a worker sends back with each result
+    for text in ('hello', 'unseen'):
+        _, worker_stats = asgi._run_timed(asgi.analysis.result_cache.get, text)
+        asgi._merge_worker_stats(worker_stats)
+
+    body = TestClient(asgi.app).get('/metrics').text
+    assert f"safeguard_cache_hits_total {asgi.cache_counts['hits']}" in body
+    assert asgi.cache_counts == {'hits': 1, 'misses': 1}
@@ -0,0 +1,79 @@
+import csv
+import json
+import os
+import sys
+
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('sklearn')
+import joblib
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'safeguard', 'ml_server')))
+from similarity import SimilarityIndex, build
+
+ROWS = [
+    ['2025-03-01', 'Alex', 'where are you right now', 'Location Monitoring', 'Concerned', '2', 'N'],
+    ['2025-03-02', 'Alex', 'you never listen to me', 'Emotional Manipulation', 'Manipulated', '3', 'N'],
+    ['2025-03-03', 'Sam', 'lunch tomorrow at noon?', 'Normal Communication', 'Neutral', '1', 'N'],
+]
+MORE = [
+    ['2025-03-04', 'Alex', 'where are you going tonight', 'Location Monitoring', 'Concerned', '2', 'N'],
+]
+
+
+@pytest.fixture
+def paths(tmp_path):
+    vectorizer = TfidfVectorizer().fit([row[2] for row in ROWS + MORE])
+    joblib.dump(vectorizer, tmp_path / 'tfidf.joblib')
+    return tmp_path / 'analyzed.csv', tmp_path / 'index', str(tmp_path / 'tfidf.joblib')
+
+
+def _write(path, rows, mode='w', generation='g1'):
+    # Headerless, as process_messages.py writes it, with its incremental state
+    with open(path, mode, newline='', encoding='utf-8') as f:
+        csv.writer(f).writerows(rows)
+    with open(f'{path}.state.json', 'w') as f:
+        json.dump({'generation': generation}, f)
+
+
+def test_build_only_indexes_appended_rows(paths):
+    csv_path, index_dir, vectorizer = paths
+    _write(csv_path, ROWS)
+    index, added, rebuilt = build([str(csv_path)], str(index_dir), vectorizer)
+    assert (len(index), added, rebuilt) == (3, 3, True)
+
+    index, added, rebuilt = build([str(csv_path)], str(index_dir), vectorizer)
+    assert (len(index), added, rebuilt) == (3, 0, False)
+
+    _write(csv_path, MORE, mode='a')
+    index, added, rebuilt = build([str(csv_path)], str(index_dir), vectorizer)
+    assert (len(index), added, rebuilt) == (4, 1, False)
+    matches = SimilarityIndex.load(str(index_dir), vectorizer).query('where are you', k=10)
+    texts = [m['narrative_entry'] for m in matches]
+    assert len(texts) == len(set(texts))
+    assert texts[:2] == ['where are you right now', 'where are you going tonight']
+
+
+def test_rewritten_csv_rebuilds_the_index(paths):
+    csv_path, index_dir, vectorizer = paths
+    _write(csv_path, ROWS)
+    build([str(csv_path)], str(index_dir), vectorizer)
+    _write(csv_path, ROWS + MORE, generation='g2')
+    index, added, rebuilt = build([str(csv_path)], str(index_dir), vectorizer)
+    assert (len(index), added, rebuilt) == (4, 4, True)
+
+
+def test_open_index_survives_later_saves(paths):
+    csv_path, index_dir, vectorizer = paths
+    _write(csv_path, ROWS)
+    build([str(csv_path)], str(index_dir), vectorizer)
+    reader = SimilarityIndex.load(str(index_dir), vectorizer)
+    for generation in ('g2', 'g3', 'g4'):
+        _write(csv_path, ROWS + MORE, generation=generation)
+        build([str(csv_path)], str(index_dir), vectorizer)
+    # Only the current and previous generations are kept on disk
+    assert sorted(os.listdir(index_dir)) == ['gen-000003', 'gen-000004', 'manifest.json']
+    assert reader.query('lunch tomorrow')[0]['narrative_entry'] == 'lunch tomorrow at noon?'
+    assert len(SimilarityIndex.load(str(index_dir), vectorizer)) == 4
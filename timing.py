@@ -0,0 +1,134 @@
+"""
+Per-stage wall-time histograms.
+
+Shared by the offline scripts (process_messages.py, preprocess.py,
+train.py), which print a stage-time report at the end of a run, and by
+the ML server, which exports the same histograms on /metrics.
+
+    from timing import stage, report
+
+    with stage('classify'):
+        ...
+    report()
+
+Recording a stage costs two perf_counter calls, a bisect and a lock.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds, Prometheus style; the last bucket is +Inf
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+class StageTimings:
+    """
+    Histogram of durations per stage name.
+
+    Args:
+        buckets (tuple): Increasing bucket upper bounds in seconds
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            entry = self._stages.get(name)
+            if entry is None:
+                entry = self._stages[name] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'max': 0.0}
+            entry['counts'][index] += 1
+            entry['sum'] += seconds
+            entry['max'] = max(entry['max'], seconds)
+
+    @contextmanager
+    def stage(self, name):
+        """Time the body of a with block as one observation of `name`."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started)
+
+    def timed_iter(self, iterable, name):
+        """Yield from iterable, timing each step, e.g. reading CSV chunks."""
+        iterator = iter(iterable)
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.observe(name, time.perf_counter() - started)
+                return
+            self.observe(name, time.perf_counter() - started)
+            yield item
+
+    def snapshot(self):
+        """
+        Copy of every stage's histogram, in first-seen order.
+
+        Returns:
+            dict: name -> {'count', 'sum', 'max', 'counts'}, where counts
+                are per bucket (not cumulative) with +Inf last
+        """
+        with self._lock:
+            return {
+                name: {'count': sum(e['counts']), 'sum': e['sum'], 'max': e['max'], 'counts': list(e['counts'])}
+                for name, e in self._stages.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+    def drain(self):
+        """Snapshot and reset in one step, e.g. to ship a worker's timings to its parent."""
+        with self._lock:
+            stages = self._stages
+            self._stages = {}
+        return {
+            name: {'count': sum(e['counts']), 'sum': e['sum'], 'max': e['max'], 'counts': e['counts']}
+            for name, e in stages.items()
+        }
+
+    def merge(self, snapshot):
+        """Add a snapshot() or drain() result from another StageTimings with the same buckets."""
+        with self._lock:
+            for name, s in snapshot.items():
+                entry = self._stages.get(name)
+                if entry is None:
+                    entry = self._stages[name] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'max': 0.0}
+                entry['counts'] = [a + b for a, b in zip(entry['counts'], s['counts'])]
+                entry['sum'] += s['sum']
+                entry['max'] = max(entry['max'], s['max'])
+
+    def report(self, title="Time per stage"):
+        """Print count, total, mean and max time for every stage."""
+        stages = self.snapshot()
+        if not stages:
+            return
+        print(f"\n{title}:")
+        print(f"  {'stage':20}{'calls':>8}{'total (s)':>12}{'mean (ms)':>12}{'max (ms)':>12}")
+        for name, s in stages.items():
+            mean = s['sum'] / s['count'] if s['count'] else 0.0
+            print(f"  {name:20}{s['count']:>8}{s['sum']:>12.3f}{mean * 1e3:>12.2f}{s['max'] * 1e3:>12.2f}")
+
+
+# Process-wide timings used by the module-level helpers
+timings = StageTimings()
+
+
+def stage(name):
+    return timings.stage(name)
+
+
+def timed_iter(iterable, name):
+    return timings.timed_iter(iterable, name)
+
+
+def report(title="Time per stage"):
+    timings.report(title)